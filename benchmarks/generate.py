@@ -0,0 +1,163 @@
+"""Generators of synthetic notebook projects, for benchmarking.
+
+Each scenario writes its notebooks to a source folder, and returns their file names.
+The `scale` parameter multiplies the size of the generated content.
+"""
+from __future__ import annotations
+
+import base64
+from pathlib import Path
+import random
+import struct
+from typing import Callable
+import zlib
+
+import nbformat as nbf
+
+KERNELSPEC = {"name": "python3", "display_name": "Python 3", "language": "python"}
+
+
+def _png(size: int, seed: int) -> bytes:
+    """Create a valid PNG image of random noise (RGB, size x size pixels)."""
+    rng = random.Random(seed)
+    raw = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _new_notebook(cells: list[nbf.NotebookNode]) -> nbf.NotebookNode:
+    notebook = nbf.v4.new_notebook(cells=cells)
+    notebook.metadata["kernelspec"] = KERNELSPEC
+    return notebook
+
+
+def _text_notebook(body: str) -> str:
+    """Create a text-based (MyST Markdown) notebook."""
+    lines = ["---", "file_format: mystnb", "kernelspec:", "  name: python3", "---", ""]
+    return "\n".join(lines + [body])
+
+
+def small_cells(folder: Path, scale: int) -> list[str]:
+    """Many small Markdown and code cells, with short text outputs."""
+    cells = [nbf.v4.new_markdown_cell("# Many small cells")]
+    for index in range(200 * scale):
+        cells.append(nbf.v4.new_markdown_cell(f"Some *text* for cell {index}, with `code`."))
+        cell = nbf.v4.new_code_cell(f"x_{index} = {index}\nprint(x_{index})")
+        cell.outputs = [nbf.v4.new_output("stream", name="stdout", text=f"{index}\n")]
+        cells.append(cell)
+    nbf.write(_new_notebook(cells), folder / "small_cells.ipynb")
+    return ["small_cells.ipynb"]
+
+
+def huge_outputs(folder: Path, scale: int) -> list[str]:
+    """A few code cells, with very large text and HTML outputs."""
+    cells = [nbf.v4.new_markdown_cell("# Huge outputs")]
+    for index in range(3 * scale):
+        text = "\n".join(f"row {row}: {'x' * 80}" for row in range(2000))
+        html = (
+            "<table>"
+            + "".join(f"<tr><td>{row}</td><td>{'y' * 80}</td></tr>" for row in range(2000))
+            + "</table>"
+        )
+        cell = nbf.v4.new_code_cell(f"table_{index} = {index}")
+        cell.outputs = [
+            nbf.v4.new_output(
+                "execute_result",
+                data={"text/plain": text, "text/html": html},
+                execution_count=index + 1,
+            )
+        ]
+        cells.append(cell)
+    nbf.write(_new_notebook(cells), folder / "huge_outputs.ipynb")
+    return ["huge_outputs.ipynb"]
+
+
+def many_images(folder: Path, scale: int) -> list[str]:
+    """Many code cells, with (distinct) PNG image outputs."""
+    cells = [nbf.v4.new_markdown_cell("# Many images")]
+    for index in range(100 * scale):
+        cell = nbf.v4.new_code_cell(f"figure_{index} = {index}")
+        cell.outputs = [
+            nbf.v4.new_output(
+                "display_data",
+                data={
+                    "image/png": base64.b64encode(_png(64, index)).decode("ascii"),
+                    "text/plain": "<Figure size 640x480 with 1 Axes>",
+                },
+            )
+        ]
+        cells.append(cell)
+    nbf.write(_new_notebook(cells), folder / "many_images.ipynb")
+    return ["many_images.ipynb"]
+
+
+def glue_eval(folder: Path, scale: int) -> list[str]:
+    """A text-based notebook, with heavy use of glue and eval (executed inline)."""
+    parts = ["# Glue and eval", "", "```{code-cell} ipython3", "from myst_nb import glue", "```"]
+    for index in range(50 * scale):
+        parts += [
+            "",
+            "```{code-cell} ipython3",
+            f"value_{index} = {index} * 2",
+            f'glue("key_{index}", value_{index}, display=False)',
+            "```",
+            "",
+            f"Glued {{glue:}}`key_{index}`, formatted {{glue:text}}`key_{index}:.2f`, "
+            f"evaluated {{eval}}`value_{index}`.",
+        ]
+    (folder / "glue_eval.md").write_text(_text_notebook("\n".join(parts)), "utf8")
+    return ["glue_eval.md"]
+
+
+def deep_markdown(folder: Path, scale: int) -> list[str]:
+    """A long text-based notebook, with deeply nested Markdown structures."""
+    parts = ["# Deep Markdown", ""]
+    for index in range(100 * scale):
+        parts += [
+            f"## Section {index}",
+            "",
+            f"(target-{index})=",
+            "```{note}",
+            "- level 1 with **bold** and `code`",
+            "  - level 2 with a [link](https://example.com)",
+            "    - level 3",
+            "      > quote with $x^2$",
+            "",
+            "| a | b |",
+            "|---|---|",
+            f"| {index} | {index * 2} |",
+            "```",
+            "",
+            "```{code-cell} ipython3",
+            f"y_{index} = [i ** 2 for i in range({index})]",
+            "```",
+            "",
+            f"See [](#target-{index}).",
+            "",
+        ]
+    (folder / "deep_markdown.md").write_text(_text_notebook("\n".join(parts)), "utf8")
+    return ["deep_markdown.md"]
+
+
+SCENARIOS: dict[str, tuple[Callable[[Path, int], list[str]], str]] = {
+    "small_cells": (small_cells, "off"),
+    "huge_outputs": (huge_outputs, "off"),
+    "many_images": (many_images, "off"),
+    "glue_eval": (glue_eval, "inline"),
+    "deep_markdown": (deep_markdown, "off"),
+}
+"""The available scenarios, by name: (generator, execution mode for the sphinx build)."""
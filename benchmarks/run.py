@@ -0,0 +1,276 @@
+"""Run the benchmark suite, and report the results as JSON.
+
+Each scenario (see `generate.py`) is written to a temporary folder,
+then each phase is timed separately, over a number of repeats:
+
+- ``read``: reading the notebook files (``read_myst_markdown_notebook`` for text-based notebooks)
+- ``tokens``: converting the notebooks to Markdown tokens (``notebook_to_tokens``)
+- ``client:<mode>``: creating the execution client, and retrieving all code cell outputs
+- ``sphinx_build``: a full (fresh) sphinx HTML build of the scenario
+- ``select_mime``: the ``SelectMimeType`` post-transform, on the built doctrees
+
+Peak memory is measured, with `tracemalloc`, in a separate (untimed) run of each phase.
+Note this only measures memory allocated by Python in this process,
+i.e. not that of kernels or parallel workers.
+
+Usage::
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --scenarios small_cells many_images --phases read tokens
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import io
+import json
+from pathlib import Path
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from myst_parser.config.main import MdParserConfig
+from myst_parser.mdit_to_docutils.base import make_document
+from myst_parser.parsers.mdit import create_md_parser
+import nbformat
+
+from myst_nb import __version__
+from myst_nb.core.config import NbParserConfig
+from myst_nb.core.execute import create_client
+from myst_nb.core.loggers import DocutilsDocLogger
+from myst_nb.core.nb_to_tokens import notebook_to_tokens
+from myst_nb.core.read import create_nb_reader, read_myst_markdown_notebook
+from myst_nb.docutils_ import DocutilsNbRenderer
+
+sys.path.insert(0, str(Path(__file__).parent))
+from generate import SCENARIOS  # noqa: E402
+
+PHASES = ("read", "tokens", "client", "sphinx_build", "select_mime")
+EXECUTION_MODES = ("off", "force", "cache", "inline")
+
+
+def measure(
+    func: Callable[..., Any],
+    repeat: int,
+    setup: Callable[[], tuple] = tuple,
+    memory: bool = True,
+) -> dict[str, Any]:
+    """Time a function over a number of repeats, then measure its peak memory.
+
+    :param func: The function to measure
+    :param repeat: The number of timed runs
+    :param setup: A function to create the arguments for each run (not measured)
+    :param memory: Whether to measure the peak memory, in an extra run
+    """
+    seconds = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        seconds.append(time.perf_counter() - start)
+    peak_memory = None
+    if memory:
+        args = setup()
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {
+        "seconds": seconds,
+        "min_seconds": min(seconds),
+        "median_seconds": statistics.median(seconds),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def read_notebook(path: Path) -> nbformat.NotebookNode:
+    """Read a notebook file."""
+    text = path.read_text("utf8")
+    if path.suffix == ".md":
+        return read_myst_markdown_notebook(text, MdParserConfig(), add_source_map=True, path=path)
+    return nbformat.reads(text, as_version=4)
+
+
+def to_tokens(notebook: nbformat.NotebookNode, path: Path) -> None:
+    """Convert a notebook to Markdown tokens."""
+    mdit_parser = create_md_parser(MdParserConfig(), DocutilsNbRenderer)
+    logger = DocutilsDocLogger(make_document(str(path)))
+    notebook_to_tokens(notebook, mdit_parser, {}, logger)
+
+
+def run_client(
+    notebook: nbformat.NotebookNode, path: Path, nb_config: NbParserConfig, read_fmt: dict | None
+) -> None:
+    """Create an execution client, and retrieve the outputs of all code cells."""
+    logger = DocutilsDocLogger(make_document(str(path)))
+    with create_client(notebook, str(path), nb_config, logger, read_fmt) as nb_client:
+        for index, cell in enumerate(notebook.cells):
+            if cell.cell_type == "code":
+                nb_client.code_cell_outputs(index)
+
+
+def sphinx_build(srcdir: Path, outdir: Path) -> Any:
+    """Run a fresh sphinx HTML build."""
+    from sphinx.application import Sphinx
+
+    shutil.rmtree(outdir, ignore_errors=True)
+    app = Sphinx(
+        str(srcdir),
+        str(srcdir),
+        str(outdir / "html"),
+        str(outdir / "doctrees"),
+        "html",
+        status=None,
+        warning=io.StringIO(),
+        freshenv=True,
+    )
+    app.build()
+    return app
+
+
+def select_mime(doctrees: list) -> None:
+    """Run the mime type selection post-transform on doctrees."""
+    from myst_nb.sphinx_ import SelectMimeType
+
+    for doctree in doctrees:
+        SelectMimeType(doctree).apply()
+
+
+def run_scenario(name: str, folder: Path, args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Run the benchmarks for a single scenario."""
+    generator, build_mode = SCENARIOS[name]
+    srcdir = folder / name
+    srcdir.mkdir()
+    files = generator(srcdir, args.scale)
+    paths = [srcdir / filename for filename in files]
+    if args.no_execute:
+        build_mode = "off"
+    (srcdir / "conf.py").write_text(
+        "extensions = ['myst_nb']\n"
+        f"root_doc = {paths[0].stem!r}\n"
+        f"nb_execution_mode = {build_mode!r}\n"
+        "suppress_warnings = ['toc.not_included']\n",
+        "utf8",
+    )
+    results = []
+
+    def record(phase: str, result: dict[str, Any]) -> None:
+        result = {"scenario": name, "phase": phase, **result}
+        results.append(result)
+        memory = result["peak_memory_bytes"]
+        print(
+            f"{name:>15} {phase:>16}: {result['median_seconds']:8.3f} s"
+            + ("" if memory is None else f" {memory / 2**20:10.1f} MiB"),
+            file=sys.stderr,
+        )
+
+    memory = not args.no_memory
+    if "read" in args.phases:
+        record(
+            "read",
+            measure(lambda: [read_notebook(p) for p in paths], args.repeat, memory=memory),
+        )
+    notebooks = [read_notebook(path) for path in paths]
+    nb_readers = [
+        create_nb_reader(str(path), MdParserConfig(), NbParserConfig(), path.read_text("utf8"))
+        for path in paths
+    ]
+    read_fmts = [None if nb_reader is None else nb_reader.read_fmt for nb_reader in nb_readers]
+    if "tokens" in args.phases:
+        record(
+            "tokens",
+            measure(
+                lambda nbs: [to_tokens(nb, p) for nb, p in zip(nbs, paths)],
+                args.repeat,
+                setup=lambda: (copy.deepcopy(notebooks),),
+                memory=memory,
+            ),
+        )
+    if "client" in args.phases:
+        for mode in EXECUTION_MODES:
+            if args.no_execute and mode != "off":
+                continue
+            nb_config = NbParserConfig(
+                execution_mode=mode,  # type: ignore[arg-type]
+                execution_cache_path=str(folder / f"{name}_cache"),
+            )
+            record(
+                f"client:{mode}",
+                measure(
+                    lambda nbs, config=nb_config: [
+                        run_client(nb, path, config, read_fmt)
+                        for nb, path, read_fmt in zip(nbs, paths, read_fmts)
+                    ],
+                    args.repeat,
+                    setup=lambda: (copy.deepcopy(notebooks),),
+                    memory=memory,
+                ),
+            )
+    if {"sphinx_build", "select_mime"} & set(args.phases):
+        outdir = folder / f"{name}_build"
+        if "sphinx_build" in args.phases:
+            record(
+                "sphinx_build",
+                measure(lambda: sphinx_build(srcdir, outdir), args.repeat, memory=memory),
+            )
+        if "select_mime" in args.phases:
+            app = sphinx_build(srcdir, outdir)
+            docnames = [app.env.path2doc(str(path)) for path in paths]
+            record(
+                "select_mime",
+                measure(
+                    select_mime,
+                    args.repeat,
+                    setup=lambda: ([app.env.get_doctree(docname) for docname in docnames],),
+                    memory=memory,
+                ),
+            )
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=list(PHASES))
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier of the content size")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per phase")
+    parser.add_argument(
+        "--no-execute", action="store_true", help="Skip phases that require a kernel"
+    )
+    parser.add_argument("--no-memory", action="store_true", help="Skip measuring peak memory")
+    parser.add_argument("--output", help="File to write the results to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tempdir:
+        for name in args.scenarios:
+            results += run_scenario(name, Path(tempdir), args)
+
+    report = {
+        "metadata": {
+            "myst_nb": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, "utf8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-"""A basic CLI for quickstart of a myst_nb project."""
+"""A basic CLI for quickstart of a myst_nb project, and other utilities."""
 from __future__ import annotations
 
 import argparse
@@ -8,6 +8,7 @@ from textwrap import indent
 import nbformat
 
 from .core.config import NbParserConfig
+from .core.execute.pool import QUEUE_FOLDER, run_queue_worker
 from .core.read import read_myst_markdown_notebook
 
 
@@ -171,3 +172,32 @@ def create_md_to_nb_cli():
     cli.add_argument("-o", "--overwrite", action="store_true", help="Overwrite existing files.")
     cli.add_argument("-v", "--verbose", action="store_true", help="Increase verbosity.")
     return cli
+
+
+def queue_worker(args: list[str] | None = None):
+    """Execute the notebooks of a job queue, as they are submitted by builds."""
+    namespace = create_queue_worker_cli().parse_args(args)
+    queue_path = Path(namespace.cache_path).resolve() / QUEUE_FOLDER
+    print(f"Executing notebooks from the job queue: {queue_path}")
+    try:
+        run_queue_worker(
+            queue_path, stop_when_idle=namespace.stop_when_idle, poll_interval=namespace.poll
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+def create_queue_worker_cli():
+    cli = argparse.ArgumentParser(
+        description="Execute the notebooks of a job queue (for nb_execution_mode = 'queue')."
+    )
+    cli.add_argument(
+        "cache_path", metavar="PATH", type=str, help="Path to the (shared) execution cache folder."
+    )
+    cli.add_argument(
+        "-p", "--poll", type=float, default=1.0, help="Interval (seconds) to check for new jobs."
+    )
+    cli.add_argument(
+        "-s", "--stop-when-idle", action="store_true", help="Exit when no jobs are pending."
+    )
+    return cli
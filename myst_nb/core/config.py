@@ -1,7 +1,7 @@
 """Configuration for myst-nb."""
 import dataclasses as dc
 from enum import Enum
-from typing import Any, Callable, Dict, Iterable, Literal, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Sequence, Set, Tuple
 
 from myst_parser.config.dc_validators import (
     ValidatorType,
@@ -13,6 +13,7 @@ from myst_parser.config.dc_validators import (
     validate_fields,
 )
 
+from myst_nb.core.profile import PROFILE_REPORT_FORMATS
 from myst_nb.warnings_ import MystNBWarnings
 
 
@@ -137,6 +138,25 @@ class NbParserConfig:
         },
         repr=False,
     )
+    read_lazy_output_size: int = dc.field(
+        default=0,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Minimum size (bytes) of base64 encoded output data in .ipynb files, "
+            "to leave in the file until it is rendered (0 to load all data on read)",
+            "sections": (Section.global_lvl, Section.read),
+        },
+    )
+    markdown_cache_size: int = dc.field(
+        default=0,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Maximum number of Markdown cells to cache the parsed tokens of, "
+            "between builds (0 to disable)",
+            "omit": ["docutils"],
+            "sections": (Section.global_lvl, Section.read),
+        },
+    )
 
     # configuration override keys (applied after file read)
 
@@ -189,7 +209,15 @@ class NbParserConfig:
             "sections": (Section.global_lvl, Section.file_lvl, Section.execute),
         },
     )
-    execution_mode: Literal["off", "force", "auto", "cache", "inline"] = dc.field(
+    eval_batch: bool = dc.field(
+        default=False,
+        metadata={
+            "validator": instance_of(bool),
+            "help": "Evaluate the eval expressions between code cells in a single batch",
+            "sections": (Section.global_lvl, Section.file_lvl, Section.execute),
+        },
+    )
+    execution_mode: Literal["off", "force", "auto", "cache", "inline", "queue"] = dc.field(
         default="auto",
         metadata={
             "validator": in_(
@@ -199,6 +227,7 @@ class NbParserConfig:
                     "force",
                     "cache",
                     "inline",
+                    "queue",
                 ]
             ),
             "help": "Execution mode for notebooks",
@@ -225,6 +254,16 @@ class NbParserConfig:
             "sections": (Section.global_lvl, Section.execute),
         },
     )
+    execution_inputs: Sequence[str] = dc.field(
+        default=(),
+        metadata={
+            "validator": deep_iterable(instance_of(str), instance_of((list, tuple))),
+            "help": "Glob patterns for the files read by a notebook's code "
+            "(relative to the notebook), which cause it to be re-read when changed",
+            "omit": ["docutils"],
+            "sections": (Section.global_lvl, Section.file_lvl, Section.execute),
+        },
+    )
     execution_timeout: int = dc.field(
         default=30,
         metadata={
@@ -270,6 +309,73 @@ class NbParserConfig:
         },
     )
 
+    execution_workers: int = dc.field(
+        default=1,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Number of worker processes for executing notebooks in 'cache' mode, "
+            "before they are read (1 to execute notebooks on reading), "
+            "or of local workers for the job queue in 'queue' mode",
+            "omit": ["docutils"],
+            "sections": (Section.global_lvl, Section.execute),
+        },
+    )
+    execution_queue_timeout: int = dc.field(
+        default=600,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Maximum time (seconds) to wait for the next queued notebook to complete "
+            "in 'queue' mode, before executing the rest on reading (-1 for no limit)",
+            "omit": ["docutils"],
+            "sections": (Section.global_lvl, Section.execute),
+        },
+    )
+    execution_cell_cache: bool = dc.field(
+        default=False,
+        metadata={
+            "validator": instance_of(bool),
+            "help": "Cache the outputs of each code cell in 'inline' mode, and only execute "
+            "from the first changed code cell (replaying the cells before it)",
+            "sections": (Section.global_lvl, Section.file_lvl, Section.execute),
+        },
+    )
+    execution_cell_cache_size: int = dc.field(
+        default=10000,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Maximum number of code cells to keep in the cell cache, "
+            "evicting the least recently used (-1 for no limit)",
+            "sections": (Section.global_lvl, Section.execute),
+        },
+    )
+    execution_snapshots: bool = dc.field(
+        default=False,
+        metadata={
+            "validator": instance_of(bool),
+            "help": "Snapshot the (Python) kernel state after checkpoint cells, "
+            "to restore rather than replay the cells before them (requires the cell cache)",
+            "sections": (Section.global_lvl, Section.file_lvl, Section.execute),
+        },
+    )
+    execution_kernel_pool: int = dc.field(
+        default=0,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Number of (python) kernels to start in advance, per kernel name, "
+            "for executing notebooks (0 to start a kernel per notebook)",
+            "sections": (Section.global_lvl, Section.execute),
+        },
+    )
+    execution_kernel_reuse: bool = dc.field(
+        default=False,
+        metadata={
+            "validator": instance_of(bool),
+            "help": "Reset the namespace of pooled kernels after executing a notebook, "
+            "and re-use them, rather than shutting them down",
+            "sections": (Section.global_lvl, Section.file_lvl, Section.execute),
+        },
+    )
+
     # pre-processing options
 
     merge_streams: bool = dc.field(
@@ -390,6 +496,16 @@ class NbParserConfig:
         },
         repr=False,
     )
+    target_builders: Sequence[str] = dc.field(
+        default=(),
+        metadata={
+            "validator": deep_iterable(instance_of(str), instance_of((list, tuple))),
+            "help": "Names of the builders the project is built with: "
+            "if set, only the mime types these builders would select are stored in doctrees",
+            "omit": ["docutils"],
+            "sections": (Section.global_lvl, Section.render),
+        },
+    )
     output_stderr: Literal["show", "remove", "remove-warn", "warn", "error", "severe"] = dc.field(
         default="show",
         metadata={
@@ -412,6 +528,66 @@ class NbParserConfig:
             ),
         },
     )
+    output_max_bytes: int = dc.field(
+        default=-1,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Maximum size (in bytes) of a stream, text/plain or text/html output, "
+            "above which it is truncated (-1 for no limit)",
+            "sections": (
+                Section.global_lvl,
+                Section.file_lvl,
+                Section.cell_lvl,
+                Section.render,
+            ),
+        },
+    )
+    output_max_lines: int = dc.field(
+        default=-1,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Maximum number of lines of a stream, text/plain or text/html output, "
+            "above which it is truncated (-1 for no limit)",
+            "sections": (
+                Section.global_lvl,
+                Section.file_lvl,
+                Section.cell_lvl,
+                Section.render,
+            ),
+        },
+    )
+    output_total_max_bytes: int = dc.field(
+        default=-1,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Maximum total size (in bytes) of the stream, text/plain and text/html "
+            "outputs of a notebook, above which they are truncated (-1 for no limit)",
+            "sections": (Section.global_lvl, Section.file_lvl, Section.render),
+        },
+    )
+    output_total_max_lines: int = dc.field(
+        default=-1,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Maximum total number of lines of the stream, text/plain and text/html "
+            "outputs of a notebook, above which they are truncated (-1 for no limit)",
+            "sections": (Section.global_lvl, Section.file_lvl, Section.render),
+        },
+    )
+    output_truncate_spill: bool = dc.field(
+        default=False,
+        metadata={
+            "validator": instance_of(bool),
+            "help": "Write the full content of truncated outputs to files, "
+            "and link to them from the truncation marker",
+            "sections": (
+                Section.global_lvl,
+                Section.file_lvl,
+                Section.cell_lvl,
+                Section.render,
+            ),
+        },
+    )
     render_text_lexer: str = dc.field(
         default="myst-ansi",
         # TODO allow None -> "none"?
@@ -491,6 +667,21 @@ class NbParserConfig:
             ),
         },
     )
+    render_lazy_output_size: int = dc.field(
+        default=-1,
+        metadata={
+            "validator": instance_of(int),
+            "help": "Minimum size (bytes) of text/html and application/javascript outputs, "
+            "to write to separate files that are loaded lazily in HTML (-1 to always inline)",
+            "cell_key": "lazy_output_size",
+            "sections": (
+                Section.global_lvl,
+                Section.file_lvl,
+                Section.cell_lvl,
+                Section.render,
+            ),
+        },
+    )
     # TODO jupyter_sphinx_require_url and jupyter_sphinx_embed_url (undocumented),
     # are no longer used by this package, replaced by ipywidgets_js
     # do we add any deprecation warnings?
@@ -507,6 +698,26 @@ class NbParserConfig:
         repr=False,
     )
 
+    output_store: bool = dc.field(
+        default=False,
+        metadata={
+            "validator": instance_of(bool),
+            "help": "Skip writing output files identical to those already written, "
+            "and write others in the background",
+            "sections": (Section.global_lvl, Section.render),
+        },
+    )
+    profile_report: Sequence[str] = dc.field(
+        default=(),
+        metadata={
+            "validator": deep_iterable(in_(PROFILE_REPORT_FORMATS), instance_of((list, tuple))),
+            "help": "Write a build-wide report of the time spent processing each notebook, "
+            f"in these formats: {', '.join(PROFILE_REPORT_FORMATS)}",
+            "omit": ["docutils"],
+            "sections": (Section.global_lvl, Section.render),
+        },
+    )
+
     # write options for docutils
     output_folder: str = dc.field(
         default="build",
@@ -599,12 +810,7 @@ class NbParserConfig:
             try:
                 if cell_key in cell_meta:
                     value = cell_meta[cell_key]
-                    if "validator" in field.metadata:
-                        if isinstance(field.metadata["validator"], list):
-                            for validator in field.metadata["validator"]:
-                                validator(self, field, value)
-                        else:
-                            field.metadata["validator"](self, field, value)
+                    _validate_field(self, field, value)
                     return value
             except Exception as exc:
                 warning_callback(
@@ -614,3 +820,113 @@ class NbParserConfig:
 
         # default/global/file level should have already been merged
         return getattr(self, field.name)
+
+
+def _validate_field(inst: NbParserConfig, field: dc.Field, value: Any) -> None:
+    """Validate a value for a configuration field."""
+    if "validator" in field.metadata:
+        if isinstance(field.metadata["validator"], list):
+            for validator in field.metadata["validator"]:
+                validator(inst, field, value)
+        else:
+            field.metadata["validator"](inst, field, value)
+
+
+class CellConfigResolver:
+    """Resolve configuration values at the cell level, for the cells of a single notebook.
+
+    This gives the same values as `NbParserConfig.get_cell_level_config`,
+    but the override of each field for a cell is only read and validated once
+    (when first requested), so that warnings are only emitted once per cell and field.
+    """
+
+    def __init__(self, nb_config: NbParserConfig) -> None:
+        """Initialise the resolver.
+
+        :param nb_config: the (global and document level merged) configuration
+        """
+        self._config = nb_config
+        # cell id -> (cell metadata, field name -> (has override, value), warnings emitted)
+        self._cells: Dict[int, Tuple[Dict[str, Any], Dict[str, Tuple[bool, Any]], Set[str]]] = {}
+
+    def get(
+        self,
+        field_name: str,
+        cell_metadata: Dict[str, Any],
+        warning_callback: Callable[[str, MystNBWarnings], Any],
+    ) -> Any:
+        """Get a configuration value at the cell level.
+
+        Takes the highest priority configuration from:
+        `cell > document > global > default`
+
+        :param field: the field name to get the value for
+        :param cell_metadata: the metadata for the cell
+        :param warning_callback: a callback to use to warn about issues (msg, subtype)
+
+        :raises KeyError: if the field is not found
+        """
+        if field_name not in self._config.__dataclass_fields__:
+            raise KeyError(field_name)
+        if self._config.cell_metadata_key not in cell_metadata and "render" not in cell_metadata:
+            return getattr(self._config, field_name)
+        # the metadata object is stored, to ensure its id is not re-used
+        cell = self._cells.get(id(cell_metadata))
+        if cell is None or cell[0] is not cell_metadata:
+            cell = (cell_metadata, {}, set())
+            self._cells[id(cell_metadata)] = cell
+        if field_name not in cell[1]:
+            cell[1][field_name] = self._resolve_field(
+                field_name, cell_metadata, cell[2], warning_callback
+            )
+        has_override, value = cell[1][field_name]
+        return value if has_override else getattr(self._config, field_name)
+
+    def _resolve_field(
+        self,
+        field_name: str,
+        cell_metadata: Dict[str, Any],
+        warned: Set[str],
+        warning_callback: Callable[[str, MystNBWarnings], Any],
+    ) -> Tuple[bool, Any]:
+        """Read and validate the override of a field for a cell, if any.
+
+        :param warned: the warnings already emitted for the cell (updated in-place)
+        :returns: whether the cell has a (valid) override, and its value
+        """
+        field: dc.Field = self._config.__dataclass_fields__[field_name]
+        cell_key = field.metadata.get("cell_key", field.name)
+        if (
+            self._config.cell_metadata_key not in cell_metadata
+            and isinstance(cell_metadata.get("render"), dict)
+            and cell_key in cell_metadata["render"]
+        ):
+            if "render" not in warned:
+                warned.add("render")
+                warning_callback(
+                    f"Deprecated `cell_metadata_key` 'render' "
+                    f"found, replace with {self._config.cell_metadata_key!r}",
+                    MystNBWarnings.CELL_METADATA_KEY,
+                )
+            cell_meta = cell_metadata["render"]
+        else:
+            cell_meta = cell_metadata.get(self._config.cell_metadata_key, None)
+
+        if not cell_meta:
+            return False, None
+        if not isinstance(cell_meta, dict):
+            if "dict" not in warned:
+                warned.add("dict")
+                warning_callback(
+                    f"Cell metadata invalid: {cell_meta!r} is not a dict",
+                    MystNBWarnings.CELL_CONFIG,
+                )
+            return False, None
+        if cell_key not in cell_meta:
+            return False, None
+        try:
+            _validate_field(self._config, field, cell_meta[cell_key])
+        except Exception as exc:
+            warning_callback(f"Cell metadata invalid: {exc}", MystNBWarnings.CELL_CONFIG)
+            return False, None
+        return True, cell_meta[cell_key]
@@ -13,6 +13,7 @@ if TYPE_CHECKING:
 
     from myst_nb.core.config import NbParserConfig
     from myst_nb.core.loggers import LoggerType
+    from myst_nb.core.profile import Profiler
 
 
 def create_client(
@@ -21,6 +22,8 @@ def create_client(
     nb_config: NbParserConfig,
     logger: LoggerType,
     read_fmt: None | dict = None,
+    profiler: None | Profiler = None,
+    eval_expressions: None | dict[int, list[str]] = None,
 ) -> NotebookClientBase:
     """Create a notebook execution client, to update its outputs.
 
@@ -32,6 +35,8 @@ def create_client(
     :param nb_config: The configuration for the notebook parser.
     :param logger: The logger to use.
     :param read_fmt: The format of the input source (to parse to jupyter cache)
+    :param profiler: A profiler to record the timings of execution phases
+    :param eval_expressions: The eval expressions of each markdown cell (to batch evaluate)
 
     :returns: The updated notebook, and the (optional) execution metadata.
     """
@@ -48,7 +53,7 @@ def create_client(
         for pattern in nb_config.execution_excludepatterns:
             if posix_path.match(pattern):
                 logger.info(f"Excluded from execution by pattern: {pattern!r}")
-                return NotebookClientBase(notebook, path, nb_config, logger)
+                return NotebookClientBase(notebook, path, nb_config, logger, profiler=profiler)
 
     # 'auto' mode only executes the notebook if it is missing at least one output
     missing_outputs = (
@@ -56,15 +61,26 @@ def create_client(
     )
     if nb_config.execution_mode == "auto" and not any(missing_outputs):
         logger.info("Skipped execution in 'auto' mode (all outputs present)")
-        return NotebookClientBase(notebook, path, nb_config, logger)
+        return NotebookClientBase(notebook, path, nb_config, logger, profiler=profiler)
 
     if nb_config.execution_mode in ("auto", "force"):
-        return NotebookClientDirect(notebook, path, nb_config, logger)
+        return NotebookClientDirect(notebook, path, nb_config, logger, profiler=profiler)
 
-    if nb_config.execution_mode == "cache":
-        return NotebookClientCache(notebook, path, nb_config, logger, read_fmt=read_fmt)
+    if nb_config.execution_mode in ("cache", "queue"):
+        # in 'queue' mode, notebooks are executed by the queue workers before parsing,
+        # and their outputs retrieved from the cache
+        return NotebookClientCache(
+            notebook, path, nb_config, logger, read_fmt=read_fmt, profiler=profiler
+        )
 
     if nb_config.execution_mode == "inline":
-        return NotebookClientInline(notebook, path, nb_config, logger)
+        return NotebookClientInline(
+            notebook,
+            path,
+            nb_config,
+            logger,
+            profiler=profiler,
+            eval_expressions=eval_expressions or {},
+        )
 
-    return NotebookClientBase(notebook, path, nb_config, logger)
+    return NotebookClientBase(notebook, path, nb_config, logger, profiler=profiler)
@@ -10,7 +10,9 @@ from typing_extensions import TypedDict, final
 from myst_nb.core.config import NbParserConfig
 from myst_nb.core.loggers import LoggerType
 from myst_nb.core.nb_to_tokens import nb_node_to_dict
+from myst_nb.core.profile import Profiler
 from myst_nb.ext.glue import extract_glue_data
+from myst_nb.ext.glue.store import GlueStore
 
 
 class ExecutionResult(TypedDict):
@@ -28,6 +30,8 @@ class ExecutionResult(TypedDict):
     """error type if the notebook failed to execute"""
     traceback: str | None
     """traceback if the notebook failed"""
+    cell_runtimes: dict[int, float]
+    """runtime in seconds of each executed code cell, by cell index"""
 
 
 class ExecutionError(Exception):
@@ -53,6 +57,7 @@ class NotebookClientBase:
         path: Path | None,
         nb_config: NbParserConfig,
         logger: LoggerType,
+        profiler: Profiler | None = None,
         **kwargs: Any,
     ):
         """Initialize the client."""
@@ -60,9 +65,10 @@ class NotebookClientBase:
         self._path = path
         self._nb_config = nb_config
         self._logger = logger
+        self._profiler = Profiler(enabled=False) if profiler is None else profiler
         self._kwargs = kwargs
 
-        self._glue_data: dict[str, NotebookNode] = {}
+        self._glue_data = GlueStore()
         self._exec_metadata: ExecutionResult | None = None
 
         # get or create source map of cell to source line
@@ -76,7 +82,8 @@ class NotebookClientBase:
     @final
     def __enter__(self) -> NotebookClientBase:
         """Enter the context manager."""
-        self.start_client()
+        with self.profiler.span("client_start"):
+            self.start_client()
         # extract glue data from the notebook
         self._glue_data = extract_glue_data(self.notebook, self._source_map, self.logger)
         return self
@@ -84,7 +91,8 @@ class NotebookClientBase:
     @final
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Exit the context manager."""
-        self.close_client(exc_type, exc_val, exc_tb)
+        with self.profiler.span("client_close"):
+            self.close_client(exc_type, exc_val, exc_tb)
 
     def start_client(self):
         """Start the client."""
@@ -120,8 +128,13 @@ class NotebookClientBase:
         return self._logger
 
     @property
-    def glue_data(self) -> dict[str, NotebookNode]:
-        """Get the glue data."""
+    def profiler(self) -> Profiler:
+        """Get the profiler, to record the timings of execution phases."""
+        return self._profiler
+
+    @property
+    def glue_data(self) -> GlueStore:
+        """Get the glue data (with the outputs loaded on demand)."""
         return self._glue_data
 
     @property
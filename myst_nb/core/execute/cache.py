@@ -10,9 +10,12 @@ from typing import ContextManager
 from jupyter_cache import get_cache
 from jupyter_cache.base import CacheBundleIn
 from jupyter_cache.cache.db import NbProjectRecord
-from jupyter_cache.executors.utils import single_nb_execution
+
+from myst_nb.core.profile import pop_cell_runtimes
 
 from .base import ExecutionError, NotebookClientBase
+from .kernels import run_notebook
+from .pool import pop_failed_execution
 
 
 class NotebookClientCache(NotebookClientBase):
@@ -41,6 +44,10 @@ class NotebookClientCache(NotebookClientBase):
                 "succeeded": True,
                 "error": None,
                 "traceback": None,
+                "cell_runtimes": {
+                    int(index): runtime
+                    for index, runtime in cache_record.data.get("cell_runtimes", {}).items()
+                },
             }
             return
 
@@ -55,25 +62,30 @@ class NotebookClientCache(NotebookClientBase):
             stage_record = cache.add_nb_to_project(str(self.path))
         # TODO do in try/except, in case of db write errors
         NbProjectRecord.remove_tracebacks([stage_record.pk], cache.db)
-        cwd_context: ContextManager[str] = (
-            TemporaryDirectory()  # type: ignore
-            if self.nb_config.execution_in_temp
-            else nullcontext(str(self.path.parent))
-        )
-        with cwd_context as cwd:
-            cwd = os.path.abspath(cwd)
-            self.logger.info(
-                "Executing notebook using "
-                + ("temporary" if self.nb_config.execution_in_temp else "local")
-                + " CWD"
-            )
-            result = single_nb_execution(
-                self.notebook,
-                cwd=cwd,
-                allow_errors=self.nb_config.execution_allow_errors,
-                timeout=self.nb_config.execution_timeout,
-                meta_override=True,  # TODO still support this?
+        # the notebook may have already failed execution, before parsing
+        result = pop_failed_execution(self.path)
+        if result is not None:
+            self.logger.info("Using failed execution from before parsing")
+            # update in-place, since the notebook is referenced elsewhere
+            self.notebook.clear()
+            self.notebook.update(result.nb)
+        else:
+            cwd_context: ContextManager[str] = (
+                TemporaryDirectory()  # type: ignore
+                if self.nb_config.execution_in_temp
+                else nullcontext(str(self.path.parent))
             )
+            with cwd_context as cwd:
+                cwd = os.path.abspath(cwd)
+                self.logger.info(
+                    "Executing notebook using "
+                    + ("temporary" if self.nb_config.execution_in_temp else "local")
+                    + " CWD"
+                )
+                with self.profiler.span("execute"):
+                    result = run_notebook(self.notebook, self.nb_config, cwd)
+                self.profiler.add_cell_timings(self.notebook)
+        cell_runtimes = pop_cell_runtimes(self.notebook)
 
         # handle success / failure cases
         # TODO do in try/except to be careful (in case of database write errors?
@@ -91,7 +103,7 @@ class NotebookClientCache(NotebookClientBase):
                 CacheBundleIn(
                     self.notebook,
                     stage_record.uri,
-                    data={"execution_seconds": result.time},
+                    data={"execution_seconds": result.time, "cell_runtimes": cell_runtimes},
                 ),
                 check_validity=False,
                 overwrite=True,
@@ -105,4 +117,5 @@ class NotebookClientCache(NotebookClientBase):
             "succeeded": False if result.err else True,
             "error": f"{result.err.__class__.__name__}" if result.err else None,
             "traceback": result.exc_string if result.err else None,
+            "cell_runtimes": cell_runtimes,
         }
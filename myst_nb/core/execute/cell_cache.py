@@ -0,0 +1,147 @@
+"""A cache of code cell outputs, keyed by the code that led up to the cell.
+
+The key for each code cell is a hash of its source,
+chained with the key of the preceding code cell (and seeded by the kernel name),
+such that a cell only matches if it, and all code cells before it, are unchanged.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import time
+
+import nbformat
+from nbformat import NotebookNode
+
+from myst_nb.core.nb_to_tokens import nb_node_to_dict
+
+CELL_CACHE_NAME = "mystnb_cells.db"
+"""The name of the cache database file, in the execution cache folder."""
+
+
+def cell_cache_keys(notebook: NotebookNode) -> dict[int, str]:
+    """Create the cache keys for the code cells of a notebook.
+
+    :returns: mapping of cell index to key
+    """
+    kernel_name = notebook.metadata.get("kernelspec", {}).get("name", "")
+    digest = hashlib.sha256(kernel_name.encode("utf8")).hexdigest()
+    keys = {}
+    for index, cell in enumerate(notebook.cells):
+        if cell.cell_type != "code":
+            continue
+        hasher = hashlib.sha256(digest.encode("utf8"))
+        hasher.update(json.dumps(cell.metadata.get("tags", [])).encode("utf8"))
+        hasher.update(cell.source.encode("utf8"))
+        digest = keys[index] = hasher.hexdigest()
+    return keys
+
+
+class CellOutputCache:
+    """A least-recently-used cache of code cell outputs, stored in an SQLite database."""
+
+    def __init__(self, folder: str | Path, max_size: int = -1) -> None:
+        """Initialise the cache, and evict the least recently used cells.
+
+        :param folder: The folder to store the database in (created if missing)
+        :param max_size: The maximum number of cells to store (-1 for no limit)
+        """
+        Path(folder).mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(Path(folder) / CELL_CACHE_NAME), timeout=30)
+        self._accessed: set[str] = set()
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cells "
+                "(key TEXT PRIMARY KEY, execution_count INTEGER, outputs TEXT, accessed REAL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS kernels (name TEXT PRIMARY KEY, language_info TEXT)"
+            )
+        if max_size >= 0:
+            try:
+                with self._connection:
+                    self._connection.execute(
+                        "DELETE FROM cells WHERE key NOT IN "
+                        "(SELECT key FROM cells ORDER BY accessed DESC LIMIT ?)",
+                        (max_size,),
+                    )
+            except sqlite3.OperationalError:
+                pass  # e.g. the database is locked by another process, evict next time
+
+    def close(self) -> None:
+        """Write the access times of the cells retrieved, and close the database."""
+        if self._accessed:
+            now = time.time()
+            try:
+                with self._connection:
+                    self._connection.executemany(
+                        "UPDATE cells SET accessed = ? WHERE key = ?",
+                        [(now, key) for key in self._accessed],
+                    )
+            except sqlite3.OperationalError:
+                pass  # e.g. the database is locked by another process
+            self._accessed.clear()
+        self._connection.close()
+
+    def get_cell(self, key: str) -> tuple[int | None, list[NotebookNode]] | None:
+        """Get the execution count and outputs of a cell, if cached."""
+        try:
+            row = self._connection.execute(
+                "SELECT execution_count, outputs FROM cells WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # e.g. the database is locked by another process
+            return None
+        if row is None:
+            return None
+        self._accessed.add(key)
+        return row[0], [nbformat.from_dict(output) for output in json.loads(row[1])]
+
+    def set_cell(self, key: str, execution_count: int | None, outputs: list[NotebookNode]) -> bool:
+        """Cache the execution count and outputs of a cell.
+
+        :returns: whether the cell was cached
+            (False if the database is locked by another process)
+        """
+        try:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?)",
+                    (
+                        key,
+                        execution_count,
+                        json.dumps([nb_node_to_dict(output) for output in outputs]),
+                        time.time(),
+                    ),
+                )
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def get_language_info(self, kernel_name: str) -> dict | None:
+        """Get the last language_info retrieved from a kernel, if cached."""
+        try:
+            row = self._connection.execute(
+                "SELECT language_info FROM kernels WHERE name = ?", (kernel_name,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return None if row is None else json.loads(row[0])
+
+    def set_language_info(self, kernel_name: str, language_info: dict) -> bool:
+        """Cache the language_info retrieved from a kernel.
+
+        :returns: whether the language_info was cached
+            (False if the database is locked by another process)
+        """
+        try:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO kernels VALUES (?, ?)",
+                    (kernel_name, json.dumps(language_info)),
+                )
+        except sqlite3.OperationalError:
+            return False
+        return True
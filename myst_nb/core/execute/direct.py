@@ -7,9 +7,10 @@ import os
 from tempfile import TemporaryDirectory
 from typing import ContextManager
 
-from jupyter_cache.executors.utils import single_nb_execution
+from myst_nb.core.profile import pop_cell_runtimes
 
 from .base import ExecutionError, NotebookClientBase
+from .kernels import run_notebook
 
 
 class NotebookClientDirect(NotebookClientBase):
@@ -35,13 +36,10 @@ class NotebookClientDirect(NotebookClientBase):
                 + ("temporary" if self.nb_config.execution_in_temp else "local")
                 + " CWD"
             )
-            result = single_nb_execution(
-                self.notebook,
-                cwd=cwd,
-                allow_errors=self.nb_config.execution_allow_errors,
-                timeout=self.nb_config.execution_timeout,
-                meta_override=True,  # TODO still support this?
-            )
+            with self.profiler.span("execute"):
+                result = run_notebook(self.notebook, self.nb_config, cwd)
+            self.profiler.add_cell_timings(self.notebook)
+            cell_runtimes = pop_cell_runtimes(self.notebook)
 
         if result.err is not None:
             if self.nb_config.execution_raise_on_error:
@@ -60,4 +58,5 @@ class NotebookClientDirect(NotebookClientBase):
             "succeeded": False if result.err else True,
             "error": f"{result.err.__class__.__name__}" if result.err else None,
             "traceback": result.exc_string if result.err else None,
+            "cell_runtimes": cell_runtimes,
         }
@@ -2,7 +2,10 @@
 from __future__ import annotations
 
 import asyncio
+import copy
 from datetime import datetime
+from queue import Empty
+from pathlib import Path
 import re
 import shutil
 from tempfile import mkdtemp
@@ -11,6 +14,7 @@ import traceback
 
 from nbclient.client import (
     CellControlSignal,
+    CellExecutionComplete,
     CellExecutionError,
     CellTimeoutError,
     DeadKernelError,
@@ -24,7 +28,15 @@ from nbformat import NotebookNode
 from myst_nb.ext.glue import extract_glue_data_cell
 
 from .base import EvalNameError, ExecutionError, NotebookClientBase
-
+from .cell_cache import CellOutputCache, cell_cache_keys
+from .kernels import acquire_kernel, release_kernel
+from .snapshots import (
+    is_checkpoint,
+    prune_snapshots,
+    restore_snapshot,
+    snapshot_path,
+    take_snapshot,
+)
 
 class NotebookClientInline(NotebookClientBase):
     """A notebook client that executes the notebook inline,
@@ -38,43 +50,187 @@ class NotebookClientInline(NotebookClientBase):
         self._tmp_path = None
         if self.nb_config.execution_in_temp:
             self._tmp_path = mkdtemp()
-            resources = {"metadata": {"path": self._tmp_path}}
+            self._resources = {"metadata": {"path": self._tmp_path}}
         else:
             if self.path is None:
                 raise ValueError("Input source must exist as file, if execution_in_temp=False")
-            resources = {"metadata": {"path": str(self.path.parent)}}
+            self._resources = {"metadata": {"path": str(self.path.parent)}}
 
         self.logger.info("Starting inline execution client")
 
         self._time_start = time.perf_counter()
-        self._client = ModifiedNotebookClient(
-            self.notebook,
-            record_timing=False,
-            resources=resources,
-            allow_errors=self.nb_config.execution_allow_errors,
-            timeout=self.nb_config.execution_timeout,
-        )
-        self._client.reset_execution_trackers()
-        if self._client.km is None:
-            self._client.km = self._client.create_kernel_manager()
-        if not self._client.km.has_kernel:
-            self._client.start_new_kernel()
-            self._client.start_new_kernel_client()
-
-        # retrieve the the language_info from the kernel
-        assert self._client.kc is not None
-        msg_id = self._client.kc.kernel_info()
-        info_msg = self._client.wait_for_reply(msg_id)
+        self._client: ModifiedNotebookClient | None = None
+        self._last_cell_executed: int = -1
+        self._cell_error: None | Exception = None
+        self._exc_string: None | str = None
+        self._cell_runtimes: dict[int, float] = {}
+        # outputs of eval expressions, evaluated in a batch since the last executed cell
+        self._eval_batched = False
+        self._eval_results: dict[str, list[list[NotebookNode]]] = {}
+
+        self._cell_cache: CellOutputCache | None = None
+        self._cell_keys: dict[int, str] = {}
+        self._cells_from_cache = 0
+        self._snapshots = self.nb_config.execution_snapshots
+        if self._snapshots and not self.nb_config.execution_cell_cache:
+            self.logger.warning(
+                "Kernel snapshots require the cell cache to be enabled", subtype="exec"
+            )
+            self._snapshots = False
+        if self.nb_config.execution_cell_cache:
+            # the kernel is only started once a cell is not in the cache
+            self._cell_cache = CellOutputCache(
+                self._cache_path, self.nb_config.execution_cell_cache_size
+            )
+            self._cell_keys = cell_cache_keys(self.notebook)
+            if self._snapshots:
+                metadata_key = self.nb_config.cell_metadata_key
+                checkpoints = (
+                    key
+                    for index, key in self._cell_keys.items()
+                    if is_checkpoint(self.notebook.cells[index], metadata_key)
+                )
+                prune_snapshots(self._cache_path, self._snapshot_source, checkpoints)
+            language_info = self._cell_cache.get_language_info(self._kernel_name)
+            if language_info is not None:
+                self.notebook.metadata["language_info"] = language_info
+        else:
+            self._start_kernel(0)
+
+    @property
+    def _cache_path(self) -> str:
+        return self.nb_config.execution_cache_path or ".jupyter_cache"
+
+    @property
+    def _snapshot_source(self) -> Path | None:
+        """The source path identifying the notebook's snapshots."""
+        return None if self.path is None else self.path.resolve()
+
+    @property
+    def _kernel_name(self) -> str:
+        return self.notebook.metadata.get("kernelspec", {}).get("name", "")
+
+    def _start_kernel(self, replay_to: int) -> None:
+        """Start the kernel, and replay the code cells before the given cell index,
+        to restore the kernel state (without updating their outputs).
+        """
+        with self.profiler.span("kernel_start"):
+            self._client = ModifiedNotebookClient(
+                self.notebook,
+                km=acquire_kernel(
+                    self.notebook, self.nb_config, self._resources["metadata"]["path"]
+                ),
+                record_timing=False,
+                resources=self._resources,
+                allow_errors=self.nb_config.execution_allow_errors,
+                timeout=self.nb_config.execution_timeout,
+            )
+            self._client.reset_execution_trackers()
+            if self._client.km is None:
+                self._client.km = self._client.create_kernel_manager()
+            if not self._client.km.has_kernel:
+                self._client.start_new_kernel()
+            if self._client.kc is None:
+                self._client.start_new_kernel_client()
+
+            # retrieve the the language_info from the kernel
+            assert self._client.kc is not None
+            msg_id = self._client.kc.kernel_info()
+            info_msg = self._client.wait_for_reply(msg_id)
         if info_msg is not None and "language_info" in info_msg["content"]:
             self.notebook.metadata["language_info"] = info_msg["content"]["language_info"]
+            if self._cell_cache is not None and not self._cell_cache.set_language_info(
+                self._kernel_name, info_msg["content"]["language_info"]
+            ):
+                self.logger.info("Failed to cache the kernel language info (database locked)")
         else:
             self.logger.warning("Failed to retrieve language info from kernel")
 
-        self._last_cell_executed: int = -1
-        self._cell_error: None | Exception = None
-        self._exc_string: None | str = None
+        cells = self.notebook.get("cells", [])
+        replay_from = self._restore_snapshot(replay_to) if self._snapshots else 0
+        replay = [
+            index for index in range(replay_from, replay_to) if cells[index].cell_type == "code"
+        ]
+        if replay:
+            self.logger.info(f"Replaying {len(replay)} cached code cell(s)")
+        for index in replay:
+            if self._cell_error:
+                break
+            self._execute_cell(copy.deepcopy(cells[index]), index)
+
+    @property
+    def _snapshots_supported(self) -> bool:
+        return self.notebook.metadata.get("language_info", {}).get("name") == "python"
+
+    def _restore_snapshot(self, replay_to: int) -> int:
+        """Restore the kernel state from the last checkpoint before the given cell index,
+        for which a snapshot exists.
+
+        :returns: the index of the cell to replay from
+        """
+        assert self._client is not None and self._client.kc is not None
+        if not self._snapshots_supported:
+            return 0
+        cells = self.notebook.get("cells", [])
+        for index in reversed(range(replay_to)):
+            if index not in self._cell_keys or not is_checkpoint(
+                cells[index], self.nb_config.cell_metadata_key
+            ):
+                continue
+            path = snapshot_path(self._cache_path, self._snapshot_source, self._cell_keys[index])
+            if not path.exists():
+                continue
+            try:
+                restore_snapshot(self._client.kc, path, self.nb_config.execution_timeout)
+            except RuntimeError:
+                self.logger.warning("Failed to restore kernel state from snapshot", subtype="exec")
+                return 0
+            self.logger.info(f"Restored kernel state from snapshot, after cell {index}")
+            # continue the execution count, as if the cells had been replayed
+            self._client.code_cells_executed = sum(
+                1 for cell in cells[: index + 1] if cell.cell_type == "code"
+            )
+            return index + 1
+        return 0
+
+    def _take_snapshot(self, cell_index: int) -> None:
+        """Snapshot the kernel state after a checkpoint cell, if not already taken."""
+        assert self._client is not None and self._client.kc is not None
+        if not self._snapshots_supported:
+            return
+        path = snapshot_path(self._cache_path, self._snapshot_source, self._cell_keys[cell_index])
+        if path.exists():
+            return
+        try:
+            take_snapshot(
+                self._client.kc, path, self._snapshot_source, self.nb_config.execution_timeout
+            )
+        except RuntimeError:
+            self.logger.warning(
+                "Failed to snapshot kernel state",
+                subtype="exec",
+                line=self.cell_line(cell_index),
+            )
+
+    def _execute_cell(self, cell: NotebookNode, cell_index: int) -> None:
+        """Execute a cell, recording any execution error."""
+        assert self._client is not None
+        try:
+            with self.profiler.span("cell", cell_index=cell_index):
+                self._client.execute_cell(
+                    cell,
+                    cell_index,
+                    execution_count=self._client.code_cells_executed + 1,
+                )
+        except (CellExecutionError, CellTimeoutError) as err:
+            if self.nb_config.execution_raise_on_error:
+                raise ExecutionError(str(self.path)) from err
+            self._cell_error = err
+            self._exc_string = "".join(traceback.format_exc())
 
     def finalise_client(self):
+        if self._client is None:
+            return
         try:
             self._client.set_widgets_metadata()
         except Exception as exc:
@@ -82,9 +238,19 @@ class NotebookClientInline(NotebookClientBase):
 
     def close_client(self, exc_type, exc_val, exc_tb):
         self.logger.info("Stopping inline execution client")
-        if self._client.owns_km:
+        if self._client is None:
+            pass
+        elif self._client.owns_km:
             self._client._cleanup_kernel()
+        elif self._client.km is not None:
+            # a kernel that timed out may still be busy
+            succeeded = not isinstance(self._cell_error, CellTimeoutError)
+            release_kernel(self._client.km, self.nb_config, succeeded)
         del self._client
+        if self._cell_cache is not None:
+            self._cell_cache.close()
+            if self._cells_from_cache:
+                self.logger.info(f"Used cached outputs for {self._cells_from_cache} code cell(s)")
 
         _exec_time = time.perf_counter() - self._time_start
         self.exec_metadata = {
@@ -94,6 +260,7 @@ class NotebookClientInline(NotebookClientBase):
             "succeeded": False if self._cell_error else True,
             "error": f"{self._cell_error.__class__.__name__}" if self._cell_error else None,
             "traceback": self._exc_string,
+            "cell_runtimes": self._cell_runtimes,
         }
         if not self._cell_error:
             self.logger.info(f"Executed notebook in {_exec_time:.2f} seconds")
@@ -115,18 +282,36 @@ class NotebookClientInline(NotebookClientBase):
                 next_cell = cells[self._last_cell_executed]
             except IndexError:
                 break
+            self._eval_batched = False
+            self._eval_results.clear()
 
-            try:
-                self._client.execute_cell(
-                    next_cell,
-                    self._last_cell_executed,
-                    execution_count=self._client.code_cells_executed + 1,
-                )
-            except (CellExecutionError, CellTimeoutError) as err:
-                if self.nb_config.execution_raise_on_error:
-                    raise ExecutionError(str(self.path)) from err
-                self._cell_error = err
-                self._exc_string = "".join(traceback.format_exc())
+            cache_key = self._cell_keys.get(self._last_cell_executed)
+            cached = None
+            if self._client is None and self._cell_cache is not None and cache_key is not None:
+                cached = self._cell_cache.get_cell(cache_key)
+            if cached is not None:
+                next_cell["execution_count"], next_cell["outputs"] = cached
+                self._cells_from_cache += 1
+            elif self._client is not None or cache_key is not None:
+                if self._client is None:
+                    self._start_kernel(self._last_cell_executed)
+                    if self._cell_error:
+                        break
+                cell_start = time.perf_counter()
+                self._execute_cell(next_cell, self._last_cell_executed)
+                self._cell_runtimes[self._last_cell_executed] = time.perf_counter() - cell_start
+                if self._cell_cache is not None and cache_key is not None and not self._cell_error:
+                    if not self._cell_cache.set_cell(
+                        cache_key, next_cell.get("execution_count"), next_cell.get("outputs", [])
+                    ):
+                        self.logger.info(
+                            "Failed to cache the cell outputs (database locked)",
+                            line=self.cell_line(self._last_cell_executed),
+                        )
+                    if self._snapshots and is_checkpoint(
+                        next_cell, self.nb_config.cell_metadata_key
+                    ):
+                        self._take_snapshot(self._last_cell_executed)
 
             for key, cell_data in extract_glue_data_cell(next_cell):
                 if key in self._glue_data:
@@ -143,8 +328,38 @@ class NotebookClientInline(NotebookClientBase):
     def eval_variable(self, name: str) -> list[NotebookNode]:
         if not re.match(self.nb_config.eval_name_regex, name):
             raise EvalNameError(name)
+        if self._client is None:
+            # restore the kernel state, up to the last cell retrieved from the cache
+            self._start_kernel(self._last_cell_executed + 1)
+        assert self._client is not None
+        if self._eval_results.get(name):
+            return self._eval_results[name].pop(0)
+        if self.nb_config.eval_batch and not self._eval_batched:
+            self._eval_batched = True
+            names = self._eval_names(self._last_cell_executed + 1)
+            if name not in names:
+                names.insert(0, name)
+            if len(names) > 1:
+                for key, outputs in zip(names, self._client.eval_expressions(names)):
+                    self._eval_results.setdefault(key, []).append(outputs)
+                return self._eval_results[name].pop(0)
         return self._client.eval_expression(name)
 
+    def _eval_names(self, cell_index: int) -> list[str]:
+        """Find the (permitted) eval expressions in the markdown cells,
+        from the given cell index up to the next code cell.
+        """
+        expressions: dict[int, list[str]] = self._kwargs.get("eval_expressions", {})
+        names = []
+        cells = self.notebook.get("cells", [])
+        for index in range(cell_index, len(cells)):
+            if cells[index].cell_type == "code":
+                break
+            for name in expressions.get(index, []):
+                if re.match(self.nb_config.eval_name_regex, name):
+                    names.append(name)
+        return names
+
 
 class ModifiedNotebookClient(NotebookClient):
     async def async_eval_expression(self, name: str) -> list[NotebookNode]:
@@ -197,3 +412,63 @@ class ModifiedNotebookClient(NotebookClient):
         return cell.outputs
 
     eval_expression = run_sync(async_eval_expression)
+
+    async def async_eval_expressions(self, names: list[str]) -> list[list[NotebookNode]]:
+        """Evaluate multiple expressions in the kernel.
+
+        All requests are sent to the kernel together,
+        then the outputs are collected from a single poll of the iopub channel,
+        and routed to each expression by its parent message ID.
+        """
+        assert self.kc is not None
+        self.log.debug(f"Evaluating expressions: {names}")
+        cells: dict[str, NotebookNode] = {}
+        for name in names:
+            parent_msg_id = await ensure_async(
+                self.kc.execute(
+                    str(name),
+                    store_history=False,
+                    stop_on_error=False,
+                )
+            )
+            cells[parent_msg_id] = nbformat.v4.new_code_cell(source=str(name))
+        self.clear_before_next_output = False
+
+        # the timeout applies to each expression in turn
+        pending = list(cells)
+        exec_timeout = self._get_timeout(cells[pending[0]])
+        deadline = None if exec_timeout is None else time.monotonic() + exec_timeout
+        while pending:
+            try:
+                msg = await ensure_async(self.kc.get_iopub_msg(timeout=1))
+            except Empty:
+                await self._async_check_alive()
+                if deadline is not None and time.monotonic() > deadline:
+                    raise CellTimeoutError.error_from_timeout_and_cell(
+                        "Timeout waiting for expression evaluation",
+                        exec_timeout,  # type: ignore[arg-type]
+                        cells[pending[0]],
+                    )
+                continue
+            parent_msg_id = msg["parent_header"].get("msg_id")
+            if parent_msg_id not in cells:
+                continue
+            try:
+                self.process_message(msg, cells[parent_msg_id], -1)
+            except CellExecutionComplete:
+                pending.remove(parent_msg_id)
+                if deadline is not None:
+                    deadline = time.monotonic() + exec_timeout  # type: ignore[operator]
+
+        # consume the execution replies
+        replies = set(cells)
+        while replies:
+            try:
+                reply = await ensure_async(self.kc.get_shell_msg(timeout=1))
+            except Empty:
+                break
+            replies.discard(reply["parent_header"].get("msg_id"))
+
+        return [cell.outputs for cell in cells.values()]
+
+    eval_expressions = run_sync(async_eval_expressions)
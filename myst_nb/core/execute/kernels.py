@@ -0,0 +1,279 @@
+"""A pool of started kernels, shared by the notebooks executed in a process.
+
+Starting a kernel can take a number of seconds,
+which for short notebooks may be longer than executing them.
+Kernels are therefore started in advance, and handed out to notebooks by kernel name,
+then either shut down or, if requested, reset and returned to the pool.
+
+The pool should be shut down with `shutdown_kernel_pool`, once no more notebooks
+are executed in the process (``atexit`` handlers are not run in multiprocessing
+worker processes, so are not relied on).
+For worker processes, it is also shut down by a multiprocessing finalizer,
+which is run as the worker exits.
+"""
+from __future__ import annotations
+
+from multiprocessing.util import Finalize
+import os
+from typing import Any
+
+from jupyter_cache.executors.utils import ExecutionResult, single_nb_execution
+from jupyter_client.asynchronous import AsyncKernelClient
+from jupyter_client.kernelspec import NATIVE_KERNEL_NAME, KernelSpecManager, NoSuchKernel
+from jupyter_client.manager import AsyncKernelManager
+from nbclient.exceptions import CellTimeoutError
+from nbclient.util import ensure_async, run_sync
+from nbformat import NotebookNode
+from traitlets import Type
+
+from myst_nb.core.config import NbParserConfig
+
+# code to reset a (python) kernel to a fresh state, before it is re-used
+_RESET_CODE = "get_ipython().reset(new_session=True)"
+
+
+class PooledKernelClient(AsyncKernelClient):
+    """A kernel client, which may be handed to multiple notebook clients in turn."""
+
+    def start_channels(self, *args: Any, **kwargs: Any) -> None:
+        """Start the channels, if they are not already running."""
+        if not self.channels_running:
+            super().start_channels(*args, **kwargs)
+
+
+class PooledKernelManager(AsyncKernelManager):
+    """A kernel manager, with a single kernel client that is re-used."""
+
+    client_factory = Type(klass=PooledKernelClient)
+
+    _pooled_client: PooledKernelClient | None = None
+
+    def client(self, **kwargs: Any) -> PooledKernelClient:  # type: ignore[override]
+        """Get the client for the manager."""
+        if self._pooled_client is None:
+            self._pooled_client = super().client(**kwargs)  # type: ignore[assignment]
+        return self._pooled_client  # type: ignore[return-value]
+
+
+class KernelPool:
+    """A pool of started kernels, by kernel name."""
+
+    def __init__(self) -> None:
+        self._pid = os.getpid()
+        self._idle: dict[str, list[PooledKernelManager]] = {}
+        self._returning: dict[str, int] = {}
+        self._languages: dict[str, str | None] = {}
+
+    def is_poolable(self, kernel_name: str) -> bool:
+        """Return whether kernels of this name can be pooled.
+
+        Only python kernels are pooled,
+        since their working directory has to be changed on acquisition.
+        """
+        if kernel_name not in self._languages:
+            try:
+                spec = KernelSpecManager().get_kernel_spec(kernel_name)
+            except NoSuchKernel:
+                self._languages[kernel_name] = None
+            else:
+                self._languages[kernel_name] = spec.language
+        return self._languages[kernel_name] == "python"
+
+    def acquire(
+        self, kernel_name: str, cwd: str, size: int, reuse: bool, timeout: int = 60
+    ) -> PooledKernelManager:
+        """Take a started kernel from the pool, and start others in its place.
+
+        :param kernel_name: The name of the kernel
+        :param cwd: The working directory to set for the kernel
+        :param size: The number of kernels to keep ready in the pool
+        :param reuse: Whether the kernel will be returned to the pool, after use
+        :param timeout: The time to wait (in seconds) for the kernel to be ready
+        """
+        idle = self._idle.setdefault(kernel_name, [])
+        km: PooledKernelManager | None = None
+        while idle and km is None:
+            candidate = idle.pop(0)
+            if run_sync(candidate.is_alive)():
+                km = candidate
+            else:
+                self._shutdown(candidate)
+        if km is None:
+            km = self._start(kernel_name)
+        if reuse:
+            self._returning[kernel_name] = self._returning.get(kernel_name, 0) + 1
+
+        # start kernels in advance, for subsequent notebooks
+        while len(idle) + self._returning.get(kernel_name, 0) < size:
+            idle.append(self._start(kernel_name))
+
+        try:
+            kc = km.client()
+            kc.start_channels()
+            run_sync(kc.wait_for_ready)(timeout=timeout)
+            run_silent(kc, f"__import__('os').chdir({cwd!r})", timeout)
+        except Exception:
+            self.release(km, reuse=False)
+            raise
+        return km
+
+    def release(self, km: PooledKernelManager, reuse: bool, timeout: int = 60) -> None:
+        """Return a kernel to the pool, after use, or shut it down.
+
+        :param km: The kernel manager, as returned by `acquire`
+        :param reuse: Whether to reset the kernel and return it to the pool
+        :param timeout: The time to wait (in seconds) for the kernel to reset
+        """
+        kernel_name = km.kernel_name
+        if kernel_name in self._returning:
+            self._returning[kernel_name] = max(0, self._returning[kernel_name] - 1)
+        if reuse and run_sync(km.is_alive)():
+            try:
+                run_silent(km.client(), _RESET_CODE, timeout)
+            except Exception:
+                pass
+            else:
+                # prefer re-used kernels, since they will have imported modules cached
+                self._idle.setdefault(kernel_name, []).insert(0, km)
+                return
+        self._shutdown(km)
+
+    def shutdown(self) -> None:
+        """Shut down all idle kernels in the pool."""
+        if os.getpid() != self._pid:
+            # kernels are owned by the parent of a forked process
+            return
+        for kernels in self._idle.values():
+            while kernels:
+                self._shutdown(kernels.pop())
+
+    @staticmethod
+    def _start(kernel_name: str) -> PooledKernelManager:
+        """Start a kernel (without waiting for it to be ready)."""
+        km = PooledKernelManager(kernel_name=kernel_name)
+        # as for nbclient, do not write the kernel history to the user's database
+        run_sync(km.start_kernel)(extra_arguments=["--HistoryManager.hist_file=:memory:"])
+        return km
+
+    @staticmethod
+    def _shutdown(km: PooledKernelManager) -> None:
+        """Shut down a kernel, and stop its client."""
+        try:
+            if run_sync(km.is_alive)():
+                run_sync(km.shutdown_kernel)()
+        except RuntimeError:
+            pass
+        finally:
+            if km._pooled_client is not None:
+                km._pooled_client.stop_channels()
+            run_sync(km.cleanup_resources)()
+
+
+_POOLS: dict[int, KernelPool] = {}
+
+
+def get_kernel_pool() -> KernelPool:
+    """Get the kernel pool for the current process."""
+    pid = os.getpid()
+    if pid not in _POOLS:
+        _POOLS[pid] = KernelPool()
+        # run as a multiprocessing worker process exits (e.g. of a `ProcessPoolExecutor`)
+        Finalize(None, shutdown_kernel_pool, exitpriority=10)
+    return _POOLS[pid]
+
+
+def shutdown_kernel_pool() -> None:
+    """Shut down the idle kernels in the pool of the current process, if any."""
+    pool = _POOLS.pop(os.getpid(), None)
+    if pool is not None:
+        pool.shutdown()
+
+
+def acquire_kernel(
+    notebook: NotebookNode, nb_config: NbParserConfig, cwd: str
+) -> PooledKernelManager | None:
+    """Take a started kernel from the pool, to execute a notebook.
+
+    :param notebook: The notebook to execute
+    :param nb_config: The configuration for the notebook
+    :param cwd: The working directory to execute the notebook in
+
+    :returns: The kernel manager, or None if kernels of this name are not pooled
+    """
+    if nb_config.execution_kernel_pool < 1:
+        return None
+    kernel_name = notebook.metadata.get("kernelspec", {}).get("name") or NATIVE_KERNEL_NAME
+    pool = get_kernel_pool()
+    if not pool.is_poolable(kernel_name):
+        return None
+    return pool.acquire(
+        kernel_name,
+        cwd,
+        nb_config.execution_kernel_pool,
+        nb_config.execution_kernel_reuse,
+    )
+
+
+def release_kernel(
+    km: PooledKernelManager, nb_config: NbParserConfig, succeeded: bool = True
+) -> None:
+    """Return a kernel to the pool, after executing a notebook.
+
+    :param km: The kernel manager, as returned by `acquire_kernel`
+    :param nb_config: The configuration for the notebook
+    :param succeeded: Whether the execution succeeded,
+        otherwise the kernel may still be busy, and is not re-used
+    """
+    get_kernel_pool().release(km, nb_config.execution_kernel_reuse and succeeded)
+
+
+def run_notebook(notebook: NotebookNode, nb_config: NbParserConfig, cwd: str) -> ExecutionResult:
+    """Execute a notebook in-place, with a kernel from the pool if available.
+
+    The execution times of each cell are recorded in the cell metadata,
+    see `myst_nb.core.profile.pop_cell_runtimes`.
+
+    :param notebook: The notebook to execute
+    :param nb_config: The configuration for the notebook
+    :param cwd: The working directory to execute the notebook in
+    """
+    kwargs: dict[str, Any] = {}
+    km = acquire_kernel(notebook, nb_config, cwd)
+    if km is not None:
+        kwargs["km"] = km
+    result: ExecutionResult | None = None
+    try:
+        result = single_nb_execution(
+            notebook,
+            cwd=cwd,
+            allow_errors=nb_config.execution_allow_errors,
+            timeout=nb_config.execution_timeout,
+            meta_override=True,  # TODO still support this?
+            record_timing=True,
+            **kwargs,
+        )
+    finally:
+        if km is not None:
+            # a kernel that timed out may still be busy
+            succeeded = result is not None and not isinstance(result.err, CellTimeoutError)
+            release_kernel(km, nb_config, succeeded)
+    return result
+
+
+def run_silent(kc: AsyncKernelClient, code: str, timeout: int | None) -> None:
+    """Execute code in the kernel (synchronously), without storing history or outputs.
+
+    :raises RuntimeError: if the code raised an exception
+    """
+    run_sync(_run_silent)(kc, code, timeout)
+
+
+async def _run_silent(kc: AsyncKernelClient, code: str, timeout: int | None) -> None:
+    """Execute code in the kernel, without storing history or outputs."""
+    msg_id = kc.execute(code, silent=True, store_history=False, allow_stdin=False)
+    while True:
+        reply = await ensure_async(kc.get_shell_msg(timeout=timeout))
+        if reply["parent_header"].get("msg_id") == msg_id:
+            break
+    if reply["content"]["status"] != "ok":
+        raise RuntimeError(f"Kernel failed to execute: {code!r}")
@@ -0,0 +1,364 @@
+"""Execute notebooks in a pool of worker processes, before they are parsed.
+
+Notebooks that successfully execute are added to the jupyter-cache,
+so that the `NotebookClientCache` can retrieve them on parsing.
+
+The worker processes are either local (a process pool),
+or poll a job queue folder in the jupyter-cache folder,
+which may be shared with workers on other machines (see `run_queue_worker`).
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+from pathlib import Path, PurePosixPath
+import pickle
+import signal
+from tempfile import TemporaryDirectory
+import time
+from typing import Any, Iterator, NamedTuple, Sequence
+import uuid
+
+from jupyter_cache import get_cache
+from jupyter_cache.base import CacheBundleIn
+from jupyter_cache.cache.db import NbProjectRecord
+from jupyter_cache.executors.utils import ExecutionResult as CacheExecutionResult
+from nbformat import NotebookNode
+
+from myst_nb.core.config import NbParserConfig
+from myst_nb.core.execute.kernels import run_notebook, shutdown_kernel_pool
+from myst_nb.core.loggers import LoggerType
+from myst_nb.core.profile import pop_cell_runtimes
+
+QUEUE_FOLDER = "mystnb_queue"
+"""The name of the job queue folder, in the execution cache folder."""
+
+# failed executions, by notebook path, so that they are not re-executed on parsing
+_FAILED_EXECUTIONS: dict[str, CacheExecutionResult] = {}
+
+
+class PreExecutionJob(NamedTuple):
+    """A notebook to (potentially) execute before parsing."""
+
+    path: Path
+    """The path to the notebook source."""
+    notebook: NotebookNode
+    """The notebook, as read from the source."""
+    nb_config: NbParserConfig
+    """The configuration for the notebook (including notebook level overrides)."""
+    logger: LoggerType
+    """The logger for the notebook."""
+    read_fmt: dict | None = None
+    """The format of the source, to pass to jupyter-cache."""
+
+
+def requires_pre_execution(job: PreExecutionJob) -> bool:
+    """Return whether the notebook should be executed before parsing.
+
+    This is only the case for notebooks in 'cache' or 'queue' mode,
+    that are not excluded from execution and have no match in the cache.
+    """
+    if job.nb_config.execution_mode not in ("cache", "queue"):
+        return False
+    posix_path = PurePosixPath(job.path.as_posix())
+    if any(posix_path.match(pattern) for pattern in job.nb_config.execution_excludepatterns):
+        return False
+    cache = get_cache(job.nb_config.execution_cache_path or ".jupyter_cache")
+    try:
+        cache.match_cache_notebook(job.notebook)
+    except KeyError:
+        return True
+    return False
+
+
+def execute_notebooks(jobs: Sequence[PreExecutionJob], workers: int) -> None:
+    """Execute notebooks over a pool of worker processes, and cache the outputs.
+
+    :param jobs: The notebooks to execute
+    :param workers: The maximum number of worker processes
+    """
+    if not jobs:
+        return
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        futures = {}
+        for job in jobs:
+            future = pool.submit(
+                _execute_notebook,
+                job.notebook,
+                str(job.path.parent),
+                job.nb_config,
+            )
+            futures[future] = (job, _stage_notebook(job))
+
+        for future in as_completed(futures):
+            job, stage = futures[future]
+            try:
+                result: CacheExecutionResult = future.result()
+            except Exception as exc:
+                _record_result(job, stage, exc)
+            else:
+                _record_result(job, stage, result)
+
+
+def queue_notebooks(
+    jobs: Sequence[PreExecutionJob], queue_path: str | Path, workers: int, timeout: int
+) -> None:
+    """Execute notebooks through a job queue folder, and cache the outputs.
+
+    :param jobs: The notebooks to execute
+    :param queue_path: The job queue folder
+    :param workers: The number of local worker processes to start
+        (in addition to any workers already polling the queue)
+    :param timeout: The maximum time (in seconds) to wait for the next job to complete,
+        before leaving the remaining notebooks to be executed on parsing (-1 for no limit)
+    """
+    if not jobs:
+        return
+    queue = JobQueue(queue_path)
+    pending = {}
+    for job in jobs:
+        stage = _stage_notebook(job)
+        job_id = queue.submit(job.notebook, str(job.path.parent), job.nb_config)
+        pending[job_id] = (job, stage)
+
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(jobs))) if workers > 0 else None
+    try:
+        for _ in range(min(workers, len(jobs)) if pool is not None else 0):
+            pool.submit(_run_local_queue_worker, str(queue_path))
+        for job_id, result in queue.results(list(pending), timeout):
+            _record_result(*pending.pop(job_id), result)
+        for job_id, (job, _) in pending.items():
+            queue.cancel(job_id)
+            job.logger.warning(
+                "Timed out waiting for the queued execution of the notebook", subtype="exec"
+            )
+    finally:
+        if pool is not None:
+            if pending:
+                # stop the local workers executing cancelled jobs,
+                # since the notebooks will be executed on parsing
+                _terminate_pool(pool)
+            else:
+                pool.shutdown(wait=True)
+
+
+def _run_local_queue_worker(queue_path: str) -> None:
+    """Run a queue worker (until the queue is empty) in a local worker process,
+    exiting cleanly when terminated.
+    """
+
+    def _exit(signum: int, frame: Any) -> None:
+        raise SystemExit(1)
+
+    signal.signal(signal.SIGTERM, _exit)
+    run_queue_worker(queue_path, stop_when_idle=True)
+
+
+def _terminate_pool(pool: ProcessPoolExecutor) -> None:
+    """Cancel the pending tasks of a process pool, and terminate its running workers."""
+    if hasattr(pool, "terminate_workers"):  # Python >= 3.14
+        pool.terminate_workers()
+        return
+    # note, there is no public API to access the worker processes before Python 3.14
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def _stage_notebook(job: PreExecutionJob) -> tuple[Any, NbProjectRecord]:
+    """Add the notebook to the cache project, and return the cache and its record."""
+    cache = get_cache(job.nb_config.execution_cache_path or ".jupyter_cache")
+    if job.read_fmt is not None:
+        stage_record = cache.add_nb_to_project(str(job.path), read_data=job.read_fmt)
+    else:
+        stage_record = cache.add_nb_to_project(str(job.path))
+    NbProjectRecord.remove_tracebacks([stage_record.pk], cache.db)
+    return cache, stage_record
+
+
+def _record_result(
+    job: PreExecutionJob,
+    stage: tuple[Any, NbProjectRecord],
+    result: CacheExecutionResult | Exception,
+) -> None:
+    """Add a successful execution to the cache, or record a failed one."""
+    cache, stage_record = stage
+    if isinstance(result, Exception):
+        # leave the notebook to be executed on parsing
+        job.logger.warning(f"Pre-executing notebook errored: {result}", subtype="exec")
+        return
+    if result.err is not None:
+        NbProjectRecord.set_traceback(stage_record.uri, result.exc_string, cache.db)
+        _FAILED_EXECUTIONS[str(job.path)] = result
+        return
+    job.logger.info(f"Pre-executed notebook in {result.time:.2f} seconds")
+    cell_runtimes = pop_cell_runtimes(result.nb)
+    cache_record = cache.cache_notebook_bundle(
+        CacheBundleIn(
+            result.nb,
+            stage_record.uri,
+            data={"execution_seconds": result.time, "cell_runtimes": cell_runtimes},
+        ),
+        check_validity=False,
+        overwrite=True,
+    )
+    job.logger.info(f"Cached executed notebook: ID={cache_record.pk}")
+
+
+def pop_failed_execution(path: Path | None) -> CacheExecutionResult | None:
+    """Return (and forget) the result of a failed execution for a notebook, if any."""
+    if path is None:
+        return None
+    return _FAILED_EXECUTIONS.pop(str(path), None)
+
+
+def _execute_notebook(
+    notebook: NotebookNode, cwd: str, nb_config: NbParserConfig
+) -> CacheExecutionResult:
+    """Execute a notebook in a worker process."""
+    if nb_config.execution_in_temp:
+        with TemporaryDirectory() as tmpdir:
+            return run_notebook(notebook, nb_config, os.path.abspath(tmpdir))
+    return run_notebook(notebook, nb_config, os.path.abspath(cwd))
+
+
+class JobQueue:
+    """A queue of notebook execution jobs, stored in a folder.
+
+    Each job is a file, which moves from the ``pending`` to the ``running`` sub-folder
+    when claimed by a worker (with an atomic rename, so that it is claimed only once),
+    and its result is written to the ``results`` sub-folder.
+    Cancelled jobs are marked in the ``cancelled`` sub-folder,
+    so that no result is written for them.
+    """
+
+    stale_seconds: float = 3600
+    """The age (in seconds) after which result, cancelled and temporary files are
+    considered orphaned (no longer waited for), and removed when the queue is opened."""
+
+    def __init__(self, path: str | Path) -> None:
+        """Initialise the queue, and remove any stale files.
+
+        :param path: The queue folder (created if missing)
+        """
+        self._path = Path(path)
+        for name in ("pending", "running", "results", "cancelled", "tmp"):
+            self._path.joinpath(name).mkdir(parents=True, exist_ok=True)
+        self._sweep()
+
+    def _sweep(self) -> None:
+        """Remove result, cancelled and temporary files older than `stale_seconds`."""
+        oldest = time.time() - self.stale_seconds
+        for name in ("results", "cancelled", "tmp"):
+            for path in self._path.joinpath(name).iterdir():
+                try:
+                    if path.stat().st_mtime < oldest:
+                        path.unlink()
+                except FileNotFoundError:
+                    pass  # removed by another process
+
+    def _write(self, folder: str, job_id: str, data: Any) -> None:
+        """Write a file to a sub-folder (atomically)."""
+        tmp_path = self._path / "tmp" / f"{job_id}.{uuid.uuid4().hex}"
+        tmp_path.write_bytes(pickle.dumps(data))
+        os.replace(tmp_path, self._path / folder / f"{job_id}.pickle")
+
+    def submit(self, notebook: NotebookNode, cwd: str, nb_config: NbParserConfig) -> str:
+        """Add a job to the queue, and return its ID."""
+        # IDs are ordered by submission time, so that jobs are claimed in order
+        job_id = f"{time.time_ns()}-{uuid.uuid4().hex}"
+        self._write("pending", job_id, (notebook, cwd, nb_config))
+        return job_id
+
+    def claim(self) -> tuple[str, tuple[NotebookNode, str, NbParserConfig]] | None:
+        """Claim the next pending job, if any."""
+        for name in sorted(os.listdir(self._path / "pending")):
+            running_path = self._path / "running" / name
+            try:
+                os.rename(self._path / "pending" / name, running_path)
+            except OSError:
+                continue  # claimed by another worker
+            return Path(name).stem, pickle.loads(running_path.read_bytes())
+        return None
+
+    def complete(self, job_id: str, result: CacheExecutionResult | Exception) -> None:
+        """Write the result of a job, unless it has been cancelled."""
+        cancelled = self._path.joinpath("cancelled", f"{job_id}.pickle")
+        if not cancelled.exists():
+            self._write("results", job_id, result)
+            if cancelled.exists():
+                # cancelled while the result was written
+                self._path.joinpath("results", f"{job_id}.pickle").unlink(missing_ok=True)
+        self._path.joinpath("running", f"{job_id}.pickle").unlink(missing_ok=True)
+
+    def cancel(self, job_id: str) -> None:
+        """Remove a job, and any result for it, and prevent any later result."""
+        self._write("cancelled", job_id, None)
+        for folder in ("pending", "running", "results"):
+            self._path.joinpath(folder, f"{job_id}.pickle").unlink(missing_ok=True)
+
+    def results(
+        self, job_ids: Sequence[str], timeout: int, poll_interval: float = 0.5
+    ) -> Iterator[tuple[str, CacheExecutionResult | Exception]]:
+        """Yield the results of jobs, as they complete.
+
+        :param job_ids: The jobs to wait for
+        :param timeout: The maximum time (in seconds) to wait for the next result
+            (-1 for no limit)
+        :param poll_interval: The time (in seconds) between checks for results
+        """
+        waiting = set(job_ids)
+        deadline = None if timeout < 0 else time.monotonic() + timeout
+        while waiting:
+            completed = False
+            for job_id in sorted(waiting):
+                path = self._path / "results" / f"{job_id}.pickle"
+                if not path.exists():
+                    continue
+                result = pickle.loads(path.read_bytes())
+                path.unlink()
+                waiting.discard(job_id)
+                completed = True
+                yield job_id, result
+            if completed:
+                deadline = None if timeout < 0 else time.monotonic() + timeout
+            elif deadline is not None and time.monotonic() > deadline:
+                return
+            else:
+                time.sleep(poll_interval)
+
+
+def run_queue_worker(
+    queue_path: str | Path, stop_when_idle: bool = False, poll_interval: float = 1.0
+) -> None:
+    """Execute the jobs of a queue folder, as they are submitted.
+
+    :param queue_path: The job queue folder
+    :param stop_when_idle: Whether to return once no jobs are pending (or poll indefinitely)
+    :param poll_interval: The time (in seconds) between checks for pending jobs
+    """
+    queue = JobQueue(queue_path)
+    try:
+        while True:
+            claimed = queue.claim()
+            if claimed is None:
+                if stop_when_idle:
+                    return
+                time.sleep(poll_interval)
+                continue
+            job_id, (notebook, cwd, nb_config) = claimed
+            result: CacheExecutionResult | Exception
+            try:
+                result = _execute_notebook(notebook, cwd, nb_config)
+            except Exception as exc:
+                result = exc
+            try:
+                queue.complete(job_id, result)
+            except Exception as exc:
+                # e.g. the result could not be pickled
+                queue.complete(job_id, RuntimeError(f"Failed to store result: {exc}"))
+    finally:
+        shutdown_kernel_pool()
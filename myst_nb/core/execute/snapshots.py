@@ -0,0 +1,168 @@
+"""Snapshots of the (Python) kernel state, taken after checkpoint cells.
+
+A snapshot serializes the user namespace of the kernel (with ``dill`` if available,
+otherwise ``pickle``), keyed by the cell cache key of the checkpoint cell,
+i.e. by the code that led up to it.
+It can then be restored into a fresh kernel,
+rather than re-executing all the code cells before the checkpoint.
+
+Modules are stored by name, and re-imported on restore.
+Variables are serialized separately, and those that cannot be (such as open files)
+are skipped, so the code cells after a checkpoint should not depend on them.
+This includes, with ``pickle``, functions and classes defined in the notebook,
+which are pickled by reference to the kernel's ``__main__`` module,
+and so cannot be loaded into a fresh kernel.
+
+Snapshots are stored in a folder per notebook, so that those of previous versions
+of the notebook, or of notebooks that have been removed, can be pruned.
+"""
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+import shutil
+from typing import Iterable
+
+from jupyter_client.asynchronous import AsyncKernelClient
+from nbformat import NotebookNode
+
+from .kernels import run_silent
+
+SNAPSHOT_FOLDER = "mystnb_snapshots"
+"""The name of the snapshots folder, in the execution cache folder."""
+
+SOURCE_FILE_NAME = "source.txt"
+"""The name of the file recording the notebook source path, in its snapshots folder."""
+
+CHECKPOINT_TAG = "checkpoint"
+"""The cell tag, designating a checkpoint cell."""
+
+_SNAPSHOT_CODE = """\
+def __mystnb_snapshot(path):
+    import io, os, pickle, types
+    try:
+        import dill as serializer
+        loads = serializer.loads
+    except ImportError:
+        serializer = pickle
+
+        class Unpickler(pickle.Unpickler):
+            def find_class(self, module, name):
+                # references to __main__ do not resolve in a fresh kernel
+                if module == "__main__":
+                    raise pickle.UnpicklingError(f"{{module}}.{{name}}")
+                return super().find_class(module, name)
+
+        def loads(data):
+            return Unpickler(io.BytesIO(data)).load()
+    shell = get_ipython()
+    modules, variables = {{}}, {{}}
+    for name, value in shell.user_ns.items():
+        if name.startswith("_") or name in shell.user_ns_hidden:
+            continue
+        if isinstance(value, types.ModuleType):
+            modules[name] = value.__name__
+            continue
+        # only keep variables that round-trip
+        try:
+            data = serializer.dumps(value)
+            loads(data)
+        except Exception:
+            continue
+        variables[name] = data
+    data = pickle.dumps((modules, variables))
+    with open(path + ".tmp", "wb") as handle:
+        handle.write(data)
+    os.replace(path + ".tmp", path)
+try:
+    __mystnb_snapshot({path!r})
+finally:
+    del __mystnb_snapshot
+"""
+
+_RESTORE_CODE = """\
+def __mystnb_restore(path):
+    import importlib, pickle
+    try:
+        import dill as serializer
+    except ImportError:
+        serializer = pickle
+    with open(path, "rb") as handle:
+        modules, variables = pickle.loads(handle.read())
+    namespace = {{}}
+    for name, module in modules.items():
+        try:
+            namespace[name] = importlib.import_module(module)
+        except Exception:
+            pass
+    for name, data in variables.items():
+        try:
+            namespace[name] = serializer.loads(data)
+        except Exception:
+            pass
+    get_ipython().user_ns.update(namespace)
+try:
+    __mystnb_restore({path!r})
+finally:
+    del __mystnb_restore
+"""
+
+
+def is_checkpoint(cell: NotebookNode, metadata_key: str) -> bool:
+    """Return whether a code cell is designated as a checkpoint,
+    by the ``checkpoint`` tag, or ``checkpoint: true`` under the cell metadata key.
+    """
+    if CHECKPOINT_TAG in cell.get("metadata", {}).get("tags", []):
+        return True
+    return bool(cell.get("metadata", {}).get(metadata_key, {}).get("checkpoint", False))
+
+
+def snapshot_path(cache_path: str | Path, source: Path | None, key: str) -> Path:
+    """Return the path of the snapshot for a cell cache key,
+    in the folder for the notebook (identified by the hash of its source path).
+    """
+    source_id = hashlib.sha256(str(source or "").encode("utf8")).hexdigest()
+    return Path(cache_path) / SNAPSHOT_FOLDER / source_id / f"{key}.pickle"
+
+
+def prune_snapshots(cache_path: str | Path, source: Path | None, keys: Iterable[str]) -> None:
+    """Remove the snapshots of a notebook that do not match its current checkpoint keys,
+    and the snapshots of notebooks whose source file no longer exists.
+    """
+    folder = snapshot_path(cache_path, source, "").parent
+    keys = set(keys)
+    for path in folder.glob("*.pickle"):
+        if path.stem not in keys:
+            path.unlink(missing_ok=True)
+    for other in Path(cache_path, SNAPSHOT_FOLDER).glob("*/"):
+        try:
+            other_source = other.joinpath(SOURCE_FILE_NAME).read_text("utf8")
+        except OSError:
+            continue
+        if other_source and not Path(other_source).exists():
+            shutil.rmtree(other, ignore_errors=True)
+
+
+def take_snapshot(
+    kc: AsyncKernelClient, path: Path, source: Path | None, timeout: int | None
+) -> None:
+    """Serialize the kernel's user namespace to a file.
+
+    :param source: the source path of the notebook, recorded for pruning
+    :raises RuntimeError: if the snapshot could not be written
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    source_file = path.parent / SOURCE_FILE_NAME
+    if not source_file.exists():
+        source_file.write_text(str(source or ""), "utf8")
+    run_silent(kc, _SNAPSHOT_CODE.format(path=str(path)), timeout)
+
+
+def restore_snapshot(kc: AsyncKernelClient, path: Path, timeout: int | None) -> None:
+    """Restore the kernel's user namespace from a file.
+
+    Modules and variables that can no longer be loaded are skipped.
+
+    :raises RuntimeError: if the snapshot could not be loaded
+    """
+    run_silent(kc, _RESTORE_CODE.format(path=str(path)), timeout)
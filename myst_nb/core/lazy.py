@@ -0,0 +1,219 @@
+"""Lazy loading of large output data, for reading notebooks with a low memory footprint.
+
+Base64 encoded output data (such as images) is often the majority of a notebook file.
+Rather than loading it all into memory,
+the notebook file is memory-mapped and the data is left in the file,
+only being loaded when it is rendered (or the notebook is written).
+The file is only mapped if its content is identical to the text being parsed,
+otherwise (e.g. if the text was modified by a ``source-read`` handler)
+the data is left in the (encoded) text.
+The mapped files should be closed with `close_nb_buffers`, once the notebook is parsed.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+from pathlib import Path
+import re
+from typing import Any
+from uuid import uuid4
+
+import nbformat as nbf
+
+LAZY_MIME_TYPES = ("image/png", "image/jpeg", "image/gif", "application/pdf")
+"""Mime types of (base64 encoded) output data that may be loaded lazily."""
+
+_LAZY_DATA_RGX = re.compile(
+    rb'"(' + b"|".join(re.escape(m.encode()) for m in LAZY_MIME_TYPES) + rb')"\s*:\s*"'
+)
+
+
+class LazyOutputData:
+    """A reference to a (base64 encoded) output data string,
+    in a memory-mapped file (or encoded notebook text).
+    """
+
+    __slots__ = ("_buffer", "_start", "_end")
+
+    def __init__(self, buffer: mmap.mmap | bytes, start: int, end: int) -> None:
+        """Initialise the reference.
+
+        :param buffer: The memory-mapped file, or encoded notebook text
+        :param start: The start of the (JSON encoded) string content in the file
+        :param end: The end of the (JSON encoded) string content in the file
+        """
+        self._buffer = buffer
+        self._start = start
+        self._end = end
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(start={self._start}, end={self._end})"
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __deepcopy__(self, memo: dict) -> LazyOutputData:
+        # the data is immutable, so does not need to be copied
+        return self
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # memory-mapped files cannot be pickled, so load the data
+        return (str, (self.load(),))
+
+    def load(self) -> str:
+        """Load the data from the file."""
+        raw = self._buffer[self._start : self._end]
+        if b"\\" in raw:
+            # the string contains JSON escapes, like `\n`
+            return json.loads(b'"' + raw + b'"')
+        return raw.decode("ascii")
+
+
+def load_output_data(value: Any) -> Any:
+    """Load the value, if it is lazy output data, else return it unchanged."""
+    if isinstance(value, LazyOutputData):
+        return value.load()
+    return value
+
+
+def lazy_nb_read(text: str, *, path: str, min_size: int) -> nbf.NotebookNode:
+    """Read a standard .ipynb notebook,
+    with large output data left in the (memory-mapped) file.
+
+    :param text: The notebook content
+    :param path: The path to the notebook file
+        (only mapped if its content is identical to ``text``)
+    :param min_size: The minimum size (in bytes) of output data to load lazily
+    """
+    encoded = text.encode("utf8")
+    buffer: mmap.mmap | bytes = encoded
+    try:
+        with open(path, "rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        pass  # e.g. the file does not exist or is empty
+    else:
+        if _buffer_equals(mapped, encoded):
+            buffer = mapped
+        else:
+            # the text has been modified since it was read from the file
+            mapped.close()
+    del encoded
+
+    # replace the output data strings with placeholders, before parsing the JSON
+    placeholder = f"mystnb-lazy-{uuid4().hex}-"
+    references: dict[str, LazyOutputData] = {}
+    chunks: list[bytes] = []
+    position = 0
+    for match in _LAZY_DATA_RGX.finditer(buffer):  # type: ignore[call-overload]
+        start = match.end()
+        end = buffer.find(b'"', start)
+        if end - start < min_size:
+            continue
+        key = f"{placeholder}{len(references)}"
+        references[key] = LazyOutputData(buffer, start, end)
+        chunks.append(buffer[position:start])
+        chunks.append(key.encode("ascii"))
+        position = end
+    if not references:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+        return nbf.reads(text, as_version=4)
+    chunks.append(buffer[position:])
+    notebook = nbf.reads(b"".join(chunks).decode("utf8"), as_version=4)
+    del chunks
+
+    # replace the placeholders in outputs with the references
+    for cell in notebook.cells:
+        for output in cell.get("outputs", []):
+            data = output.get("data", {})
+            for mime_type, value in data.items():
+                if isinstance(value, str) and value in references:
+                    data[mime_type] = references.pop(value)
+    # load any other data eagerly, such as markdown cell attachments
+    if references:
+        _replace_strings(notebook, {key: ref.load() for key, ref in references.items()})
+
+    return notebook
+
+
+def _buffer_equals(buffer: mmap.mmap, content: bytes, chunk_size: int = 1 << 20) -> bool:
+    """Return whether a memory-mapped file has the given content (compared in chunks)."""
+    if len(buffer) != len(content):
+        return False
+    view = memoryview(content)
+    for start in range(0, len(content), chunk_size):
+        if buffer[start : start + chunk_size] != view[start : start + chunk_size]:
+            return False
+    return True
+
+
+def close_nb_buffers(notebook: nbf.NotebookNode) -> None:
+    """Close the memory-mapped files referenced by the lazy output data of a notebook.
+
+    This should be called once the notebook is no longer needed (i.e. after parsing),
+    since the data can then no longer be loaded.
+    """
+    for cell in notebook.cells:
+        for output in cell.get("outputs", []):
+            for value in output.get("data", {}).values():
+                if isinstance(value, LazyOutputData) and isinstance(value._buffer, mmap.mmap):
+                    value._buffer.close()
+
+
+def nb_has_lazy_data(notebook: nbf.NotebookNode) -> bool:
+    """Return whether the notebook contains any lazy output data."""
+    return any(
+        isinstance(value, LazyOutputData)
+        for cell in notebook.cells
+        for output in cell.get("outputs", [])
+        for value in output.get("data", {}).values()
+    )
+
+
+def nb_writes(notebook: nbf.NotebookNode) -> bytes:
+    """Write a notebook to (utf8 encoded) JSON,
+    loading lazy output data one at a time.
+    """
+    if not nb_has_lazy_data(notebook):
+        return nbf.writes(notebook).encode("utf-8")
+    placeholder = f"mystnb-lazy-{uuid4().hex}-"
+    references: dict[str, tuple[dict, str, LazyOutputData]] = {}
+    for cell in notebook.cells:
+        for output in cell.get("outputs", []):
+            data = output.get("data", {})
+            for mime_type, value in data.items():
+                if isinstance(value, LazyOutputData):
+                    key = f"{placeholder}{len(references)}"
+                    references[key] = (data, mime_type, value)
+                    data[mime_type] = key
+    try:
+        content = nbf.writes(notebook).encode("utf-8")
+    finally:
+        for data, mime_type, value in references.values():
+            data[mime_type] = value
+    chunks: list[bytes] = []
+    position = 0
+    for match in re.finditer(re.escape(placeholder.encode("ascii")) + rb"\d+", content):
+        chunks.append(content[position : match.start()])
+        value = references[match.group().decode("ascii")][2]
+        chunks.append(json.dumps(value.load()).encode("ascii")[1:-1])
+        position = match.end()
+    chunks.append(content[position:])
+    return b"".join(chunks)
+
+
+def _replace_strings(item: Any, replacements: dict[str, str]) -> Any:
+    """Recursively replace string values in a notebook (in-place)."""
+    if isinstance(item, dict):
+        for key, value in item.items():
+            if isinstance(value, str) and value in replacements:
+                item[key] = replacements[value]
+            else:
+                _replace_strings(value, replacements)
+    elif isinstance(item, list):
+        for index, value in enumerate(item):
+            if isinstance(value, str) and value in replacements:
+                item[index] = replacements[value]
+            else:
+                _replace_strings(value, replacements)
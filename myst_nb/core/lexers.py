@@ -1,7 +1,9 @@
 """Pygments lexers"""
 from __future__ import annotations
 
+from functools import lru_cache
 import re
+from typing import Iterator, Optional, Tuple
 
 # this is not added as an entry point in ipython, so we add it in this package
 from IPython.lib.lexers import IPythonTracebackLexer  # noqa: F401
@@ -19,12 +21,21 @@ _ansi_code_to_color = {
     7: "White",
 }
 
+_SEQUENCE_RGX = re.compile(r"([0-9;=]*?)?([a-zA-Z])(.*)$", re.DOTALL | re.MULTILINE)
+"""Split the content after an escape, into its (numeric) values, code and following text."""
 
+_SCANNER_RGX = re.compile(r"\x1b\[([^\x1b]*)|[^\x1b]+|\x1b")
+"""Scan text into runs, each starting with an escape sequence, or without any."""
+
+
+@lru_cache(maxsize=None)
 def _token_from_lexer_state(bold: bool, faint: bool, fg_color: str | None, bg_color: str | None):
     """Construct a token given the current lexer state.
 
     We can only emit one token even though we have a multiple-tuple state.
     To do work around this, we construct tokens like "Bold.Red".
+
+    The tokens are cached, since there are only a limited number of states.
     """
     components: tuple[str, ...] = ()
 
@@ -49,6 +60,66 @@ def _token_from_lexer_state(bold: bool, faint: bool, fg_color: str | None, bg_co
         return token
 
 
+_LexerState = Tuple[bool, bool, Optional[str], Optional[str]]
+"""The lexer state: (bold, faint, fg_color, bg_color)."""
+_RESET_STATE: _LexerState = (False, False, None, None)
+
+
+@lru_cache(maxsize=1024)
+def _set_graphics_mode(state: _LexerState, value: str) -> _LexerState:
+    """Get the lexer state, after the values of a "Set Graphics Mode" code.
+
+    The transitions are cached, since logs usually repeat the same few codes.
+    """
+    # Special case \x1b[m is a reset code
+    if value == "":
+        return _RESET_STATE
+    bold, faint, fg_color, bg_color = state
+    try:
+        values = [int(v) for v in value.split(";")]
+    except ValueError:
+        # Shouldn't ever happen, but could with invalid ANSI.
+        values = []
+
+    while len(values) > 0:
+        code = values.pop(0)
+        fg = _ansi_code_to_color.get(code - 30)
+        bg = _ansi_code_to_color.get(code - 40)
+        if fg:
+            fg_color = fg
+        elif bg:
+            bg_color = bg
+        elif code == 1:
+            bold = True
+        elif code == 2:
+            faint = True
+        elif code == 22:
+            bold = False
+            faint = False
+        elif code == 39:
+            fg_color = None
+        elif code == 49:
+            bg_color = None
+        elif code == 0:
+            bold, faint, fg_color, bg_color = _RESET_STATE
+        elif code in (38, 48):
+            try:
+                five = values.pop(0)
+                color = values.pop(0)
+            except IndexError:
+                continue
+            else:
+                if five != 5:
+                    continue
+                if not 0 <= color <= 255:
+                    continue
+                if code == 38:
+                    fg_color = f"C{color}"
+                else:
+                    bg_color = f"C{color}"
+    return bold, faint, fg_color, bg_color
+
+
 class AnsiColorLexer(pygments.lexer.RegexLexer):
     """Pygments lexer for text containing ANSI color codes.
 
@@ -93,14 +164,17 @@ class AnsiColorLexer(pygments.lexer.RegexLexer):
         # the content from the end of the escape sequence.
         after_escape = match.group(1)
 
+        token, text = self._process_escape(after_escape)
+        yield match.start(), token, text
+
+    def _process_escape(self, after_escape: str) -> tuple[pygments.token._TokenType, str]:
+        """Interpret the content after an escape, update the lexer state,
+        and return the text following the escape sequence, with its token.
+        """
         # TODO: this doesn't handle the case where the values are non-numeric.
         # This is rare but can happen for keyboard remapping, e.g.
         # '\x1b[0;59;"A"p'
-        parsed = re.match(
-            r"([0-9;=]*?)?([a-zA-Z])(.*)$",
-            after_escape,
-            re.DOTALL | re.MULTILINE,
-        )
+        parsed = _SEQUENCE_RGX.match(after_escape)
         if parsed is None:
             # This shouldn't ever happen if we're given valid text + ANSI, but
             # people can provide us with utter junk, and we should tolerate it.
@@ -108,54 +182,36 @@ class AnsiColorLexer(pygments.lexer.RegexLexer):
         else:
             value, code, text = parsed.groups()
             if code == "m":  # "m" is "Set Graphics Mode"
-                # Special case \x1b[m is a reset code
-                if value == "":
-                    self.reset_state()
-                else:
-                    try:
-                        values = [int(v) for v in value.split(";")]
-                    except ValueError:
-                        # Shouldn't ever happen, but could with invalid ANSI.
-                        values = []
-
-                    while len(values) > 0:
-                        value = values.pop(0)
-                        fg_color = _ansi_code_to_color.get(value - 30)
-                        bg_color = _ansi_code_to_color.get(value - 40)
-                        if fg_color:
-                            self.fg_color = fg_color
-                        elif bg_color:
-                            self.bg_color = bg_color
-                        elif value == 1:
-                            self.bold = True
-                        elif value == 2:
-                            self.faint = True
-                        elif value == 22:
-                            self.bold = False
-                            self.faint = False
-                        elif value == 39:
-                            self.fg_color = None
-                        elif value == 49:
-                            self.bg_color = None
-                        elif value == 0:
-                            self.reset_state()
-                        elif value in (38, 48):
-                            try:
-                                five = values.pop(0)
-                                color = values.pop(0)
-                            except IndexError:
-                                continue
-                            else:
-                                if five != 5:
-                                    continue
-                                if not 0 <= color <= 255:
-                                    continue
-                                if value == 38:
-                                    self.fg_color = f"C{color}"
-                                else:
-                                    self.bg_color = f"C{color}"
-
-        yield match.start(), self.current_token, text
+                state = (self.bold, self.faint, self.fg_color, self.bg_color)
+                self.bold, self.faint, self.fg_color, self.bg_color = _set_graphics_mode(
+                    state, value
+                )
+        return self.current_token, text
+
+    def get_tokens_unprocessed(
+        self, text: str, stack: tuple[str, ...] = ("root",)
+    ) -> Iterator[tuple[int, pygments.token._TokenType, str]]:
+        """Split the text into tokens, in a single pass of a compiled scanner.
+
+        This produces the same tokens as the ``tokens`` rules,
+        without the overhead of the generic ``RegexLexer`` state machine.
+        For any other initial ``stack`` than the (only) ``root`` state,
+        the generic state machine is used.
+        """
+        self.reset_state()
+        if tuple(stack) != ("root",):
+            yield from super().get_tokens_unprocessed(text, stack)
+            return
+        for match in _SCANNER_RGX.finditer(text):
+            after_escape = match.group(1)
+            if after_escape is not None:
+                token, token_text = self._process_escape(after_escape)
+                yield match.start(), token, token_text
+            elif match.group() == "\x1b":
+                # a lone escape character, that does not start a sequence
+                yield match.start(), pygments.token.Error, "\x1b"
+            else:
+                yield match.start(), pygments.token.Text, match.group()
 
     tokens = {
         "root": [(r"\x1b\[([^\x1b]*)", process), (r"[^\x1b]+", pygments.token.Text)],
@@ -30,10 +30,11 @@ class SphinxDocLogger(logging.LoggerAdapter):
     These are also appended to the end of messages.
     """
 
-    def __init__(self, document: nodes.document, type_name: str = DEFAULT_LOG_TYPE):
+    def __init__(self, document: Union[nodes.document, str], type_name: str = DEFAULT_LOG_TYPE):
         from sphinx.util import logging as sphinx_logging
 
-        docname = document.settings.env.docname
+        # a docname may be given directly, for logging outside of the document parse
+        docname = document if isinstance(document, str) else document.settings.env.docname
         self.logger = sphinx_logging.getLogger(f"{type_name}-{docname}")
         # default extras to parse to sphinx logger
         # location can be: docname, (docname, lineno), or a node
@@ -9,6 +9,12 @@ from markdown_it.token import Token
 from nbformat import NotebookNode
 
 from myst_nb.core.loggers import LoggerType
+from myst_nb.core.token_cache import (
+    CACHEABLE_ENV_KEYS,
+    MdTokenCache,
+    md_parser_fingerprint,
+    merge_cell_env,
+)
 
 
 def nb_node_to_dict(node: NotebookNode) -> dict[str, Any]:
@@ -28,9 +34,11 @@ def notebook_to_tokens(
     mdit_parser: MarkdownIt,
     mdit_env: dict[str, Any],
     logger: LoggerType,
+    token_cache: MdTokenCache | None = None,
 ) -> list[Token]:
     # disable front-matter, since this is taken from the notebook
     mdit_parser.disable("front_matter", ignoreInvalid=True)
+    fingerprint = md_parser_fingerprint(mdit_parser) if token_cache is not None else ""
     # this stores global state, such as reference definitions
 
     # Parse block tokens only first, leaving inline parsing to a second phase
@@ -64,11 +72,14 @@ def notebook_to_tokens(
                     map=[0, len(nb_cell["source"].splitlines()) - 1],
                 ),
             ]
-            with mdit_parser.reset_rules():
-                # enable only rules up to block
-                rules = mdit_parser.core.ruler.get_active_rules()
-                mdit_parser.core.ruler.enableOnly(rules[: rules.index("inline")])
-                tokens.extend(mdit_parser.parse(nb_cell["source"], mdit_env))
+            if token_cache is None:
+                tokens.extend(_parse_block_tokens(nb_cell["source"], mdit_parser, mdit_env))
+            else:
+                tokens.extend(
+                    _parse_block_tokens_cached(
+                        nb_cell["source"], mdit_parser, mdit_env, token_cache, fingerprint
+                    )
+                )
             tokens.append(
                 Token(
                     "nb_cell_markdown_close",
@@ -134,6 +145,8 @@ def notebook_to_tokens(
         block_tokens.extend(tokens)
 
     block_tokens.append(Token("nb_finalise", "", 0, map=[0, 0]))
+    if token_cache is not None:
+        token_cache.flush()
 
     # Now all definitions have been gathered, run the inline parsing phase
     state = StateCore("", mdit_parser, mdit_env, block_tokens)
@@ -143,3 +156,38 @@ def notebook_to_tokens(
         mdit_parser.core.process(state)
 
     return state.tokens
+
+
+def _parse_block_tokens(
+    source: str, mdit_parser: MarkdownIt, mdit_env: dict[str, Any]
+) -> list[Token]:
+    """Parse a Markdown source to block level tokens."""
+    with mdit_parser.reset_rules():
+        # enable only rules up to block
+        rules = mdit_parser.core.ruler.get_active_rules()
+        mdit_parser.core.ruler.enableOnly(rules[: rules.index("inline")])
+        return mdit_parser.parse(source, mdit_env)
+
+
+def _parse_block_tokens_cached(
+    source: str,
+    mdit_parser: MarkdownIt,
+    mdit_env: dict[str, Any],
+    token_cache: MdTokenCache,
+    fingerprint: str,
+) -> list[Token]:
+    """Parse a Markdown source to block level tokens, or retrieve them from the cache."""
+    key = token_cache.cell_key(source, fingerprint)
+    cached = token_cache.get(key)
+    if cached is not None:
+        merge_cell_env(mdit_env, cached[1])
+        return cached[0]
+    # the cell is parsed in isolation, so that its environment updates can be cached
+    cell_env: dict[str, Any] = {}
+    tokens = _parse_block_tokens(source, mdit_parser, cell_env)
+    if not set(cell_env).issubset(CACHEABLE_ENV_KEYS):
+        # the updates cannot be merged, so parse again, in the notebook environment
+        return _parse_block_tokens(source, mdit_parser, mdit_env)
+    token_cache.set(key, tokens, cell_env)
+    merge_cell_env(mdit_env, cell_env)
+    return tokens
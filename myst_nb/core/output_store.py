@@ -0,0 +1,176 @@
+"""A store for the files written to the output folder, such as images and notebooks.
+
+Files are tracked in a manifest of content hashes,
+so that writing a file identical to the one already on disk is skipped,
+without any file system access.
+Other writes are made in background threads, and waited for when the store is flushed
+(for sphinx, at the end of the parse of each document,
+before its doctree is read by the image and download collectors).
+"""
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import os
+from pathlib import Path
+import sqlite3
+from typing import Iterable
+
+OUTPUT_MANIFEST_NAME = "mystnb_outputs.db"
+"""The name of the manifest database file, in the output folder."""
+
+
+class OutputStore:
+    """A write-back store of output files, with a manifest of their content hashes."""
+
+    def __init__(self, folder: str | Path, max_workers: int = 4) -> None:
+        """Initialise the store, and load the manifest.
+
+        :param folder: The output folder (created if missing)
+        :param max_workers: The maximum number of threads to write files with
+        """
+        self._folder = Path(folder)
+        self._folder.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(
+            str(self._folder / OUTPUT_MANIFEST_NAME), timeout=30, check_same_thread=False
+        )
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, digest TEXT)"
+            )
+        self._digests: dict[str, str] = dict(
+            self._connection.execute("SELECT path, digest FROM outputs").fetchall()
+        )
+        self._max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: dict[str, tuple[str, Future]] = {}
+
+    def _key(self, path: Path) -> str:
+        """Create the manifest key for a path."""
+        try:
+            return path.relative_to(self._folder).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def tracks(self, path: Path) -> bool:
+        """Return whether the file is known to be written (or pending)."""
+        return self._key(path) in self._digests
+
+    def write(self, path: Path, content: bytes) -> None:
+        """Write a file (in the background), unless identical to the one on disk."""
+        key = self._key(path)
+        digest = hashlib.sha256(content).hexdigest()
+        if self._digests.get(key) == digest:
+            return
+        if key in self._pending:
+            # ensure writes to the same file are made in order
+            self._pending[key][1].result()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="mystnb-output"
+            )
+        self._digests[key] = digest
+        self._pending[key] = (digest, self._executor.submit(_write_bytes, path, content))
+
+    def write_chunks(self, path: Path, chunks: Iterable[bytes]) -> None:
+        """Write a file from chunks of content (in the foreground),
+        without holding the whole content in memory.
+
+        The content is first written to a temporary file next to the target,
+        which then replaces the target, unless identical to the one on disk.
+        """
+        key = self._key(path)
+        if key in self._pending:
+            self._pending[key][1].result()
+        temp_path = path.with_name(f".{path.name}.tmp")
+        digest = _write_chunks(temp_path, chunks)
+        if self._digests.get(key) == digest:
+            os.remove(temp_path)
+            return
+        os.replace(temp_path, path)
+        self._digests[key] = digest
+        written: Future = Future()
+        written.set_result(None)
+        self._pending[key] = (digest, written)
+
+    def flush(self) -> None:
+        """Wait for all pending writes, and record them in the manifest.
+
+        :raises OSError: if any of the writes failed (after waiting for all of them),
+            or they could not be recorded in the manifest
+        """
+        written: list[tuple[str, str]] = []
+        error: OSError | None = None
+        for key, (digest, future) in self._pending.items():
+            try:
+                future.result()
+            except OSError as exc:
+                self._digests.pop(key, None)
+                error = error or exc
+            else:
+                written.append((key, digest))
+        self._pending.clear()
+        if written:
+            try:
+                with self._connection:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO outputs VALUES (?, ?)", written
+                    )
+            except sqlite3.Error as exc:
+                # e.g. the database is locked by another process,
+                # in which case the manifest may hold outdated digests for the written files
+                error = error or OSError(
+                    f"Failed to record written files in the output manifest: {exc}"
+                )
+        if error is not None:
+            raise error
+
+
+def _write_bytes(path: Path, content: bytes) -> None:
+    """Write a file, creating its parent folders if necessary."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+def _write_chunks(path: Path, chunks: Iterable[bytes]) -> str:
+    """Write a file from chunks of content, creating its parent folders if necessary.
+
+    :returns: the hash of the content
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    hasher = hashlib.sha256()
+    with path.open("wb") as handle:
+        for chunk in chunks:
+            hasher.update(chunk)
+            handle.write(chunk)
+    return hasher.hexdigest()
+
+
+_STORES: dict[tuple[int, str], OutputStore] = {}
+
+
+def get_output_store(folder: str | Path) -> OutputStore:
+    """Get the output store for a folder, for the current process."""
+    key = (os.getpid(), str(folder))
+    if key not in _STORES:
+        _STORES[key] = OutputStore(folder)
+    return _STORES[key]
+
+
+def flush_output_stores() -> None:
+    """Flush all output stores of the current process."""
+    pid = os.getpid()
+    for (store_pid, _), store in list(_STORES.items()):
+        if store_pid == pid:
+            store.flush()
+
+
+def remove_output_manifest(folder: str | Path) -> None:
+    """Remove the manifest of an output folder,
+    since files may be written without the store tracking them.
+    """
+    _STORES.pop((os.getpid(), str(folder)), None)
+    try:
+        os.remove(Path(folder) / OUTPUT_MANIFEST_NAME)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,182 @@
+"""Record the time spent in each phase of processing a notebook,
+and write build-wide reports of these timings.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+import csv
+from datetime import datetime
+import json
+from pathlib import Path
+import time
+from typing import Any, Iterator, Mapping, Sequence
+
+from nbformat import NotebookNode
+
+PROFILE_REPORT_FORMATS = ("json", "csv", "trace")
+"""The available formats for profile reports."""
+
+_NBCLIENT_TIMING_KEYS = (
+    "iopub.execute_input",
+    "iopub.status.busy",
+    "iopub.status.idle",
+    "shell.execute_reply",
+)
+
+
+class Profiler:
+    """A recorder of (named) timing spans, for a single document.
+
+    Each span is a dict with the keys:
+    ``name``, ``start`` (POSIX timestamp), ``duration`` (seconds),
+    and optionally ``args`` (e.g. the cell index).
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        """Initialise the profiler.
+
+        :param enabled: Whether to record spans (otherwise this is a no-op)
+        """
+        self.enabled = enabled
+        self.spans: list[dict[str, Any]] = []
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        """Record the time spent in a block of code."""
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        counter = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - counter, **args)
+
+    def add(self, name: str, start: float, duration: float, **args: Any) -> None:
+        """Add a span, that has already been timed."""
+        if not self.enabled:
+            return
+        span: dict[str, Any] = {"name": name, "start": start, "duration": duration}
+        if args:
+            span["args"] = args
+        self.spans.append(span)
+
+    def add_cell_timings(self, notebook: NotebookNode) -> None:
+        """Add spans for the execution of each code cell,
+        from the timing metadata recorded by nbclient.
+        """
+        if not self.enabled:
+            return
+        for index, cell in enumerate(notebook.cells):
+            timing = cell_timing(cell)
+            if timing is not None:
+                self.add("cell", timing[0], timing[1], cell_index=index)
+
+
+def cell_timing(cell: NotebookNode) -> tuple[float, float] | None:
+    """Get the start (POSIX timestamp) and duration (seconds) of a code cell's execution,
+    from the timing metadata recorded by nbclient, if available.
+    """
+    execution = cell.get("metadata", {}).get("execution", {})
+    try:
+        start = datetime.fromisoformat(execution["iopub.execute_input"].replace("Z", "+00:00"))
+        end = datetime.fromisoformat(execution["shell.execute_reply"].replace("Z", "+00:00"))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return start.timestamp(), (end - start).total_seconds()
+
+
+def pop_cell_runtimes(notebook: NotebookNode) -> dict[int, float]:
+    """Get the runtime (seconds) of each executed code cell, by cell index,
+    and remove the timing metadata recorded by nbclient from the cells.
+    """
+    runtimes: dict[int, float] = {}
+    for index, cell in enumerate(notebook.cells):
+        timing = cell_timing(cell)
+        if timing is not None:
+            runtimes[index] = timing[1]
+        execution = cell.get("metadata", {}).get("execution")
+        if not isinstance(execution, dict):
+            continue
+        for key in _NBCLIENT_TIMING_KEYS:
+            execution.pop(key, None)
+        if not execution:
+            cell.metadata.pop("execution")
+    return runtimes
+
+
+def summarise_spans(spans: Sequence[Mapping[str, Any]]) -> dict[str, float]:
+    """Sum the duration of spans by name."""
+    totals: dict[str, float] = {}
+    for span in spans:
+        totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration"]
+    return totals
+
+
+def write_profile_reports(
+    profiles: Mapping[str, Sequence[Mapping[str, Any]]],
+    folder: str | Path,
+    formats: Sequence[str],
+    name: str = "mystnb_profile",
+) -> list[Path]:
+    """Write reports of the timing spans recorded for each document.
+
+    :param profiles: Mapping of document name to spans
+    :param folder: The folder to write the reports to
+    :param formats: The formats of report to write (see `PROFILE_REPORT_FORMATS`)
+    :param name: The base name of the report files
+    :returns: The paths of the written reports
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    if "json" in formats:
+        path = folder / f"{name}.json"
+        data = {
+            docname: {"totals": summarise_spans(spans), "spans": list(spans)}
+            for docname, spans in sorted(profiles.items())
+        }
+        path.write_text(json.dumps(data, indent=2), encoding="utf8")
+        paths.append(path)
+    if "csv" in formats:
+        path = folder / f"{name}.csv"
+        with path.open("w", encoding="utf8", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["docname", "name", "start", "duration", "cell_index"])
+            for docname, spans in sorted(profiles.items()):
+                for span in spans:
+                    writer.writerow(
+                        [
+                            docname,
+                            span["name"],
+                            span["start"],
+                            span["duration"],
+                            span.get("args", {}).get("cell_index", ""),
+                        ]
+                    )
+        paths.append(path)
+    if "trace" in formats:
+        # see the Trace Event Format, as used by chrome://tracing and https://ui.perfetto.dev
+        path = folder / f"{name}.trace.json"
+        events: list[dict[str, Any]] = []
+        for tid, (docname, spans) in enumerate(sorted(profiles.items())):
+            events.append(
+                {"name": "thread_name", "ph": "M", "pid": 0, "tid": tid, "args": {"name": docname}}
+            )
+            for span in spans:
+                events.append(
+                    {
+                        "name": span["name"],
+                        "cat": "myst-nb",
+                        "ph": "X",
+                        "ts": span["start"] * 1e6,
+                        "dur": span["duration"] * 1e6,
+                        "pid": 0,
+                        "tid": tid,
+                        "args": span.get("args", {}),
+                    }
+                )
+        path.write_text(json.dumps({"traceEvents": events}), encoding="utf8")
+        paths.append(path)
+    return paths
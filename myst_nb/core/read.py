@@ -15,6 +15,7 @@ import nbformat as nbf
 import yaml
 
 from myst_nb.core.config import NbParserConfig
+from myst_nb.core.lazy import lazy_nb_read
 from myst_nb.core.loggers import DocutilsDocLogger, SphinxDocLogger
 
 NOTEBOOK_VERSION = 4
@@ -63,6 +64,11 @@ def create_nb_reader(
     # get all possible readers
     readers = nb_config.custom_formats.copy()
     # add the default reader
+    if nb_config.read_lazy_output_size > 0 and Path(path).is_file():
+        readers.setdefault(
+            ".ipynb",
+            (lazy_nb_read, {"path": path, "min_size": nb_config.read_lazy_output_size}, False),
+        )
     readers.setdefault(".ipynb", (standard_nb_read, {}, False))  # type: ignore
 
     # we check suffixes ordered by longest first, to ensure we get the "closest" match
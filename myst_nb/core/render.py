@@ -15,7 +15,18 @@ from mimetypes import guess_extension
 import os
 from pathlib import Path
 import re
-from typing import TYPE_CHECKING, Any, ClassVar, Iterator, Sequence, Union
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ClassVar,
+    Iterable,
+    Iterator,
+    Literal,
+    Mapping,
+    Sequence,
+    Union,
+)
 
 from docutils import nodes
 from docutils.parsers.rst import directives as options_spec
@@ -26,13 +37,16 @@ from myst_parser.parsers.mdit import create_md_parser
 from nbformat import NotebookNode
 from typing_extensions import Protocol
 
-from myst_nb.core.config import NbParserConfig
+from myst_nb.core.config import CellConfigResolver, NbParserConfig
 from myst_nb.core.execute import NotebookClientBase
+from myst_nb.core.lazy import load_output_data
 from myst_nb.core.loggers import LoggerType  # DEFAULT_LOG_TYPE,
-from myst_nb.core.utils import coalesce_streams
+from myst_nb.core.output_store import get_output_store
+from myst_nb.core.utils import coalesce_streams, truncate_text
 from myst_nb.warnings_ import MystNBWarnings, create_warning
 
 if TYPE_CHECKING:
+    from markdown_it import MarkdownIt
     from markdown_it.tree import SyntaxTreeNode
 
     from myst_nb.docutils_ import DocutilsNbRenderer, DocutilsRenderer
@@ -43,9 +57,12 @@ if TYPE_CHECKING:
 
 WIDGET_STATE_MIMETYPE = "application/vnd.jupyter.widget-state+json"
 WIDGET_VIEW_MIMETYPE = "application/vnd.jupyter.widget-view+json"
+WIDGET_STATE_FOLDER = "mystnb_widgets"
+"""The folder for widget state files, in the output folder and HTML static folder."""
 RENDER_ENTRY_GROUP = "myst_nb.renderers"
 MIME_RENDER_ENTRY_GROUP = "myst_nb.mime_renderers"
 _ANSI_RE = re.compile("\x1b\\[(.*?)([@-~])")
+
 _QUOTED_RE = re.compile(r"^([\"']).*\1$")
 
 
@@ -98,7 +115,10 @@ class MditRenderMixin:
         def _callback(msg: str, subtype: MystNBWarnings):
             create_warning(self.document, msg, line=line, subtype=subtype)
 
-        return self.nb_config.get_cell_level_config(field, cell_metadata, _callback)
+        resolver: CellConfigResolver | None = self.md_options.get("nb_cell_config")
+        if resolver is None:
+            return self.nb_config.get_cell_level_config(field, cell_metadata, _callback)
+        return resolver.get(field, cell_metadata, _callback)
 
     def render_nb_initialise(self, token: SyntaxTreeNode) -> None:
         """Run rendering at the start of the notebook."""
@@ -308,6 +328,10 @@ class MimeData:
     line: int | None = None
     """Source line of the cell"""
 
+    def __post_init__(self):
+        # output data may be left in the notebook file, until it is rendered
+        self.content = load_output_data(self.content)
+
     @property
     def string(self) -> str:
         """Get the content as a string."""
@@ -320,6 +344,40 @@ class MimeData:
 class NbElementRenderer:
     """A class for rendering notebook elements."""
 
+    mime_renderers: ClassVar[Mapping[str, str]] = {
+        "text/plain": "render_text_plain",
+        "image/png": "render_image",
+        "image/jpeg": "render_image",
+        "application/pdf": "render_image",
+        "image/svg+xml": "render_image",
+        "image/gif": "render_image",
+        "text/html": "render_text_html",
+        "text/latex": "render_text_latex",
+        "application/javascript": "render_javascript",
+        WIDGET_VIEW_MIMETYPE: "render_widget_view",
+        "text/markdown": "render_markdown",
+    }
+    """Mapping of mime types to the method names rendering them (as block level elements).
+
+    Mime types may also be wildcard families, like ``image/*``, or ``*`` for any.
+    Subclasses can extend this mapping, to render other mime types.
+    """
+
+    mime_renderers_inline: ClassVar[Mapping[str, str]] = {
+        "text/plain": "render_text_plain_inline",
+        "image/png": "render_image_inline",
+        "image/jpeg": "render_image_inline",
+        "application/pdf": "render_image_inline",
+        "image/svg+xml": "render_image_inline",
+        "image/gif": "render_image_inline",
+        "text/html": "render_text_html_inline",
+        "text/latex": "render_text_latex_inline",
+        "application/javascript": "render_javascript_inline",
+        WIDGET_VIEW_MIMETYPE: "render_widget_view_inline",
+        "text/markdown": "render_markdown_inline",
+    }
+    """Mapping of mime types to the method names rendering them (as inline level elements)."""
+
     def __init__(self, renderer: DocutilsNbRenderer | SphinxNbRenderer, logger: LoggerType) -> None:
         """Initialize the renderer.
 
@@ -327,6 +385,9 @@ class NbElementRenderer:
         """
         self._renderer = renderer
         self._logger = logger
+        # the total size of the text outputs rendered so far, for the notebook limits
+        self._output_bytes = 0
+        self._output_lines = 0
 
     @property
     def renderer(self) -> DocutilsNbRenderer | SphinxNbRenderer:
@@ -354,11 +415,18 @@ class NbElementRenderer:
         """The source of the notebook."""
         return self.renderer.document["source"]
 
-    def write_file(self, path: list[str], content: bytes, overwrite=False, exists_ok=False) -> str:
+    def write_file(
+        self,
+        path: list[str],
+        content: bytes | Iterable[bytes],
+        overwrite=False,
+        exists_ok=False,
+    ) -> str:
         """Write a file to the external output folder.
 
         :param path: the path to write the file to, relative to the output folder
-        :param content: the content to write to the file
+        :param content: the content to write to the file,
+            or an iterable of chunks of the content, to write without holding it all in memory
         :param overwrite: whether to overwrite an existing file
         :param exists_ok: whether to ignore an existing file if overwrite is False
 
@@ -366,17 +434,33 @@ class NbElementRenderer:
         """
         output_folder = self.config.output_folder
         filepath = Path(output_folder).joinpath(*path)
+        store = None
+        if output_folder and self.config.output_store:
+            store = get_output_store(output_folder)
         if not output_folder:
             pass  # do not output anything if output_folder is not set (docutils only)
-        elif filepath.exists():
-            if overwrite:
-                filepath.write_bytes(content)
-            elif not exists_ok:
+        elif not overwrite and (
+            # files known to the store are not checked for on disk
+            (store is not None and store.tracks(filepath))
+            or filepath.exists()
+        ):
+            if not exists_ok:
                 # TODO raise or just report?
                 raise FileExistsError(f"File already exists: {filepath}")
+        elif store is not None:
+            # files with the same content as on disk are skipped by the store
+            if isinstance(content, bytes):
+                store.write(filepath, content)
+            else:
+                store.write_chunks(filepath, content)
         else:
             filepath.parent.mkdir(parents=True, exist_ok=True)
-            filepath.write_bytes(content)
+            if isinstance(content, bytes):
+                filepath.write_bytes(content)
+            else:
+                with filepath.open("wb") as handle:
+                    for chunk in content:
+                        handle.write(chunk)
 
         if self.renderer.sphinx_env:
             # sphinx expects paths in POSIX format, relative to the documents path,
@@ -410,14 +494,29 @@ class NbElementRenderer:
         ipywidgets = metadata.get("widgets", None)
         ipywidgets_mime = (ipywidgets or {}).get(WIDGET_STATE_MIMETYPE, {})
         if ipywidgets_mime.get("state", None):
-            self.add_js_file(
-                "ipywidgets_state",
-                None,
-                {
-                    "type": "application/vnd.jupyter.widget-state+json",
-                    "body": sanitize_script_content(json.dumps(ipywidgets_mime)),
-                },
-            )
+            if self.renderer.sphinx_env and self.config.output_folder:
+                # write the state to a static file, shared by all pages with the same state,
+                # which adds the script tag to the page, before the widgets are rendered
+                content = (
+                    "(function () {\n"
+                    '  var script = document.createElement("script");\n'
+                    f'  script.type = "{WIDGET_STATE_MIMETYPE}";\n'
+                    f"  script.textContent = JSON.stringify({json.dumps(ipywidgets_mime)});\n"
+                    "  document.head.appendChild(script);\n"
+                    "})();\n"
+                ).encode("utf8")
+                filename = f"{hashlib.sha256(content).hexdigest()}.js"
+                self.write_file([WIDGET_STATE_FOLDER, filename], content, exists_ok=True)
+                self.add_js_file("ipywidgets_state", f"{WIDGET_STATE_FOLDER}/{filename}", {})
+            else:
+                self.add_js_file(
+                    "ipywidgets_state",
+                    None,
+                    {
+                        "type": "application/vnd.jupyter.widget-state+json",
+                        "body": sanitize_script_content(json.dumps(ipywidgets_mime)),
+                    },
+                )
             for i, (path, kwargs) in enumerate(self.config.ipywidgets_js.items()):
                 self.add_js_file(f"ipywidgets_{i}", path, kwargs)
 
@@ -459,14 +558,9 @@ class NbElementRenderer:
         """
         if "remove-stdout" in cell_metadata.get("tags", []):
             return []
-        lexer = self.renderer.get_cell_level_config(
-            "render_text_lexer", cell_metadata, line=source_line
+        return self._render_text_output(
+            output["text"], ["output", "stream"], cell_metadata, source_line
         )
-        node = self.renderer.create_highlighted_code_block(
-            output["text"], lexer, source=self.source, line=source_line
-        )
-        node["classes"] += ["output", "stream"]
-        return [node]
 
     def render_stderr(
         self,
@@ -502,14 +596,9 @@ class NbElementRenderer:
             self.logger.error(msg, subtype="stderr", line=source_line)
         elif output_stderr == "severe":
             self.logger.critical(msg, subtype="stderr", line=source_line)
-        lexer = self.renderer.get_cell_level_config(
-            "render_text_lexer", cell_metadata, line=source_line
-        )
-        node = self.renderer.create_highlighted_code_block(
-            output["text"], lexer, source=self.source, line=source_line
+        outputs += self._render_text_output(
+            output["text"], ["output", "stderr"], cell_metadata, source_line
         )
-        node["classes"] += ["output", "stderr"]
-        outputs.append(node)
         return outputs
 
     def render_error(
@@ -540,33 +629,17 @@ class NbElementRenderer:
 
     def render_mime_type(self, data: MimeData) -> list[nodes.Element]:
         """Render a notebook mime output, as a block level element."""
+        plugins, method = get_mime_dispatch(type(self), False).lookup(data.mime_type)
+
         # try plugin renderers
-        for renderer in load_mime_renders():
-            nodes = renderer.handle_mime(self, data, False)
+        for plugin in plugins:
+            nodes = plugin.handle_mime(self, data, False)
             if nodes is not None:
                 return nodes
 
-        # try default renderers
-        if data.mime_type == "text/plain":
-            return self.render_text_plain(data)
-        if data.mime_type in {
-            "image/png",
-            "image/jpeg",
-            "application/pdf",
-            "image/svg+xml",
-            "image/gif",
-        }:
-            return self.render_image(data)
-        if data.mime_type == "text/html":
-            return self.render_text_html(data)
-        if data.mime_type == "text/latex":
-            return self.render_text_latex(data)
-        if data.mime_type == "application/javascript":
-            return self.render_javascript(data)
-        if data.mime_type == WIDGET_VIEW_MIMETYPE:
-            return self.render_widget_view(data)
-        if data.mime_type == "text/markdown":
-            return self.render_markdown(data)
+        # try built-in renderers
+        if method is not None:
+            return getattr(self, method)(data)
 
         return self.render_unhandled(data)
 
@@ -588,19 +661,192 @@ class NbElementRenderer:
 
     def render_text_plain(self, data: MimeData) -> list[nodes.Element]:
         """Render a notebook text/plain mime data output."""
-        lexer = self.renderer.get_cell_level_config(
-            "render_text_lexer", data.cell_metadata, line=data.line
-        )
-        node = self.renderer.create_highlighted_code_block(
-            data.string, lexer, source=self.source, line=data.line
+        return self._render_text_output(
+            data.string, ["output", "text_plain"], data.cell_metadata, data.line
         )
-        node["classes"] += ["output", "text_plain"]
-        return [node]
 
     def render_text_html(self, data: MimeData) -> list[nodes.Element]:
         """Render a notebook text/html mime data output."""
+        # outputs loaded lazily are not part of the page, so are not truncated
+        external = self.render_lazy_output(data, data.string, "text_html", ".html")
+        if external is not None:
+            return external
+        truncated = self.truncate_output(
+            data.string, data.cell_metadata, data.line, extension=".html", partial=False
+        )
+        if truncated is not None:
+            return [truncated[2]]
         return [nodes.raw(text=data.string, format="html", classes=["output", "text_html"])]
 
+    def render_lazy_output(
+        self, data: MimeData, content: str, kind: str, extension: str
+    ) -> list[nodes.Element] | None:
+        """Write an output to a separate file, if above the configured size,
+        and render a placeholder to load it lazily (in HTML).
+
+        :param data: the output data
+        :param content: the content to write to the file
+        :param kind: the kind of output (``text_html`` or ``javascript``)
+        :param extension: the file extension
+        :returns: the placeholder nodes, or None if the output should be rendered inline
+        """
+        min_size = self.renderer.get_cell_level_config(
+            "render_lazy_output_size", data.cell_metadata, line=data.line
+        )
+        if min_size < 0 or not self.config.output_folder:
+            return None
+        content_bytes = content.encode("utf8")
+        if len(content_bytes) < min_size:
+            return None
+        filename = f"{hashlib.sha256(content_bytes).hexdigest()}{extension}"
+        uri = self.write_file([filename], content_bytes, overwrite=False, exists_ok=True)
+        title = f"Load output ({len(content_bytes) / 1024:.0f} kB)"
+        if self.renderer.sphinx_env:
+            from sphinx.addnodes import download_reference
+
+            link: nodes.Element = download_reference(
+                "", "", nodes.inline(text=title), reftarget=uri
+            )
+        else:
+            link = nodes.reference("", title, refuri=uri)
+        return [
+            nodes.container(
+                "",
+                nodes.paragraph("", "", link),
+                classes=["output", kind, "mystnb-lazy-output", f"mystnb-lazy-{kind}"],
+            )
+        ]
+
+    def _render_text_output(
+        self,
+        text: str,
+        classes: list[str],
+        cell_metadata: dict[str, Any],
+        source_line: int | None,
+    ) -> list[nodes.Element]:
+        """Render a text output as highlighted code block(s),
+        truncating it if it is above the configured limits.
+        """
+        lexer = self.renderer.get_cell_level_config(
+            "render_text_lexer", cell_metadata, line=source_line
+        )
+        truncated = self.truncate_output(text, cell_metadata, source_line)
+        if truncated is None:
+            node = self.renderer.create_highlighted_code_block(
+                text, lexer, source=self.source, line=source_line
+            )
+            node["classes"] += classes
+            return [node]
+        head, tail, marker = truncated
+        elements: list[nodes.Element] = []
+        if head:
+            node = self.renderer.create_highlighted_code_block(
+                head, lexer, source=self.source, line=source_line
+            )
+            node["classes"] += classes
+            elements.append(node)
+        elements.append(marker)
+        if tail:
+            node = self.renderer.create_highlighted_code_block(
+                tail, lexer, source=self.source, line=source_line
+            )
+            node["classes"] += classes
+            elements.append(node)
+        return elements
+
+    @contextmanager
+    def output_alternative(self, charged: bool) -> Iterator[None]:
+        """Render an alternative representation of an output (e.g. one mime type of a bundle),
+        only counting it towards the notebook output totals if it is the one to be displayed.
+
+        :param charged: whether to count the rendered output towards the totals
+        """
+        start = (self._output_bytes, self._output_lines)
+        try:
+            yield
+        finally:
+            if not charged:
+                self._output_bytes, self._output_lines = start
+
+    def truncate_output(
+        self,
+        text: str,
+        cell_metadata: dict[str, Any],
+        source_line: int | None,
+        extension: str = ".txt",
+        partial: bool = True,
+    ) -> tuple[str, str, nodes.Element] | None:
+        """Truncate a text output, if it is above the configured limits,
+        for the output or the notebook as a whole.
+
+        :param text: the text of the output
+        :param cell_metadata: the metadata of the cell containing the output
+        :param source_line: the line number of the cell in the source document
+        :param extension: the file extension, if the full text is written to a file
+        :param partial: whether to keep the head and tail of the text,
+            otherwise it is removed entirely (e.g. for HTML, which cannot be cut)
+
+        :returns: the (head, tail) of the text and a marker node to place between them,
+            or None if the text is not truncated
+        """
+        max_bytes = self.renderer.get_cell_level_config(
+            "output_max_bytes", cell_metadata, line=source_line
+        )
+        max_lines = self.renderer.get_cell_level_config(
+            "output_max_lines", cell_metadata, line=source_line
+        )
+        total_bytes = self.config.output_total_max_bytes
+        total_lines = self.config.output_total_max_lines
+        if max_bytes < 0 and max_lines < 0 and total_bytes < 0 and total_lines < 0:
+            return None
+        if total_bytes >= 0:
+            remaining = max(total_bytes - self._output_bytes, 0)
+            max_bytes = remaining if max_bytes < 0 else min(max_bytes, remaining)
+        if total_lines >= 0:
+            remaining = max(total_lines - self._output_lines, 0)
+            max_lines = remaining if max_lines < 0 else min(max_lines, remaining)
+
+        result = truncate_text(text, max_bytes, max_lines)
+        if result is None:
+            head, tail = text, ""
+        elif partial:
+            head, tail = result
+        else:
+            head = tail = ""
+        kept = head + tail
+        self._output_bytes += len(kept.encode("utf8"))
+        self._output_lines += kept.count("\n") + (0 if not kept or kept.endswith("\n") else 1)
+        if result is None:
+            return None
+
+        omitted_bytes = len(text.encode("utf8")) - len(kept.encode("utf8"))
+        omitted_lines = text.count("\n") - kept.count("\n")
+        message = (
+            f"Output truncated: {omitted_lines} line{'' if omitted_lines == 1 else 's'} "
+            f"({omitted_bytes} byte{'' if omitted_bytes == 1 else 's'}) omitted."
+        )
+        marker = nodes.paragraph(classes=["output", "truncated"])
+        marker += nodes.emphasis(text=message)
+        spill = self.renderer.get_cell_level_config(
+            "output_truncate_spill", cell_metadata, line=source_line
+        )
+        if spill and self.config.output_folder:
+            content = text.encode("utf8")
+            filename = f"{hashlib.sha256(content).hexdigest()}{extension}"
+            uri = self.write_file([filename], content, overwrite=False, exists_ok=True)
+            marker += nodes.Text(" ")
+            title = "Download the full output"
+            if self.renderer.sphinx_env:
+                from sphinx.addnodes import download_reference
+
+                link: nodes.Element = download_reference(
+                    "", "", nodes.literal(text=title, classes=["download"]), reftarget=uri
+                )
+            else:
+                link = nodes.reference("", title, refuri=uri)
+            marker += link
+        return head, tail, marker
+
     def render_text_latex(self, data: MimeData) -> list[nodes.Element]:
         """Render a notebook text/latex mime data output."""
         # TODO should we always assume this is math?
@@ -666,6 +912,9 @@ class NbElementRenderer:
 
     def render_javascript(self, data: MimeData) -> list[nodes.Element]:
         """Render a notebook application/javascript mime data output."""
+        external = self.render_lazy_output(data, data.string, "javascript", ".js")
+        if external is not None:
+            return external
         content = sanitize_script_content(data.string)
         mime_type = "application/javascript"
         return [
@@ -688,34 +937,17 @@ class NbElementRenderer:
 
     def render_mime_type_inline(self, data: MimeData) -> list[nodes.Element]:
         """Render a notebook mime output, as an inline level element."""
+        plugins, method = get_mime_dispatch(type(self), True).lookup(data.mime_type)
 
         # try plugin renderers
-        for renderer in load_mime_renders():
-            nodes = renderer.handle_mime(self, data, True)
+        for plugin in plugins:
+            nodes = plugin.handle_mime(self, data, True)
             if nodes is not None:
                 return nodes
 
         # try built-in renderers
-        if data.mime_type == "text/plain":
-            return self.render_text_plain_inline(data)
-        if data.mime_type in {
-            "image/png",
-            "image/jpeg",
-            "application/pdf",
-            "image/svg+xml",
-            "image/gif",
-        }:
-            return self.render_image_inline(data)
-        if data.mime_type == "text/html":
-            return self.render_text_html_inline(data)
-        if data.mime_type == "text/latex":
-            return self.render_text_latex_inline(data)
-        if data.mime_type == "application/javascript":
-            return self.render_javascript_inline(data)
-        if data.mime_type == WIDGET_VIEW_MIMETYPE:
-            return self.render_widget_view_inline(data)
-        if data.mime_type == "text/markdown":
-            return self.render_markdown_inline(data)
+        if method is not None:
+            return getattr(self, method)(data)
 
         return self.render_unhandled_inline(data)
 
@@ -783,17 +1015,10 @@ class NbElementRenderer:
             if fmt == "myst":
                 # use the current configuration to render the markdown
                 pass
-            elif fmt == "commonmark":
-                # use an isolated, CommonMark only, parser
-                self.renderer.md_config = MdParserConfig(commonmark_only=True)
-                self.renderer.md = create_md_parser(
-                    self.renderer.md_config, self.renderer.__class__
-                )
-            elif fmt == "gfm":
-                # use an isolated, GitHub Flavoured Markdown only, parser
-                self.renderer.md_config = MdParserConfig(gfm_only=True)
-                self.renderer.md = create_md_parser(
-                    self.renderer.md_config, self.renderer.__class__
+            elif fmt in ("commonmark", "gfm"):
+                # use an isolated, CommonMark or GitHub Flavoured Markdown only, parser
+                self.renderer.md_config, self.renderer.md = get_isolated_md_parser(
+                    fmt, self.renderer.__class__
                 )
             else:
                 self.logger.warning(
@@ -817,6 +1042,24 @@ class NbElementRenderer:
         return pseudo_element.children
 
 
+@lru_cache(maxsize=None)
+def get_isolated_md_parser(
+    fmt: Literal["commonmark", "gfm"], renderer_cls: type
+) -> tuple[MdParserConfig, MarkdownIt]:
+    """Get an isolated (CommonMark or GitHub Flavoured Markdown only) parser,
+    and its configuration, for rendering markdown outputs.
+
+    Parsers are created once per process, and shared between documents:
+    parsing does not modify the parser, with all state held in the environment
+    of the renderer using it.
+    """
+    if fmt == "commonmark":
+        config = MdParserConfig(commonmark_only=True)
+    else:
+        config = MdParserConfig(gfm_only=True)
+    return config, create_md_parser(config, renderer_cls)
+
+
 class EntryPointError(Exception):
     """Exception raised when an entry point cannot be loaded."""
 
@@ -852,6 +1095,13 @@ class MimeRenderPlugin(Protocol):
     mime_priority_overrides: ClassVar[Sequence[tuple[str, str, int | None]]] = ()
     """A list of (builder name, mime type, priority)."""
 
+    mime_types: ClassVar[Sequence[str] | None] = None
+    """The mime types handled by the plugin, which may be wildcard families like ``image/*``.
+
+    The plugin is only called for outputs of these mime types,
+    or for all outputs if None.
+    """
+
     @staticmethod
     def handle_mime(
         renderer: NbElementRenderer, data: MimeData, inline: bool
@@ -863,6 +1113,7 @@ class ExampleMimeRenderPlugin(MimeRenderPlugin):
     """Example mime renderer for `custommimetype`."""
 
     mime_priority_overrides = [("*", "custommimetype", 1)]
+    mime_types = ["custommimetype"]
 
     @staticmethod
     def handle_mime(
@@ -887,6 +1138,59 @@ def load_mime_renders() -> list[MimeRenderPlugin]:
     return [ep.load() for ep in all_eps.get(MIME_RENDER_ENTRY_GROUP, [])]  # type: ignore
 
 
+def mime_type_matches(mime_type: str, pattern: str) -> bool:
+    """Return whether a mime type matches a pattern,
+    which may be a wildcard family like ``image/*``, or ``*`` for any mime type.
+    """
+    if pattern == "*" or pattern == mime_type:
+        return True
+    return pattern.endswith("/*") and mime_type.startswith(pattern[:-1])
+
+
+class MimeDispatch:
+    """A registry of the plugins and renderer methods, handling each mime type."""
+
+    def __init__(self, plugins: Sequence[MimeRenderPlugin], methods: Mapping[str, str]) -> None:
+        """Initialise the registry.
+
+        :param plugins: The mime renderer plugins, in the order they are tried
+        :param methods: Mapping of mime types (or wildcard families) to renderer method names
+        """
+        self._plugins = [(plugin, getattr(plugin, "mime_types", None)) for plugin in plugins]
+        self._methods = methods
+        self._cache: dict[str, tuple[tuple[MimeRenderPlugin, ...], str | None]] = {}
+
+    def lookup(self, mime_type: str) -> tuple[tuple[MimeRenderPlugin, ...], str | None]:
+        """Get the plugins claiming a mime type, and the name of the renderer method for it.
+
+        The method is looked up by the exact mime type, then its family, then ``*``.
+        """
+        if mime_type in self._cache:
+            return self._cache[mime_type]
+        plugins = tuple(
+            plugin
+            for plugin, patterns in self._plugins
+            if patterns is None
+            or any(mime_type_matches(mime_type, pattern) for pattern in patterns)
+        )
+        method = None
+        for key in (mime_type, mime_type.split("/", 1)[0] + "/*", "*"):
+            if key in self._methods:
+                method = self._methods[key]
+                break
+        self._cache[mime_type] = (plugins, method)
+        return plugins, method
+
+
+@lru_cache(maxsize=None)
+def get_mime_dispatch(renderer_cls: type[NbElementRenderer], inline: bool) -> MimeDispatch:
+    """Get the mime type dispatch registry for a renderer class,
+    built once from the ``myst_nb.mime_renderers`` plugins and the renderer's methods.
+    """
+    methods = renderer_cls.mime_renderers_inline if inline else renderer_cls.mime_renderers
+    return MimeDispatch(load_mime_renders(), methods)
+
+
 def strip_ansi(text: str) -> str:
     """Strip ANSI escape sequences from a string"""
     return _ANSI_RE.sub("", text)
@@ -1197,12 +1501,46 @@ def get_mime_priority(builder: str, overrides: Sequence[tuple[str, str, int | No
     Takes the base priority list, overrides from the config,
     then sorts by priority in ascending order.
     """
+    return list(get_mime_priority_index(builder, overrides))
+
+
+def get_mime_priority_index(
+    builder: str, overrides: Sequence[tuple[str, str, int | None]]
+) -> Mapping[str, int]:
+    """Return the (immutable) priority index for the builder: mime type -> rank.
+
+    The index is computed once per builder and overrides, and is ordered by rank.
+    """
+    return _mime_priority_index(builder, tuple(tuple(override) for override in overrides))
+
+
+@lru_cache(maxsize=None)
+def _mime_priority_index(
+    builder: str, overrides: tuple[tuple[str, str, int | None], ...]
+) -> Mapping[str, int]:
+    """Compute the priority index for the builder (cached)."""
     base = base_render_priority().get(builder, {})
-    overrides = list(overrides)
+    _overrides = list(overrides)
     for plugin in load_mime_renders():
-        overrides = list(getattr(plugin, "mime_priority_overrides", [])) + overrides
-    for override in overrides:
+        _overrides = list(getattr(plugin, "mime_priority_overrides", [])) + _overrides
+    for override in _overrides:
         if override[0] == "*" or override[0] == builder:
             base[override[1]] = override[2]
     sort = sorted(((k, p) for k, p in base.items() if p is not None), key=lambda x: x[1])
-    return [k for k, _ in sort]
+    return MappingProxyType({k: rank for rank, (k, _) in enumerate(sort)})
+
+
+def select_mime_type(mime_types: Iterable[str], priority_index: Mapping[str, int]) -> str | None:
+    """Select the highest priority mime type available, in a single pass.
+
+    :param mime_types: The available mime types
+    :param priority_index: The priority index, from `get_mime_priority_index`
+    :returns: The selected mime type, or None if none are in the index
+    """
+    selected: str | None = None
+    selected_rank = len(priority_index)
+    for mime_type in mime_types:
+        rank = priority_index.get(mime_type, selected_rank)
+        if rank < selected_rank:
+            selected, selected_rank = mime_type, rank
+    return selected
@@ -0,0 +1,145 @@
+"""A persistent cache of the block-level tokens parsed from Markdown cells.
+
+Cells are keyed by a hash of their source and a fingerprint of the parser configuration,
+so that unchanged cells do not need to be re-parsed when a notebook is re-read.
+"""
+from __future__ import annotations
+
+import dataclasses as dc
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import sqlite3
+import time
+from typing import Any
+
+import markdown_it
+from markdown_it.main import MarkdownIt
+from markdown_it.token import Token
+import myst_parser
+
+from myst_nb import __version__
+
+TOKEN_CACHE_NAME = "mystnb_tokens.db"
+"""The name of the cache database file."""
+
+CACHEABLE_ENV_KEYS = ("references", "duplicate_refs", "footnotes")
+"""The keys of the markdown-it environment that block parsing may set,
+and that can be merged from a cached cell.
+"""
+
+
+def md_parser_fingerprint(mdit_parser: MarkdownIt) -> str:
+    """Create a fingerprint of the parser configuration and (block) rules."""
+    items: list[Any] = [__version__, markdown_it.__version__, myst_parser.__version__]
+    config = mdit_parser.options.get("myst_config", None)
+    if config is not None:
+        for field in dc.fields(config):
+            value = getattr(config, field.name)
+            if callable(value):
+                value = f"{value.__module__}.{value.__qualname__}"
+            elif isinstance(value, (set, frozenset)):
+                value = sorted(value)
+            items.append((field.name, value))
+    items.append(mdit_parser.block.ruler.get_active_rules())
+    return hashlib.sha256(repr(items).encode("utf8")).hexdigest()
+
+
+class MdTokenCache:
+    """A least-recently-used cache of parsed tokens, stored in an SQLite database."""
+
+    def __init__(self, folder: str | Path, max_size: int) -> None:
+        """Initialise the cache, and evict the least recently used entries.
+
+        :param folder: The folder to store the database in (created if missing)
+        :param max_size: The maximum number of cells to store
+        """
+        Path(folder).mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(Path(folder) / TOKEN_CACHE_NAME), timeout=30)
+        self._accessed: set[str] = set()
+        self._pending: dict[str, bytes] = {}
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS tokens "
+                "(key TEXT PRIMARY KEY, data BLOB, accessed REAL)"
+            )
+            self._connection.execute(
+                "DELETE FROM tokens WHERE key NOT IN "
+                "(SELECT key FROM tokens ORDER BY accessed DESC LIMIT ?)",
+                (max_size,),
+            )
+
+    @staticmethod
+    def cell_key(source: str, fingerprint: str) -> str:
+        """Create the key for a cell."""
+        return hashlib.sha256((fingerprint + source).encode("utf8")).hexdigest()
+
+    def get(self, key: str) -> tuple[list[Token], dict[str, Any]] | None:
+        """Get the tokens and environment updates of a cell, if cached."""
+        if key in self._pending:
+            return pickle.loads(self._pending[key])  # type: ignore[no-any-return]
+        try:
+            row = self._connection.execute(
+                "SELECT data FROM tokens WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # e.g. the database is locked by another process
+            return None
+        if row is None:
+            return None
+        self._accessed.add(key)
+        return pickle.loads(row[0])  # type: ignore[no-any-return]
+
+    def set(self, key: str, tokens: list[Token], env: dict[str, Any]) -> None:
+        """Cache the tokens and environment updates of a cell (on the next flush)."""
+        self._pending[key] = pickle.dumps((tokens, env))
+
+    def flush(self) -> None:
+        """Write the new cells, and access times, to the database."""
+        now = time.time()
+        try:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)",
+                    [(key, data, now) for key, data in self._pending.items()],
+                )
+                self._connection.executemany(
+                    "UPDATE tokens SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in self._accessed],
+                )
+        except sqlite3.OperationalError:
+            pass
+        self._pending.clear()
+        self._accessed.clear()
+
+
+_CACHES: dict[tuple[int, str], MdTokenCache] = {}
+
+
+def get_token_cache(folder: str | Path, max_size: int) -> MdTokenCache:
+    """Get the token cache for a folder, for the current process."""
+    key = (os.getpid(), str(folder))
+    if key not in _CACHES:
+        _CACHES[key] = MdTokenCache(folder, max_size)
+    return _CACHES[key]
+
+
+def merge_cell_env(mdit_env: dict[str, Any], cell_env: dict[str, Any]) -> None:
+    """Merge the environment of a cell, parsed in isolation, into the notebook environment.
+
+    This mirrors the markdown-it reference rule,
+    whereby the first definition of a reference is used, and others are recorded as duplicates.
+    """
+    references = mdit_env.setdefault("references", {}) if "references" in cell_env else {}
+    for label, reference in cell_env.get("references", {}).items():
+        if label not in references:
+            references[label] = reference
+        else:
+            mdit_env.setdefault("duplicate_refs", []).append({**reference, "label": label})
+    if cell_env.get("duplicate_refs"):
+        mdit_env.setdefault("duplicate_refs", []).extend(cell_env["duplicate_refs"])
+    if "footnotes" in cell_env:
+        footnotes = mdit_env.setdefault("footnotes", {})
+        for name, value in cell_env["footnotes"].items():
+            footnotes.setdefault(name, {}).update(value)
@@ -5,8 +5,53 @@ import re
 
 from nbformat import NotebookNode
 
-_RGX_CARRIAGERETURN = re.compile(r".*\r(?=[^\n])")
-_RGX_BACKSPACE = re.compile(r"[^\n]\b")
+_RGX_LINE_RESET = re.compile(r"\r|\x1b\[[12]K")
+"""Carriage returns and ANSI codes that clear the line (the cursor always being at its end)."""
+_RGX_BACKSPACES = re.compile(r"(\x08+|\x1b\[[0-?]*[ -/]*[@-~])")
+"""Backspaces, and the ANSI escape sequences (not displayed) that they skip over."""
+_RGX_ERASE_END = re.compile(r"\x1b\[0?K")
+
+
+def process_control_characters(text: str) -> str:
+    """Apply carriage returns, backspaces and line clearing in stream text,
+    as a notebook frontend would display it.
+
+    This is a single pass over each line:
+    a carriage return (not ending the line) or ``ESC[1K``/``ESC[2K`` clears the line,
+    a backspace removes the preceding (displayed) character on the line,
+    and ``ESC[K`` (clearing to the end of the line) is removed.
+    """
+    if "\r" not in text and "\x08" not in text and "\x1b[" not in text:
+        return text
+    lines = text.split("\n")
+    for index, line in enumerate(lines):
+        if "\r" not in line and "\x08" not in line and "\x1b[" not in line:
+            continue
+        ending = ""
+        if line.endswith("\r"):
+            # keep carriage returns that end the line (e.g. CRLF line endings)
+            line, ending = line[:-1], "\r"
+        line = _RGX_LINE_RESET.split(line)[-1]
+        line = _RGX_ERASE_END.sub("", line)
+        if "\x08" in line:
+            chunks: list[str] = []
+            for chunk in _RGX_BACKSPACES.split(line):
+                if not chunk.startswith("\x08"):
+                    chunks.append(chunk)
+                    continue
+                # remove as many characters from the end of the line,
+                # leaving escape sequences intact
+                remove = len(chunk)
+                position = len(chunks) - 1
+                while position >= 0 and remove:
+                    text_chunk = chunks[position]
+                    if not _RGX_BACKSPACES.fullmatch(text_chunk):
+                        chunks[position] = text_chunk[: max(len(text_chunk) - remove, 0)]
+                        remove -= len(text_chunk) - len(chunks[position])
+                    position -= 1
+            line = "".join(chunks)
+        lines[index] = line + ending
+    return "\n".join(lines)
 
 
 def coalesce_streams(outputs: list[NotebookNode]) -> list[NotebookNode]:
@@ -22,25 +67,23 @@ def coalesce_streams(outputs: list[NotebookNode]) -> list[NotebookNode]:
 
     new_outputs = []
     streams: dict[str, NotebookNode] = {}
+    texts: dict[str, list[str]] = {}
     for output in outputs:
         if output["output_type"] == "stream":
             if output["name"] in streams:
-                streams[output["name"]]["text"] += output["text"]
+                texts[output["name"]].append(output["text"])
             else:
+                # copy the output, so that the original outputs are not modified
+                output = NotebookNode(output)
                 new_outputs.append(output)
                 streams[output["name"]] = output
+                texts[output["name"]] = [output["text"]]
         else:
             new_outputs.append(output)
 
-    # process \r and \b characters
-    for output in streams.values():
-        old = output["text"]
-        while len(output["text"]) < len(old):
-            old = output["text"]
-            # Cancel out anything-but-newline followed by backspace
-            output["text"] = _RGX_BACKSPACE.sub("", output["text"])
-        # Replace all carriage returns not followed by newline
-        output["text"] = _RGX_CARRIAGERETURN.sub("", output["text"])
+    # join the texts, and process \r, \b and line clearing characters
+    for name, output in streams.items():
+        output["text"] = process_control_characters("".join(texts[name]))
 
     # We also want to ensure stdout and stderr are always in the same consecutive order,
     # because they are asynchronous, so order isn't guaranteed.
@@ -55,3 +98,45 @@ def coalesce_streams(outputs: list[NotebookNode]) -> list[NotebookNode]:
                 new_outputs.insert(i, stdout)
 
     return new_outputs
+
+
+def truncate_text(text: str, max_bytes: int = -1, max_lines: int = -1) -> tuple[str, str] | None:
+    """Truncate text to a maximum size and number of lines,
+    keeping its head and tail (each up to half of the limits).
+
+    Where possible, the text is cut at line boundaries.
+
+    :param text: the text to truncate
+    :param max_bytes: the maximum size (utf8 encoded) of the text (-1 for no limit)
+    :param max_lines: the maximum number of lines of the text (-1 for no limit)
+    :returns: the (head, tail) of the text, or None if it is within the limits
+    """
+    head = tail = text
+    truncated = False
+    if max_lines >= 0 and text.count("\n") + (0 if text.endswith("\n") else 1) > max_lines:
+        # only split on newlines, consistent with the line count
+        lines = text.split("\n")
+        if text.endswith("\n"):
+            lines.pop()
+        head = "".join(f"{line}\n" for line in lines[: max_lines - max_lines // 2])
+        tail = ""
+        if max_lines // 2:
+            tail = "\n".join(lines[len(lines) - max_lines // 2 :])
+            tail += "\n" if text.endswith("\n") else ""
+        truncated = True
+    if max_bytes >= 0:
+        size = len(head.encode("utf8")) + (len(tail.encode("utf8")) if truncated else 0)
+        if size > max_bytes:
+            head_bytes = head.encode("utf8")[: max_bytes - max_bytes // 2]
+            head = head_bytes.decode("utf8", errors="ignore")
+            if "\n" in head:
+                head = head[: head.rfind("\n") + 1]
+            tail_bytes = tail.encode("utf8")
+            tail_bytes = tail_bytes[len(tail_bytes) - max_bytes // 2 :] if max_bytes // 2 else b""
+            tail = tail_bytes.decode("utf8", errors="ignore")
+            if "\n" in tail[:-1]:
+                tail = tail[tail.find("\n") + 1 :]
+            truncated = True
+    if not truncated:
+        return None
+    return head, tail
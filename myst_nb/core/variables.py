@@ -9,7 +9,12 @@ from docutils import nodes
 
 from myst_nb._compat import findall
 from myst_nb.core.loggers import DocutilsDocLogger, SphinxDocLogger
-from myst_nb.core.render import MimeData, NbElementRenderer, get_mime_priority
+from myst_nb.core.render import (
+    MimeData,
+    NbElementRenderer,
+    get_mime_priority_index,
+    select_mime_type,
+)
 
 
 def is_sphinx(document: nodes.document) -> bool:
@@ -138,13 +143,12 @@ def _render_output_docutils(
     inline=False,
 ) -> list[nodes.Node]:
     """Render the output in docutils (select mime priority directly)."""
-    mime_priority = get_mime_priority(
+    priority_index = get_mime_priority_index(
         output.nb_renderer.config.builder_name,
         output.nb_renderer.config.mime_priority_overrides,
     )
-    try:
-        mime_type = next(x for x in mime_priority if x in output.data)
-    except StopIteration:
+    mime_type = select_mime_type(output.data, priority_index)
+    if mime_type is None:
         if output.data:
             return [
                 create_warning(
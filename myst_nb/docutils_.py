@@ -18,15 +18,16 @@ from myst_parser.mdit_to_docutils.base import DocutilsRenderer, token_line
 from myst_parser.parsers.docutils_ import Parser as MystParser
 from myst_parser.parsers.docutils_ import create_myst_config, create_myst_settings_spec
 from myst_parser.parsers.mdit import create_md_parser
-import nbformat
 from nbformat import NotebookNode
 from pygments.formatters import get_formatter_by_name
 
 from myst_nb import static
-from myst_nb.core.config import NbParserConfig
+from myst_nb.core.config import CellConfigResolver, NbParserConfig
 from myst_nb.core.execute import create_client
+from myst_nb.core.lazy import close_nb_buffers, nb_writes
 from myst_nb.core.loggers import DocutilsDocLogger  # DEFAULT_LOG_TYPE,
 from myst_nb.core.nb_to_tokens import nb_node_to_dict, notebook_to_tokens
+from myst_nb.core.output_store import get_output_store, remove_output_manifest
 from myst_nb.core.read import (
     NbReader,
     UnexpectedCellDirective,
@@ -38,10 +39,11 @@ from myst_nb.core.render import (
     MimeData,
     NbElementRenderer,
     create_figure_context,
-    get_mime_priority,
+    get_mime_priority_index,
     load_renderer,
+    select_mime_type,
 )
-from myst_nb.ext.eval import load_eval_docutils
+from myst_nb.ext.eval import collect_eval_expressions, load_eval_docutils
 from myst_nb.ext.glue import load_glue_docutils
 from myst_nb.warnings_ import MystNBWarnings, create_warning
 
@@ -157,10 +159,15 @@ class Parser(MystParser):
             else:
                 logger.debug("Updated configuration with notebook metadata", subtype="config")
 
+        # a single notebook is executed per docutils run,
+        # so there are no subsequent notebooks to start kernels in advance for
+        nb_config = nb_config.copy(execution_kernel_pool=0)
+
         # Setup the markdown parser
         mdit_parser = create_md_parser(nb_reader.md_config, DocutilsNbRenderer)
         mdit_parser.options["document"] = document
         mdit_parser.options["nb_config"] = nb_config
+        mdit_parser.options["nb_cell_config"] = CellConfigResolver(nb_config)
         mdit_renderer: DocutilsNbRenderer = mdit_parser.renderer  # type: ignore
         mdit_env: dict[str, Any] = {}
 
@@ -180,7 +187,10 @@ class Parser(MystParser):
 
         # open the notebook execution client,
         # this may execute the notebook immediately or during the page render
-        with create_client(notebook, document_source, nb_config, logger) as nb_client:
+        eval_expressions = collect_eval_expressions(mdit_tokens) if nb_config.eval_batch else None
+        with create_client(
+            notebook, document_source, nb_config, logger, eval_expressions=eval_expressions
+        ) as nb_client:
             mdit_parser.options["nb_client"] = nb_client
             # convert to docutils AST, which is added to the document
             mdit_renderer.render(mdit_tokens, mdit_parser.options, mdit_env)
@@ -191,7 +201,7 @@ class Parser(MystParser):
 
         if nb_config.output_folder:
             # write final (updated) notebook to output folder (utf8 is standard encoding)
-            content = nbformat.writes(notebook).encode("utf-8")
+            content = nb_writes(notebook)
             nb_renderer.write_file(["processed.ipynb"], content, overwrite=True)
 
             # if we are using an HTML writer, dynamically add the CSS to the output
@@ -222,8 +232,15 @@ class Parser(MystParser):
 
             # TODO also handle JavaScript
 
+            if nb_config.output_store:
+                get_output_store(nb_config.output_folder).flush()
+            else:
+                # files were written without being tracked
+                remove_output_manifest(nb_config.output_folder)
+
         # remove temporary state
         document.attributes.pop("nb_renderer")
+        close_nb_buffers(notebook)
 
 
 class DocutilsNbRenderer(DocutilsRenderer, MditRenderMixin):
@@ -259,7 +276,7 @@ class DocutilsNbRenderer(DocutilsRenderer, MditRenderMixin):
         metadata = token.meta["metadata"]
         line = token_line(token)
         # render the outputs
-        mime_priority = get_mime_priority(
+        priority_index = get_mime_priority_index(
             self.nb_config.builder_name, self.nb_config.mime_priority_overrides
         )
         for output_index, output in enumerate(outputs):
@@ -284,9 +301,8 @@ class DocutilsNbRenderer(DocutilsRenderer, MditRenderMixin):
                 # as opposed to output all mime types, and select in a post-transform
                 # (the mime_priority must then be set for the output format)
 
-                try:
-                    mime_type = next(x for x in mime_priority if x in output["data"])
-                except StopIteration:
+                mime_type = select_mime_type(output["data"], priority_index)
+                if mime_type is None:
                     if output["data"]:
                         create_warning(
                             self.document,
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from functools import partial
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Sequence
 
 from docutils import nodes
 from docutils.parsers.rst import directives as spec
@@ -24,6 +24,7 @@ except ImportError:
     Domain = object  # type: ignore
 
 if TYPE_CHECKING:
+    from markdown_it.token import Token
     from sphinx.application import Sphinx
 
     from myst_nb.docutils_ import DocutilsApp
@@ -71,6 +72,35 @@ def retrieve_eval_data(document: nodes.document, key: str) -> list[VariableOutpu
     ]
 
 
+def collect_eval_expressions(tokens: Sequence[Token]) -> dict[int, list[str]]:
+    """Collect the expressions of the eval roles and directives in the markdown cells,
+    from the parsed tokens of a notebook (so excluding, e.g., those in code blocks).
+
+    Note, roles in the content of other directives are not parsed until the render,
+    so are not collected.
+
+    :returns: mapping of markdown cell index to expressions, in order
+    """
+    expressions: dict[int, list[str]] = {}
+    cell_index: int | None = None
+    for token in tokens:
+        if token.type == "nb_cell_markdown_open":
+            cell_index = token.meta["index"]
+        elif token.type == "nb_cell_markdown_close":
+            cell_index = None
+        elif cell_index is None:
+            continue
+        elif token.type in ("fence", "colon_fence"):
+            name, _, argument = token.info.strip().partition(" ")
+            if name in ("{eval}", "{eval:figure}") and argument.strip():
+                expressions.setdefault(cell_index, []).append(argument.strip())
+        elif token.type == "inline":
+            for child in token.children or []:
+                if child.type == "myst_role" and child.meta.get("name") == "eval":
+                    expressions.setdefault(cell_index, []).append(child.content.strip())
+    return expressions
+
+
 class EvalRoleAny(RoleBase):
     """A role for evaluating value outputs from the kernel,
     using render priority to decide the output mime type.
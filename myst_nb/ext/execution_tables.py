@@ -3,6 +3,8 @@
 The `nb-exec-table` directive adds a placeholder node to the document,
 which is then replaced by a table of statistics in a post-transformation
 (once all the documents have been executed and these statistics are available).
+With the ``slowest-cells`` option, the table instead lists the slowest code cells
+across all executed notebooks.
 """
 from __future__ import annotations
 
@@ -11,6 +13,7 @@ import posixpath
 from typing import Any, Callable, DefaultDict
 
 from docutils import nodes
+from docutils.parsers.rst import directives
 from sphinx.addnodes import pending_xref
 from sphinx.application import Sphinx
 from sphinx.transforms.post_transforms import SphinxPostTransform
@@ -41,12 +44,16 @@ class ExecutionStatsTable(SphinxDirective):
 
     has_content = True
     final_argument_whitespace = True
+    option_spec = {"slowest-cells": directives.nonnegative_int}
 
     def run(self):
         """Add a placeholder node to the document, and mark it as having a table."""
         self.env: SphinxEnvType
         NbMetadataCollector.set_doc_data(self.env, self.env.docname, METADATA_KEY, True)
-        return [ExecutionStatsNode()]
+        node = ExecutionStatsNode()
+        if "slowest-cells" in self.options:
+            node["slowest_cells"] = self.options["slowest-cells"]
+        return [node]
 
 
 def update_exec_tables(app: Sphinx, env: SphinxEnvType):
@@ -75,9 +82,13 @@ class ExecutionStatsPostTransform(SphinxPostTransform):
         """Replace the placeholder node with the final table nodes."""
         self.env: SphinxEnvType
         for node in self.document.traverse(ExecutionStatsNode):
-            node.replace_self(
-                make_stat_table(self.env.docname, NbMetadataCollector.get_doc_data(self.env))
-            )
+            metadata = NbMetadataCollector.get_doc_data(self.env)
+            if "slowest_cells" in node:
+                node.replace_self(
+                    make_cell_stat_table(self.env.docname, metadata, node["slowest_cells"])
+                )
+            else:
+                node.replace_self(make_stat_table(self.env.docname, metadata))
 
 
 _key2header: dict[str, str] = {
@@ -95,8 +106,8 @@ _key2transform: dict[str, Callable[[Any], str]] = {
 }
 
 
-def make_stat_table(parent_docname: str, metadata: DefaultDict[str, dict]) -> nodes.table:
-    """Create a table of statistics on executed notebooks."""
+def _make_table(headers: list[str]) -> tuple[nodes.table, nodes.tbody]:
+    """Create a table with a header row, and return it with its (empty) body."""
 
     # top-level element
     table = nodes.table()
@@ -104,7 +115,7 @@ def make_stat_table(parent_docname: str, metadata: DefaultDict[str, dict]) -> no
     # self.set_source_info(table)
 
     # column settings element
-    ncols = len(_key2header) + 1
+    ncols = len(headers)
     tgroup = nodes.tgroup(cols=ncols)
     table += tgroup
     colwidths = [round(100 / ncols, 2)] * ncols
@@ -118,13 +129,37 @@ def make_stat_table(parent_docname: str, metadata: DefaultDict[str, dict]) -> no
     row = nodes.row()
     thead += row
 
-    for name in ["Document"] + list(_key2header.values()):
+    for name in headers:
         row.append(nodes.entry("", nodes.paragraph(text=name)))
 
     # body
     tbody = nodes.tbody()
     tgroup += tbody
 
+    return table, tbody
+
+
+def _make_doc_entry(parent_docname: str, docname: str) -> nodes.entry:
+    """Create a table entry, with a link to a document."""
+    doclink = pending_xref(
+        refdoc=parent_docname,
+        reftarget=posixpath.relpath(docname, posixpath.dirname(parent_docname)),
+        reftype="doc",
+        refdomain="std",
+        refexplicit=True,
+        refwarn=True,
+        classes=["xref", "doc"],
+    )
+    doclink += nodes.inline(text=docname)
+    paragraph = nodes.paragraph()
+    paragraph += doclink
+    return nodes.entry("", paragraph)
+
+
+def make_stat_table(parent_docname: str, metadata: DefaultDict[str, dict]) -> nodes.table:
+    """Create a table of statistics on executed notebooks."""
+    table, tbody = _make_table(["Document"] + list(_key2header.values()))
+
     for docname in sorted(metadata):
         data = metadata[docname].get("exec_data")
         if not data:
@@ -133,19 +168,7 @@ def make_stat_table(parent_docname: str, metadata: DefaultDict[str, dict]) -> no
         tbody += row
 
         # document name
-        doclink = pending_xref(
-            refdoc=parent_docname,
-            reftarget=posixpath.relpath(docname, posixpath.dirname(parent_docname)),
-            reftype="doc",
-            refdomain="std",
-            refexplicit=True,
-            refwarn=True,
-            classes=["xref", "doc"],
-        )
-        doclink += nodes.inline(text=docname)
-        paragraph = nodes.paragraph()
-        paragraph += doclink
-        row.append(nodes.entry("", paragraph))
+        row.append(_make_doc_entry(parent_docname, docname))
 
         # other rows
         for name in _key2header.keys():
@@ -160,3 +183,31 @@ def make_stat_table(parent_docname: str, metadata: DefaultDict[str, dict]) -> no
             row.append(nodes.entry("", paragraph))
 
     return table
+
+
+def make_cell_stat_table(
+    parent_docname: str, metadata: DefaultDict[str, dict], limit: int
+) -> nodes.table:
+    """Create a table of the slowest code cells, across all executed notebooks.
+
+    :param limit: The maximum number of cells to list (0 for all)
+    """
+    table, tbody = _make_table(["Document", "Cell", "Run Time (s)"])
+
+    cells = []
+    for docname, doc_data in metadata.items():
+        data = doc_data.get("exec_data")
+        if not data:
+            continue
+        # cell_runtimes may be missing from data stored by earlier versions
+        for cell_index, runtime in data.get("cell_runtimes", {}).items():
+            cells.append((runtime, docname, cell_index))
+    cells.sort(key=lambda cell: (-cell[0], cell[1], cell[2]))
+    for runtime, docname, cell_index in cells[:limit] if limit else cells:
+        row = nodes.row()
+        tbody += row
+        row.append(_make_doc_entry(parent_docname, docname))
+        row.append(nodes.entry("", nodes.paragraph(text=str(cell_index))))
+        row.append(nodes.entry("", nodes.paragraph(text=_key2transform["runtime"](runtime))))
+
+    return table
@@ -11,6 +11,8 @@ from nbformat import NotebookNode
 
 from myst_nb.core.loggers import LoggerType
 
+from .store import GlueStore
+
 if TYPE_CHECKING:
     from sphinx.application import Sphinx
 
@@ -85,10 +87,12 @@ def extract_glue_data(
     notebook: NotebookNode,
     source_map: list[int],
     logger: LoggerType,
-) -> dict[str, NotebookNode]:
-    """Extract all the glue data from the notebook."""
+) -> GlueStore:
+    """Extract all the glue data from the notebook,
+    into a store that spills the outputs to disk.
+    """
     # note this assumes v4 notebook format
-    data: dict[str, NotebookNode] = {}
+    data = GlueStore()
     for index, cell in enumerate(notebook.cells):
         if cell.cell_type != "code":
             continue
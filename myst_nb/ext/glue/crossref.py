@@ -5,10 +5,8 @@ since adding these nodes in a post-transform will not apply any transforms to th
 """
 from __future__ import annotations
 
-from functools import lru_cache
-import json
 from pathlib import Path
-from typing import Any, Sequence
+from typing import TYPE_CHECKING, Any, Mapping
 
 from docutils import nodes
 from sphinx.transforms.post_transforms import SphinxPostTransform
@@ -16,23 +14,29 @@ from sphinx.util import logging as sphinx_logging
 
 from myst_nb._compat import findall
 from myst_nb.core.loggers import DEFAULT_LOG_TYPE
-from myst_nb.core.render import get_mime_priority
+from myst_nb.core.render import get_mime_priority_index, select_mime_type
 from myst_nb.core.variables import format_plain_text
 
+from .index import GLUE_INDEX_NAME, get_glue_index
 from .utils import PendingGlueReference
 
+if TYPE_CHECKING:
+    from sphinx.application import Sphinx
+    from sphinx.environment import BuildEnvironment
+
 SPHINX_LOGGER = sphinx_logging.getLogger(__name__)
 
 
-@lru_cache(maxsize=3)
-def read_glue_cache(folder: str, docname: str) -> dict[str, Any]:
-    """Read a glue cache from the build folder, for a particular document."""
-    docpath = docname.split("/")
-    path = Path(folder).joinpath(*docpath[:-1]).joinpath(f"{docpath[-1]}.glue.json")
-    if not path.exists():
-        return {}
-    with path.open("r") as f:
-        return json.load(f)
+def index_glue_data(app: Sphinx, env: BuildEnvironment) -> None:
+    """Update the index of glue data, at the end of the read phase,
+    for use by cross-document glue references.
+    """
+    metadata: dict[str, dict] = getattr(env, "nb_metadata", {})
+    docnames = [docname for docname, data in metadata.items() if data.get("glue")]
+    folder: str = env.mystnb_config.output_folder  # type: ignore
+    if not docnames and not Path(folder, GLUE_INDEX_NAME).exists():
+        return  # no index is needed
+    get_glue_index(folder).update(docnames)
 
 
 class ReplacePendingGlueReferences(SphinxPostTransform):
@@ -48,11 +52,11 @@ class ReplacePendingGlueReferences(SphinxPostTransform):
         """Apply the transform."""
         cache_folder = self.env.mystnb_config.output_folder  # type: ignore
         bname = self.app.builder.name
-        priority_list = get_mime_priority(bname, self.config["nb_mime_priority_overrides"])
+        priority_index = get_mime_priority_index(bname, self.config["nb_mime_priority_overrides"])
         node: PendingGlueReference
         for node in list(findall(self.document)(PendingGlueReference)):
-            data = read_glue_cache(cache_folder, node.refdoc)
-            if node.key not in data:
+            output = get_glue_index(cache_folder).get(node.refdoc, node.key)
+            if output is None:
                 SPHINX_LOGGER.warning(
                     f"Glue reference {node.key!r} not found in doc {node.refdoc!r} "
                     f"[{DEFAULT_LOG_TYPE}.glue_ref]",
@@ -62,11 +66,10 @@ class ReplacePendingGlueReferences(SphinxPostTransform):
                 )
                 node.parent.remove(node)
                 continue
-            output = data[node.key]
             if node.gtype == "text":
                 _nodes = generate_text_nodes(node, output)
             else:
-                _nodes = generate_any_nodes(node, output, priority_list)
+                _nodes = generate_any_nodes(node, output, priority_index)
 
             if _nodes:
                 node.replace_self(_nodes)
@@ -85,20 +88,20 @@ def ref_warning(msg: str, node) -> None:
 
 
 def generate_any_nodes(
-    node: PendingGlueReference, output: dict[str, Any], priority_list: Sequence[str]
+    node: PendingGlueReference, output: dict[str, Any], priority_index: Mapping[str, int]
 ) -> list[nodes.Element]:
     """Generate nodes for a cell, according to the highest priority mime type."""
     data = output["data"]
-    for mime_type in priority_list:
-        if mime_type not in data:
-            continue
-        if mime_type == "text/plain":
-            if node.inline:
-                return [nodes.literal(data[mime_type], data[mime_type])]
-            else:
-                return [nodes.literal_block(data[mime_type], data[mime_type])]
-        if mime_type == "text/html":
-            return [nodes.raw(text=data[mime_type], format="html", classes=["output", "text_html"])]
+    mime_type = select_mime_type(
+        (m for m in ("text/plain", "text/html") if m in data), priority_index
+    )
+    if mime_type == "text/plain":
+        if node.inline:
+            return [nodes.literal(data[mime_type], data[mime_type])]
+        else:
+            return [nodes.literal_block(data[mime_type], data[mime_type])]
+    if mime_type == "text/html":
+        return [nodes.raw(text=data[mime_type], format="html", classes=["output", "text_html"])]
     ref_warning(f"No allowed mime type found in {node.key!r}: {list(output['data'])}", node)
     return []
 
@@ -0,0 +1,107 @@
+"""A project-wide index of glue data, for cross-document glue references.
+
+At the end of the read phase, the ``.glue.json`` file of each document is loaded
+(one at a time) into an SQLite database in the output folder,
+keyed by the document name and glue key.
+Pending glue references can then be resolved with a single indexed lookup,
+without loading any other glue data into memory.
+
+Documents are only re-indexed when their ``.glue.json`` file has changed.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+import sqlite3
+from typing import Any, Iterable
+
+GLUE_INDEX_NAME = "mystnb_glue.db"
+"""The name of the glue index database file, in the output folder."""
+
+
+def glue_json_path(folder: str | Path, docname: str) -> Path:
+    """Get the path to the glue data file of a document, in the output folder."""
+    docpath = docname.split("/")
+    return Path(folder).joinpath(*docpath[:-1]).joinpath(f"{docpath[-1]}.glue.json")
+
+
+class GlueIndex:
+    """An index of glue outputs, by document name and key."""
+
+    def __init__(self, folder: str | Path) -> None:
+        """Initialise the index, creating the database if necessary.
+
+        :param folder: The output folder, containing the ``.glue.json`` files
+        """
+        self._folder = Path(folder)
+        self._folder.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self._folder / GLUE_INDEX_NAME), timeout=30)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS documents (docname TEXT PRIMARY KEY, mtime INTEGER)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS outputs "
+                "(docname TEXT, key TEXT, payload TEXT, PRIMARY KEY (docname, key))"
+            )
+
+    def update(self, docnames: Iterable[str]) -> list[str]:
+        """Update the index with the glue data of documents,
+        and remove any other documents.
+
+        :param docnames: The documents with glue data
+        :returns: The documents that were (re-)indexed
+        """
+        indexed = dict(self._connection.execute("SELECT docname, mtime FROM documents").fetchall())
+        updated = []
+        with self._connection:
+            for docname in docnames:
+                path = glue_json_path(self._folder, docname)
+                try:
+                    mtime = path.stat().st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                if indexed.pop(docname, None) == mtime:
+                    continue
+                with path.open("r", encoding="utf8") as handle:
+                    data: dict[str, Any] = json.load(handle)
+                self._remove(docname)
+                self._connection.executemany(
+                    "INSERT INTO outputs (docname, key, payload) VALUES (?, ?, ?)",
+                    ((docname, key, json.dumps(output)) for key, output in data.items()),
+                )
+                self._connection.execute(
+                    "INSERT INTO documents (docname, mtime) VALUES (?, ?)", (docname, mtime)
+                )
+                updated.append(docname)
+            for docname in indexed:
+                self._remove(docname)
+        return updated
+
+    def _remove(self, docname: str) -> None:
+        """Remove a document from the index."""
+        self._connection.execute("DELETE FROM outputs WHERE docname = ?", (docname,))
+        self._connection.execute("DELETE FROM documents WHERE docname = ?", (docname,))
+
+    def get(self, docname: str, key: str) -> dict[str, Any] | None:
+        """Get a glue output, or None if it is not indexed."""
+        row = self._connection.execute(
+            "SELECT payload FROM outputs WHERE docname = ? AND key = ?", (docname, key)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._connection.close()
+
+
+_INDEXES: dict[tuple[int, str], GlueIndex] = {}
+
+
+def get_glue_index(folder: str | Path) -> GlueIndex:
+    """Get the glue index for an output folder, for the current process."""
+    key = (os.getpid(), str(folder))
+    if key not in _INDEXES:
+        _INDEXES[key] = GlueIndex(folder)
+    return _INDEXES[key]
@@ -0,0 +1,91 @@
+"""A store of glue data, with a low memory footprint.
+
+Glued outputs (such as figures) can be large, and a notebook may glue many of them.
+Rather than keeping them all in memory, for the whole render of the document,
+each output is serialized to a temporary (spill) file as it is added,
+and only its position in this file is kept in memory.
+Outputs are then loaded one at a time, when a glue role or directive is resolved.
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from typing import IO, Iterator, Mapping
+
+from nbformat import NotebookNode, from_dict
+
+from myst_nb.core.lazy import LazyOutputData
+
+
+class BytesEncoder(json.JSONEncoder):
+    """A JSON encoder that accepts b64 (and other *ascii*) bytestrings."""
+
+    def default(self, obj):
+        if isinstance(obj, bytes):
+            return obj.decode("ascii")
+        if isinstance(obj, LazyOutputData):
+            return obj.load()
+        return json.JSONEncoder.default(self, obj)
+
+
+class GlueStore(Mapping[str, NotebookNode]):
+    """A mapping of glue keys to outputs, with the outputs spilled to disk."""
+
+    def __init__(self) -> None:
+        """Initialise the (empty) store."""
+        self._file: IO[bytes] | None = None
+        self._offsets: dict[str, tuple[int, int]] = {}
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(keys={list(self._offsets)!r})"
+
+    def __getitem__(self, key: str) -> NotebookNode:
+        return from_dict(json.loads(self.read_raw(key)))
+
+    def __setitem__(self, key: str, output: NotebookNode) -> None:
+        """Add an output to the store (replacing any with the same key)."""
+        content = json.dumps(output, cls=BytesEncoder).encode("utf8")
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="mystnb-glue-")
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(content)
+        self._offsets[key] = (offset, len(content))
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def read_raw(self, key: str) -> bytes:
+        """Read the (JSON encoded) output for a key.
+
+        :raises KeyError: if the key is not in the store
+        """
+        offset, length = self._offsets[key]
+        assert self._file is not None
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def iter_json(self) -> Iterator[bytes]:
+        """Serialize the store to (utf8 encoded) JSON, in chunks,
+        read one output at a time from the spill file.
+        """
+        yield b"{"
+        for index, key in enumerate(list(self._offsets)):
+            if index:
+                yield b", "
+            yield json.dumps(key).encode("utf8") + b": "
+            yield self.read_raw(key)
+        yield b"}"
+
+    def close(self) -> None:
+        """Close (and so delete) the spill file, and clear the store."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._offsets = {}
@@ -83,9 +83,11 @@ def retrieve_glue_data(document: nodes.document, key: str) -> VariableOutput:
     if key not in glue_data:
         raise RetrievalError(msg)
 
+    # load the output from the store once
+    output = glue_data[key]
     return VariableOutput(
-        data=glue_data[key]["data"],
-        metadata=glue_data[key].get("metadata", {}),
+        data=output["data"],
+        metadata=output.get("metadata", {}),
         nb_renderer=element,
         vtype="glue",
     )
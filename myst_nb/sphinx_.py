@@ -2,10 +2,13 @@
 from __future__ import annotations
 
 from collections import defaultdict
+from glob import glob
+import hashlib
 from html import escape
-import json
 from pathlib import Path
+import os
 import re
+import time
 from typing import Any, DefaultDict, cast
 
 from docutils import nodes
@@ -18,26 +21,41 @@ from myst_parser.parsers.mdit import create_md_parser
 from myst_parser.parsers.sphinx_ import MystParser
 import nbformat
 from sphinx.application import Sphinx
-from sphinx.environment import BuildEnvironment
+from sphinx.environment import CONFIG_OK, BuildEnvironment
 from sphinx.environment.collectors import EnvironmentCollector
 from sphinx.transforms.post_transforms import SphinxPostTransform
 from sphinx.util import logging as sphinx_logging
 from sphinx.util.docutils import SphinxTranslator
 
 from myst_nb._compat import findall
-from myst_nb.core.config import NbParserConfig
+from myst_nb.core.config import CellConfigResolver, NbParserConfig
 from myst_nb.core.execute import ExecutionResult, create_client
+from myst_nb.core.execute.kernels import shutdown_kernel_pool
+from myst_nb.core.execute.pool import (
+    QUEUE_FOLDER,
+    PreExecutionJob,
+    execute_notebooks,
+    queue_notebooks,
+    requires_pre_execution,
+)
+from myst_nb.core.lazy import close_nb_buffers, nb_writes
 from myst_nb.core.loggers import DEFAULT_LOG_TYPE, SphinxDocLogger
 from myst_nb.core.nb_to_tokens import nb_node_to_dict, notebook_to_tokens
+from myst_nb.core.output_store import flush_output_stores
+from myst_nb.core.profile import Profiler, write_profile_reports
 from myst_nb.core.read import create_nb_reader
 from myst_nb.core.render import (
     MditRenderMixin,
     MimeData,
     NbElementRenderer,
     create_figure_context,
-    get_mime_priority,
+    get_mime_priority_index,
     load_renderer,
+    select_mime_type,
 )
+from myst_nb.core.token_cache import get_token_cache
+from myst_nb.ext.eval import collect_eval_expressions
+from myst_nb.ext.glue.store import BytesEncoder  # noqa: F401 (moved)
 from myst_nb.warnings_ import MystNBWarnings, create_warning
 
 SPHINX_LOGGER = sphinx_logging.getLogger(__name__)
@@ -81,12 +99,16 @@ class Parser(MystParser):
         # get notebook rendering configuration
         nb_config: NbParserConfig = self.env.mystnb_config
 
+        # record the time spent in each phase, if requested
+        profiler = Profiler(enabled=bool(nb_config.profile_report))
+
         # create a reader for the notebook
-        nb_reader = create_nb_reader(document_path, md_config, nb_config, inputstring)
-        # If the nb_reader is None, then we default to a standard Markdown parser
-        if nb_reader is None:
-            return super().parse(inputstring, document)
-        notebook = nb_reader.read(inputstring)
+        with profiler.span("read"):
+            nb_reader = create_nb_reader(document_path, md_config, nb_config, inputstring)
+            # If the nb_reader is None, then we default to a standard Markdown parser
+            if nb_reader is None:
+                return super().parse(inputstring, document)
+            notebook = nb_reader.read(inputstring)
 
         # update the global markdown config with the file-level config
         warning = lambda wtype, msg: create_warning(  # noqa: E731
@@ -95,23 +117,12 @@ class Parser(MystParser):
         nb_reader.md_config = merge_file_level(nb_reader.md_config, notebook.metadata, warning)
 
         # potentially replace kernel name with alias
-        kernel_name = notebook.metadata.get("kernelspec", {}).get("name", None)
-        if kernel_name is not None and nb_config.kernel_rgx_aliases:
-            for rgx, alias in nb_config.kernel_rgx_aliases.items():
-                if re.fullmatch(rgx, kernel_name):
-                    logger.debug(
-                        f"Replaced kernel name: {kernel_name!r} -> {alias!r}",
-                        subtype="kernel",
-                    )
-                    notebook.metadata["kernelspec"]["name"] = alias
-                    break
+        replace_kernel_name(notebook, nb_config, logger)
 
         # Update mystnb configuration with notebook level metadata
         if nb_config.metadata_key in notebook.metadata:
-            overrides = nb_node_to_dict(notebook.metadata[nb_config.metadata_key])
-            overrides.pop("output_folder", None)  # this should not be overridden
             try:
-                nb_config = nb_config.copy(**overrides)
+                nb_config = update_nb_config(notebook, nb_config)
             except Exception as exc:
                 logger.warning(
                     f"Failed to update configuration with notebook metadata: {exc}",
@@ -124,6 +135,7 @@ class Parser(MystParser):
         mdit_parser = create_md_parser(nb_reader.md_config, SphinxNbRenderer)
         mdit_parser.options["document"] = document
         mdit_parser.options["nb_config"] = nb_config
+        mdit_parser.options["nb_cell_config"] = CellConfigResolver(nb_config)
         mdit_renderer: SphinxNbRenderer = mdit_parser.renderer  # type: ignore
         mdit_env: dict[str, Any] = {}
 
@@ -139,16 +151,28 @@ class Parser(MystParser):
 
         # parse notebook structure to markdown-it tokens
         # note, this does not assume that the notebook has been executed yet
-        mdit_tokens = notebook_to_tokens(notebook, mdit_parser, mdit_env, logger)
+        token_cache = None
+        if nb_config.markdown_cache_size > 0:
+            token_cache = get_token_cache(self.env.doctreedir, nb_config.markdown_cache_size)
+        with profiler.span("tokens"):
+            mdit_tokens = notebook_to_tokens(notebook, mdit_parser, mdit_env, logger, token_cache)
 
         # open the notebook execution client,
         # this may execute the notebook immediately or during the page render
+        eval_expressions = collect_eval_expressions(mdit_tokens) if nb_config.eval_batch else None
         with create_client(
-            notebook, document_path, nb_config, logger, nb_reader.read_fmt
+            notebook,
+            document_path,
+            nb_config,
+            logger,
+            nb_reader.read_fmt,
+            profiler=profiler,
+            eval_expressions=eval_expressions,
         ) as nb_client:
             mdit_parser.options["nb_client"] = nb_client
             # convert to docutils AST, which is added to the document
-            mdit_renderer.render(mdit_tokens, mdit_parser.options, mdit_env)
+            with profiler.span("render"):
+                mdit_renderer.render(mdit_tokens, mdit_parser.options, mdit_env)
 
         # save final execution data
         if nb_client.exec_metadata:
@@ -168,22 +192,21 @@ class Parser(MystParser):
         # write final (updated) notebook to output folder (utf8 is standard encoding)
         path = self.env.docname.split("/")
         ipynb_path = path[:-1] + [path[-1] + ".ipynb"]
-        content = nbformat.writes(notebook).encode("utf-8")
-        nb_renderer.write_file(ipynb_path, content, overwrite=True)
+        with profiler.span("write"):
+            content = nb_writes(nb_client.notebook)
+            nb_renderer.write_file(ipynb_path, content, overwrite=True)
 
         # write glue data to the output folder,
         # and store the keys to environment doc metadata,
         # so that they may be used in any post-transform steps
         if nb_client.glue_data:
+            # (at `glue_json_path`, through the renderer, so that it is tracked by the store)
             glue_path = path[:-1] + [path[-1] + ".glue.json"]
-            nb_renderer.write_file(
-                glue_path,
-                json.dumps(nb_client.glue_data, cls=BytesEncoder).encode("utf8"),
-                overwrite=True,
-            )
+            nb_renderer.write_file(glue_path, nb_client.glue_data.iter_json(), overwrite=True)
             NbMetadataCollector.set_doc_data(
                 self.env, self.env.docname, "glue", list(nb_client.glue_data.keys())
             )
+        nb_client.glue_data.close()
 
         # move some document metadata to environment metadata,
         # so that we can later read it from the environment,
@@ -191,8 +214,221 @@ class Parser(MystParser):
         for key, (uri, kwargs) in document.attributes.pop("nb_js_files", {}).items():
             NbMetadataCollector.add_js_file(self.env, self.env.docname, key, uri, kwargs)
 
+        if profiler.enabled:
+            NbMetadataCollector.set_doc_data(self.env, self.env.docname, "profile", profiler.spans)
+
+        # record the inputs to the document (including its execution),
+        # so that it is only re-read when these change (they are hashed in `hash_inputs`)
+        NbMetadataCollector.set_doc_data(
+            self.env,
+            self.env.docname,
+            "inputs",
+            collect_inputs(self.env, self.env.docname, notebook, nb_config),
+        )
+
+        # outputs must be written before the doctree is read by sphinx's collectors,
+        # which check that image and download files exist (and copy them)
+        if nb_config.output_store:
+            flush_output_stores()
+
         # remove temporary state
         document.attributes.pop("nb_renderer")
+        close_nb_buffers(notebook)
+
+
+def replace_kernel_name(
+    notebook: nbformat.NotebookNode, nb_config: NbParserConfig, logger: SphinxDocLogger
+) -> None:
+    """Replace the notebook's kernel name with the first matching alias (in-place)."""
+    kernel_name = notebook.metadata.get("kernelspec", {}).get("name", None)
+    if kernel_name is not None and nb_config.kernel_rgx_aliases:
+        for rgx, alias in nb_config.kernel_rgx_aliases.items():
+            if re.fullmatch(rgx, kernel_name):
+                logger.debug(
+                    f"Replaced kernel name: {kernel_name!r} -> {alias!r}",
+                    subtype="kernel",
+                )
+                notebook.metadata["kernelspec"]["name"] = alias
+                break
+
+
+def update_nb_config(notebook: nbformat.NotebookNode, nb_config: NbParserConfig) -> NbParserConfig:
+    """Return the configuration, updated with the notebook level metadata.
+
+    :raises: if the notebook level metadata is invalid
+    """
+    if nb_config.metadata_key not in notebook.metadata:
+        return nb_config
+    overrides = nb_node_to_dict(notebook.metadata[nb_config.metadata_key])
+    overrides.pop("output_folder", None)  # this should not be overridden
+    overrides.pop("output_store", None)  # this applies to the whole build
+    return nb_config.copy(**overrides)
+
+
+def collect_inputs(
+    env: SphinxEnvType, docname: str, notebook: nbformat.NotebookNode, nb_config: NbParserConfig
+) -> dict[str, Any]:
+    """Collect the inputs of a notebook document.
+
+    The inputs are the source file, the files loaded by code cells (``:load:``),
+    the files matching the ``execution_inputs`` patterns,
+    and any other dependencies noted while reading the document.
+    These (except the source file) are also noted as dependencies of the document.
+
+    :returns: ``patterns``: absolute glob patterns of the declared inputs,
+        ``matched``: the files matching these patterns,
+        and ``hashes``: ``None``, until set by `hash_inputs`
+    """
+    folder = Path(env.doc2path(docname)).parent
+    for cell in notebook.cells:
+        if cell.cell_type == "code" and isinstance(cell.metadata.get("load"), str):
+            env.note_dependency(str(folder.joinpath(cell.metadata["load"]).resolve()))
+    patterns = [str(folder / pattern) for pattern in nb_config.execution_inputs]
+    matched = _match_inputs(patterns)
+    for path in matched:
+        env.note_dependency(path)
+    return {"patterns": patterns, "matched": matched, "hashes": None}
+
+
+def _input_paths(env: SphinxEnvType, docname: str) -> set[str]:
+    """Return the source file and (current) dependencies of a document."""
+    paths = {str(env.doc2path(docname))}
+    paths.update(str(Path(env.srcdir, dep)) for dep in env.dependencies.get(docname, ()))
+    return paths
+
+
+def hash_inputs(app: Sphinx, env: SphinxEnvType) -> None:
+    """Record the content hashes of the inputs of the notebooks read in this build.
+
+    This is run at the end of the read phase, rather than during the parse,
+    so that it includes the dependencies noted after it
+    (such as images, noted by sphinx when the doctree is read).
+    """
+    for docname, data in NbMetadataCollector.get_doc_data(env).items():
+        inputs = data.get("inputs")
+        if inputs is not None and inputs["hashes"] is None:
+            paths = _input_paths(env, docname)
+            inputs["hashes"] = {path: _file_digest(path) for path in sorted(paths)}
+
+
+def _match_inputs(patterns: list[str]) -> list[str]:
+    """Return the (sorted) files matching absolute glob patterns."""
+    matched: set[str] = set()
+    for pattern in patterns:
+        matched.update(path for path in glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(matched)
+
+
+def _file_digest(path: str) -> str | None:
+    """Return the content hash of a file, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as handle:
+            return hashlib.sha256(handle.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def pre_execute_notebooks(app: Sphinx, env: SphinxEnvType, docnames: list[str]) -> None:
+    """Execute all outdated notebooks in parallel, before they are read.
+
+    Only notebooks in 'cache' or 'queue' mode, without a match in the cache, are executed,
+    and their outputs are then retrieved from the cache when the notebook is parsed.
+    """
+    nb_config: NbParserConfig = env.mystnb_config
+    if nb_config.execution_mode != "queue" and nb_config.execution_workers < 2:
+        return
+    jobs = []
+    for docname in docnames:
+        logger = SphinxDocLogger(docname)
+        path = Path(env.doc2path(docname))
+        try:
+            content = path.read_text("utf8")
+            nb_reader = create_nb_reader(str(path), env.myst_config, nb_config, content)
+            if nb_reader is None:
+                continue
+            notebook = nb_reader.read(content)
+            replace_kernel_name(notebook, nb_config, logger)
+            job = PreExecutionJob(
+                path,
+                notebook,
+                update_nb_config(notebook, nb_config),
+                logger,
+                nb_reader.read_fmt,
+            )
+            if requires_pre_execution(job):
+                jobs.append(job)
+            else:
+                close_nb_buffers(notebook)
+        except Exception as exc:
+            # any issues will be reported when the notebook is parsed
+            logger.debug(f"Skipped pre-execution: {exc}", subtype="exec")
+    if jobs and nb_config.execution_mode == "queue":
+        queue_path = Path(nb_config.execution_cache_path or ".jupyter_cache", QUEUE_FOLDER)
+        SPHINX_LOGGER.info(
+            f"Executing {len(jobs)} notebook(s) through the job queue {str(queue_path)!r}, "
+            f"with {nb_config.execution_workers} local worker process(es) [{DEFAULT_LOG_TYPE}]"
+        )
+        queue_notebooks(
+            jobs, queue_path, nb_config.execution_workers, nb_config.execution_queue_timeout
+        )
+    elif jobs:
+        SPHINX_LOGGER.info(
+            f"Executing {len(jobs)} notebook(s) over {nb_config.execution_workers} "
+            f"worker process(es) [{DEFAULT_LOG_TYPE}]"
+        )
+        execute_notebooks(jobs, nb_config.execution_workers)
+    for job in jobs:
+        close_nb_buffers(job.notebook)
+
+
+def flush_outputs(app: Sphinx, env: SphinxEnvType) -> None:
+    """Wait for any output files, still pending at the end of the read phase,
+    to be flushed to disk.
+    """
+    if env.mystnb_config.output_store:
+        flush_output_stores()
+
+
+def shutdown_kernels(app: Sphinx, exception: Exception | None) -> None:
+    """Shut down the pooled kernels, started for executing notebooks in this process."""
+    shutdown_kernel_pool()
+
+
+def prune_profiles(app: Sphinx, env: SphinxEnvType) -> None:
+    """Remove the recorded profiles of documents that are no longer in the project."""
+    for docname, data in NbMetadataCollector.get_doc_data(env).items():
+        if docname not in env.found_docs:
+            data.pop("profile", None)
+
+
+def _write_phase_spans(builder: Any) -> dict[str, list[dict[str, Any]]]:
+    """Get the spans recorded during the write phase, by document name.
+
+    These are kept on the builder, rather than the environment,
+    since the environment is not saved (or merged) after the read phase.
+    """
+    if not hasattr(builder, "mystnb_write_spans"):
+        builder.mystnb_write_spans = {}
+    return builder.mystnb_write_spans
+
+
+def write_profile(app: Sphinx, exception: Exception | None) -> None:
+    """Write the build-wide report of the time spent processing each notebook."""
+    formats = app.env.mystnb_config.profile_report
+    if exception is not None or not formats:
+        return
+    write_spans = _write_phase_spans(app.builder)
+    profiles = {
+        docname: data["profile"] + write_spans.get(docname, [])
+        for docname, data in NbMetadataCollector.get_doc_data(app.env).items()
+        if "profile" in data and docname in app.env.found_docs
+    }
+    if not profiles:
+        return
+    paths = write_profile_reports(profiles, Path(app.outdir) / "reports", formats)
+    SPHINX_LOGGER.info(
+        f"Notebook profile report(s) written to: {', '.join(str(p) for p in paths)}"
+    )
 
 
 class SphinxNbRenderer(SphinxRenderer, MditRenderMixin):
@@ -221,6 +457,29 @@ class SphinxNbRenderer(SphinxRenderer, MditRenderMixin):
             ),
         )
 
+    def _get_target_mime_types(self, mime_bundle: dict[str, Any]) -> set[str] | None:
+        """Get the mime types of a bundle that the target builders would select,
+        or None if the target builders are not set.
+        """
+        builders = self.nb_config.target_builders
+        if not builders:
+            return None
+        overrides = cast(BuildEnvironment, self.sphinx_env).config["nb_mime_priority_overrides"]
+        selected = (
+            select_mime_type(mime_bundle, get_mime_priority_index(builder, overrides))
+            for builder in builders
+        )
+        return {mime_type for mime_type in selected if mime_type is not None}
+
+    def _get_charged_mime_type(self, mime_bundle: dict[str, Any]) -> str | None:
+        """Get the mime type of a bundle to count towards the notebook output totals,
+        i.e. the one selected by the first target builder, or else the current builder.
+        """
+        env = cast(BuildEnvironment, self.sphinx_env)
+        builders = self.nb_config.target_builders or [env.app.builder.name]
+        overrides = env.config["nb_mime_priority_overrides"]
+        return select_mime_type(mime_bundle, get_mime_priority_index(builders[0], overrides))
+
     def _render_nb_cell_code_outputs(
         self, token: SyntaxTreeNode, outputs: list[nbformat.NotebookNode]
     ) -> None:
@@ -253,6 +512,8 @@ class SphinxNbRenderer(SphinxRenderer, MditRenderMixin):
                 # (this is what sphinx caches as "output format agnostic" AST),
                 # and replace the mime_bundle with the format specific output
                 # in a post-transform (run per output format on the cached AST)
+                # unless the target builders are known, in which case we only output
+                # the mime types that they would select
 
                 figure_options = (
                     self.get_cell_level_config("render_figure_options", metadata, line=line) or None
@@ -261,9 +522,17 @@ class SphinxNbRenderer(SphinxRenderer, MditRenderMixin):
                 with create_figure_context(self, figure_options, line):
                     mime_bundle = nodes.container(nb_element="mime_bundle")
                     with self.current_node_context(mime_bundle):
+                        targets = self._get_target_mime_types(output["data"])
+                        # all mime types are rendered, before the one to display is selected,
+                        # so only one is counted towards the notebook output totals
+                        charged = self._get_charged_mime_type(output["data"])
                         for mime_type, data in output["data"].items():
+                            if targets is not None and mime_type not in targets:
+                                continue
                             mime_container = nodes.container(mime_type=mime_type)
-                            with self.current_node_context(mime_container):
+                            with self.current_node_context(
+                                mime_container
+                            ), self.nb_renderer.output_alternative(mime_type == charged):
                                 _nodes = self.nb_renderer.render_mime_type(
                                     MimeData(
                                         mime_type,
@@ -304,7 +573,7 @@ class SelectMimeType(SphinxPostTransform):
         # get priority list for this builder
         # TODO allow for per-notebook/cell priority dicts?
         bname = self.app.builder.name
-        priority_list = get_mime_priority(bname, self.config["nb_mime_priority_overrides"])
+        priority_index = get_mime_priority_index(bname, self.config["nb_mime_priority_overrides"])
 
         def condition(node):
             return (
@@ -314,22 +583,15 @@ class SelectMimeType(SphinxPostTransform):
 
         # remove/replace_self will not work with an iterator
         for node in list(findall(self.document)(condition)):
-            # get available mime types
-            mime_types = [node["mime_type"] for node in node.children]
-            if not mime_types:
+            # get available mime types (the first child of each type)
+            children = {child["mime_type"]: child for child in reversed(node.children)}
+            if not children:
                 node.parent.remove(node)
                 continue
             # select top priority
-            index = None
-            for mime_type in priority_list:
-                try:
-                    index = mime_types.index(mime_type)
-                except ValueError:
-                    continue
-                else:
-                    break
-            if index is None:
-                mime_string = ",".join(repr(m) for m in mime_types)
+            selected = select_mime_type(children, priority_index)
+            if selected is None:
+                mime_string = ",".join(repr(child["mime_type"]) for child in node.children)
                 SPHINX_LOGGER.warning(
                     f"No mime type available in priority list for builder {bname!r} "
                     f"({mime_string}) [{DEFAULT_LOG_TYPE}.mime_priority]",
@@ -338,10 +600,39 @@ class SelectMimeType(SphinxPostTransform):
                     location=node,
                 )
                 node.parent.remove(node)
-            elif not node.children[index].children:
+            elif not children[selected].children:
                 node.parent.remove(node)
             else:
-                node.replace_self(node.children[index].children)
+                node.replace_self(children[selected].children)
+
+
+class ProfilePostTransformsStart(SphinxPostTransform):
+    """Record the start of the post-transforms, for profiled documents."""
+
+    default_priority = 1
+
+    def run(self, **kwargs: Any) -> None:
+        if self.env.mystnb_config.profile_report:
+            self.document["nb_profile_start"] = (time.time(), time.perf_counter())
+
+
+class ProfilePostTransformsEnd(SphinxPostTransform):
+    """Record the time spent in the post-transforms, for profiled documents."""
+
+    default_priority = 999
+
+    def run(self, **kwargs: Any) -> None:
+        start = self.document.attributes.pop("nb_profile_start", None)
+        data = NbMetadataCollector.get_doc_data(self.env).get(self.env.docname, {})
+        if start is None or "profile" not in data:
+            return
+        _write_phase_spans(self.app.builder)[self.env.docname] = [
+            {
+                "name": "post_transforms",
+                "start": start[0],
+                "duration": time.perf_counter() - start[1],
+            }
+        ]
 
 
 class NbMetadataCollector(EnvironmentCollector):
@@ -383,7 +674,35 @@ class NbMetadataCollector(EnvironmentCollector):
     ) -> list[str]:
         # called before any docs are read
         env.nb_new_exec_data = False
-        return []
+        outdated = []
+        # Note, documents whose content is unchanged are removed from the `changed` set,
+        # which sphinx passes to this event by reference, then re-reads (with the documents
+        # returned here) in `Builder.read`; there is no public API for this.
+        # Verified against Sphinx 9.0 (see `test_execution_inputs_unchanged_content`),
+        # this should be re-checked when updating the supported Sphinx versions.
+        config_changed = env.config_status != CONFIG_OK
+        for docname, data in self.get_doc_data(env).items():
+            inputs = data.get("inputs")
+            if inputs is None or docname in added or docname in removed:
+                continue
+            hashes = inputs["hashes"] or {}
+            if _match_inputs(inputs["patterns"]) != inputs["matched"]:
+                # files matching the declared inputs have been added or removed
+                outdated.append(docname)
+            elif (
+                docname in changed
+                # all documents are re-read when the configuration has changed
+                and not config_changed
+                and docname not in env.reread_always
+                and Path(env.doctreedir, f"{docname}.doctree").is_file()
+                # all current dependencies must have been hashed
+                and _input_paths(env, docname).issubset(hashes)
+                and all(_file_digest(path) == digest for path, digest in hashes.items())
+            ):
+                # the source or a dependency has been modified (by mtime),
+                # but the document need not be re-read, since their content is unchanged
+                changed.discard(docname)
+        return outdated
 
     @staticmethod
     def note_exec_update(env: SphinxEnvType) -> None:
@@ -447,15 +766,6 @@ class NbMetadataCollector(EnvironmentCollector):
             env.nb_new_exec_data = True
 
 
-class BytesEncoder(json.JSONEncoder):
-    """A JSON encoder that accepts b64 (and other *ascii*) bytestrings."""
-
-    def default(self, obj):
-        if isinstance(obj, bytes):
-            return obj.decode("ascii")
-        return json.JSONEncoder.default(self, obj)
-
-
 class HideCodeCellNode(nodes.Element):
     """Node for hiding cell input."""
 
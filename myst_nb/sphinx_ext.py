@@ -18,18 +18,28 @@ from sphinx.util.fileutil import copy_asset_file
 from myst_nb import __version__, static
 from myst_nb.core.config import NbParserConfig
 from myst_nb.core.loggers import DEFAULT_LOG_TYPE
+from myst_nb.core.output_store import remove_output_manifest
 from myst_nb.core.read import UnexpectedCellDirective
+from myst_nb.core.render import WIDGET_STATE_FOLDER
 from myst_nb.ext.download import NbDownloadRole
 from myst_nb.ext.eval import load_eval_sphinx
 from myst_nb.ext.glue import load_glue_sphinx
-from myst_nb.ext.glue.crossref import ReplacePendingGlueReferences
+from myst_nb.ext.glue.crossref import ReplacePendingGlueReferences, index_glue_data
 from myst_nb.sphinx_ import (
     HideCodeCellNode,
     HideInputCells,
     NbMetadataCollector,
     Parser,
+    ProfilePostTransformsEnd,
+    ProfilePostTransformsStart,
     SelectMimeType,
     SphinxEnvType,
+    flush_outputs,
+    hash_inputs,
+    pre_execute_notebooks,
+    prune_profiles,
+    shutdown_kernels,
+    write_profile,
 )
 
 SPHINX_LOGGER = sphinx_logging.getLogger(__name__)
@@ -61,6 +71,7 @@ def sphinx_setup(app: Sphinx):
     # generate notebook configuration from Sphinx configuration
     # this also validates the configuration values
     app.connect("builder-inited", create_mystnb_config)
+    app.connect("builder-inited", add_lazy_output_loader)
 
     # add parser and default associated file suffixes
     app.add_source_parser(Parser)
@@ -72,6 +83,14 @@ def sphinx_setup(app: Sphinx):
     app.connect("config-inited", add_exclude_patterns)
     # add collector for myst nb specific data
     app.add_env_collector(NbMetadataCollector)
+    # hash the inputs of the notebooks read, once all their dependencies are noted
+    app.connect("env-updated", hash_inputs)
+    # execute outdated notebooks in parallel, before they are read
+    app.connect("env-before-read-docs", pre_execute_notebooks)
+    # write any pending output files, before they are used by the write phase
+    app.connect("env-updated", flush_outputs)
+    # shut down any pooled kernels, started to execute notebooks
+    app.connect("build-finished", shutdown_kernels)
 
     # TODO add an event which, if any files have been removed,
     # all jupyter-cache stage records with a non-existent path are removed
@@ -91,11 +110,18 @@ def sphinx_setup(app: Sphinx):
     # add post-transform for selecting mime type from a bundle
     app.add_post_transform(SelectMimeType)
     app.add_post_transform(ReplacePendingGlueReferences)
+    app.connect("env-updated", index_glue_data)
 
     # setup collapsible content
     app.add_post_transform(HideInputCells)
     HideCodeCellNode.add_to_app(app)
 
+    # record the time spent in post-transforms, and report all recorded times
+    app.add_post_transform(ProfilePostTransformsStart)
+    app.add_post_transform(ProfilePostTransformsEnd)
+    app.connect("env-updated", prune_profiles)
+    app.connect("build-finished", write_profile)
+
     # add HTML resources
     add_css(app)
     app.connect("build-finished", add_global_html_resources)
@@ -171,6 +197,17 @@ def create_mystnb_config(app):
         output_folder=str(output_folder), execution_cache_path=str(exec_cache_path)
     )
     SPHINX_LOGGER.info(f"Using jupyter-cache at: {exec_cache_path}")
+    target_builders = app.env.mystnb_config.target_builders
+    if target_builders and app.builder.name not in target_builders:
+        SPHINX_LOGGER.warning(
+            f"Builder {app.builder.name!r} is not in 'nb_target_builders' {list(target_builders)}, "
+            f"so notebook outputs may be missing [{DEFAULT_LOG_TYPE}.config]",
+            type=DEFAULT_LOG_TYPE,
+            subtype="config",
+        )
+    if not app.env.mystnb_config.output_store:
+        # files will be written without being tracked
+        remove_output_manifest(output_folder)
 
 
 def add_exclude_patterns(app: Sphinx, config):
@@ -201,6 +238,15 @@ def add_css(app: Sphinx):
     app.add_css_file(f"mystnb.{hash}.css")
 
 
+def add_lazy_output_loader(app: Sphinx):
+    """Add the JavaScript to load lazy outputs, if lazy rendering is enabled."""
+    if cast(SphinxEnvType, app.env).mystnb_config.render_lazy_output_size < 0:
+        return
+    with _import_resources_path(static, "mystnb_lazy_outputs.js") as source_path:
+        hash = _get_file_hash(source_path)
+    app.add_js_file(f"mystnb_lazy_outputs.{hash}.js")
+
+
 def add_global_html_resources(app: Sphinx, exception):
     """Add HTML resources that apply to all pages."""
     # see https://github.com/sphinx-doc/sphinx/issues/1379
@@ -209,6 +255,28 @@ def add_global_html_resources(app: Sphinx, exception):
             hash = _get_file_hash(source_path)
             destination = os.path.join(app.builder.outdir, "_static", f"mystnb.{hash}.css")
             copy_asset_file(str(source_path), destination)
+        if cast(SphinxEnvType, app.env).mystnb_config.render_lazy_output_size >= 0:
+            with _import_resources_path(static, "mystnb_lazy_outputs.js") as source_path:
+                hash = _get_file_hash(source_path)
+                destination = os.path.join(
+                    app.builder.outdir, "_static", f"mystnb_lazy_outputs.{hash}.js"
+                )
+                copy_asset_file(str(source_path), destination)
+        # copy the widget state files referenced by the documents,
+        # from the output folder to the static folder
+        env = cast(SphinxEnvType, app.env)
+        uris = {
+            uri
+            for data in NbMetadataCollector.get_doc_data(env).values()
+            for uri, _ in data.get("js_files", {}).values()
+            if uri is not None and uri.startswith(f"{WIDGET_STATE_FOLDER}/")
+        }
+        for uri in uris:
+            destination = Path(app.builder.outdir, "_static", *uri.split("/"))
+            if not destination.exists():
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                source = Path(env.mystnb_config.output_folder, *uri.split("/"))
+                copy_asset_file(str(source), str(destination))
 
 
 def add_per_page_html_resources(app: Sphinx, pagename: str, *args: Any, **kwargs: Any) -> None:
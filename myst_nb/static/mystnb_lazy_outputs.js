@@ -0,0 +1,58 @@
+// Load external outputs, when they are scrolled into view or clicked.
+document.addEventListener("DOMContentLoaded", function () {
+  // run scripts in order, since those inserted with innerHTML are not executed
+  function runScripts(scripts, index) {
+    if (index >= scripts.length) return;
+    var old = scripts[index];
+    var script = document.createElement("script");
+    Array.from(old.attributes).forEach(function (attr) {
+      script.setAttribute(attr.name, attr.value);
+    });
+    script.text = old.text;
+    if (old.src) {
+      script.onload = script.onerror = function () { runScripts(scripts, index + 1); };
+      old.replaceWith(script);
+    } else {
+      old.replaceWith(script);
+      runScripts(scripts, index + 1);
+    }
+  }
+  function load(element) {
+    if (element.dataset.mystnbLoaded) return;
+    element.dataset.mystnbLoaded = "true";
+    var url = element.querySelector("a").getAttribute("href");
+    if (element.classList.contains("mystnb-lazy-javascript")) {
+      var script = document.createElement("script");
+      script.src = url;
+      element.replaceChildren(script);
+      return;
+    }
+    fetch(url).then(function (response) {
+      if (!response.ok) throw new Error(response.statusText);
+      return response.text();
+    }).then(function (html) {
+      element.innerHTML = html;
+      runScripts(Array.from(element.querySelectorAll("script")), 0);
+    }).catch(function () {
+      delete element.dataset.mystnbLoaded;
+    });
+  }
+  var elements = document.querySelectorAll(".mystnb-lazy-output");
+  elements.forEach(function (element) {
+    element.addEventListener("click", function (event) {
+      event.preventDefault();
+      load(element);
+    });
+  });
+  if ("IntersectionObserver" in window) {
+    var observer = new IntersectionObserver(function (entries) {
+      entries.forEach(function (entry) {
+        if (entry.isIntersecting) {
+          observer.unobserve(entry.target);
+          load(entry.target);
+        }
+      });
+    }, { rootMargin: "200px" });
+    elements.forEach(function (element) { observer.observe(element); });
+  }
+});
@@ -1,3 +1,4 @@
+import pygments.lexer
 from pygments.token import Text, Token
 import pytest
 
@@ -103,3 +104,31 @@ def test_ignores_completely_invalid_escapes():
         (Text, "plain "),
         (Text, "%text\n"),
     )
+
+
+@pytest.mark.parametrize(
+    "text",
+    (
+        "plain text\n",
+        "\x1b[1;31mbold red\x1b[0m then \x1b[38;5;100m256 colors\x1b[m\n",
+        "junk \x1b[%text \x1b lone escape \x1b[0;59;\"A\"p\n",
+    ),
+)
+def test_scanner_matches_rules(text):
+    """The compiled scanner should produce the same tokens as the lexer rules."""
+    lexer = lexers.AnsiColorLexer()
+    expected = list(pygments.lexer.RegexLexer.get_tokens_unprocessed(lexers.AnsiColorLexer(), text))
+    assert list(lexer.get_tokens_unprocessed(text)) == expected
+
+
+def test_scanner_stack():
+    """An initial stack other than the root state should use the generic state machine."""
+    with pytest.raises(KeyError):
+        list(lexers.AnsiColorLexer().get_tokens_unprocessed("text\n", ("other",)))
+
+
+def test_state_reset_between_texts():
+    """The color state should not leak from one text to the next."""
+    lexer = lexers.AnsiColorLexer()
+    assert list(lexer.get_tokens("\x1b[31mred\n"))[0] == (Token.Color.Red, "red\n")
+    assert list(lexer.get_tokens("plain\n")) == [(Text, "plain\n")]
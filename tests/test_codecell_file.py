@@ -1,4 +1,6 @@
 """Test notebooks containing code cells with the `load` option."""
+from pathlib import Path
+
 import pytest
 from sphinx.util.fileutil import copy_asset_file
 
@@ -22,7 +24,12 @@ def test_codecell_file(sphinx_run, file_regression, check_nbs, get_test_path):
     }
     assert set(sphinx_run.env.nb_metadata["mystnb_codecell_file"].keys()) == {
         "exec_data",
+        "inputs",
     }
+    # the loaded file is recorded as an input
+    assert str(Path(sphinx_run.app.srcdir, "mystnb_codecell_file.py")) in (
+        sphinx_run.env.nb_metadata["mystnb_codecell_file"]["inputs"]["hashes"]
+    )
     assert sphinx_run.env.metadata["mystnb_codecell_file"]["author"] == "Matt"
     assert sphinx_run.env.metadata["mystnb_codecell_file"]["kernelspec"] == {
         "display_name": "Python 3",
@@ -65,6 +72,7 @@ def test_codecell_file_warnings(sphinx_run, file_regression, check_nbs, get_test
     }
     assert set(sphinx_run.env.nb_metadata["mystnb_codecell_file_warnings"].keys()) == {
         "exec_data",
+        "inputs",
     }
     assert sphinx_run.env.metadata["mystnb_codecell_file_warnings"]["author"] == "Aakash"
     assert sphinx_run.env.metadata["mystnb_codecell_file_warnings"]["kernelspec"] == {
@@ -1,6 +1,7 @@
 """Run parsing tests against the docutils parser."""
 from io import StringIO
 import json
+import os
 from pathlib import Path
 
 from docutils.core import publish_doctree, publish_string
@@ -8,6 +9,7 @@ import pytest
 import sphinx
 import yaml
 
+from myst_nb.core.execute import kernels
 from myst_nb.docutils_ import Parser
 
 FIXTURE_PATH = Path(__file__).parent.joinpath("nb_fixtures")
@@ -81,3 +83,34 @@ def test_html_resources(tmp_path):
     assert "pygments.css" in result
     assert tmp_path.joinpath("mystnb.css").is_file()
     assert tmp_path.joinpath("pygments.css").is_file()
+
+
+def test_kernel_pool_disabled(tmp_path, monkeypatch):
+    """Kernels should not be started in advance, since only one notebook is executed."""
+    started = []
+    start = kernels.KernelPool._start
+    monkeypatch.setattr(
+        kernels.KernelPool, "_start", staticmethod(lambda name: started.append(name) or start(name))
+    )
+    notebook = {
+        "cells": [{"cell_type": "code", "metadata": {}, "source": "print(1)", "outputs": []}],
+        "metadata": {"kernelspec": {"name": "python3", "display_name": "Python 3"}},
+        "nbformat": 4,
+        "nbformat_minor": 4,
+    }
+    report_stream = StringIO()
+    doctree = publish_doctree(
+        json.dumps(notebook),
+        parser=Parser(),
+        settings_overrides={
+            "nb_execution_mode": "force",
+            "nb_execution_kernel_pool": 2,
+            "nb_execution_in_temp": True,
+            "nb_output_folder": str(tmp_path),
+            "warning_stream": report_stream,
+        },
+    )
+    assert report_stream.getvalue().rstrip() == ""
+    assert "1" in doctree.astext()
+    assert started == []
+    assert os.getpid() not in kernels._POOLS
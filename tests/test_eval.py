@@ -1,6 +1,17 @@
 """Test the `eval` directives and roles."""
+from docutils import nodes
+from docutils.utils import new_document
+from myst_parser.config.main import MdParserConfig
+from myst_parser.parsers.mdit import create_md_parser
+import nbformat
 import pytest
 
+from myst_nb._compat import findall
+from myst_nb.core.loggers import DocutilsDocLogger
+from myst_nb.core.nb_to_tokens import notebook_to_tokens
+from myst_nb.docutils_ import DocutilsNbRenderer
+from myst_nb.ext.eval import collect_eval_expressions
+
 
 @pytest.mark.sphinx_params("with_eval.md", conf={"nb_execution_mode": "inline"})
 def test_sphinx(sphinx_run, clean_doctree, file_regression):
@@ -14,3 +25,40 @@ def test_sphinx(sphinx_run, clean_doctree, file_regression):
         doctree.pformat(),
         encoding="utf-8",
     )
+
+
+@pytest.mark.sphinx_params(
+    "with_eval.md", conf={"nb_execution_mode": "inline", "nb_eval_batch": True}
+)
+def test_sphinx_batch(sphinx_run, clean_doctree):
+    """Test a sphinx build, evaluating the expressions after each cell in a batch."""
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    doctree = clean_doctree(sphinx_run.get_resolved_doctree("with_eval"))
+    outputs = [
+        node.astext()
+        for node in findall(doctree)(nodes.Element)
+        if "output" in node.get("classes", [])
+    ]
+    assert outputs == ["1", "1"]
+    assert len(list(findall(doctree)(nodes.image))) == 1
+
+
+def test_collect_eval_expressions():
+    """Only the expressions of parsed eval roles and directives should be collected,
+    not examples in code, which are never evaluated.
+    """
+    notebook = nbformat.v4.new_notebook(
+        cells=[
+            nbformat.v4.new_markdown_cell("{eval}`a` and `{eval}`not_inline``"),
+            nbformat.v4.new_code_cell("a = 1"),
+            nbformat.v4.new_markdown_cell(
+                "```{eval} b\n```\n\n```md\n{eval}`not_fenced`\n```\n\n"
+                "    {eval}`not_indented`\n\n```{eval:figure} c\n```"
+            ),
+        ]
+    )
+    mdit_parser = create_md_parser(MdParserConfig(), DocutilsNbRenderer)
+    logger = DocutilsDocLogger(new_document("<test>"))
+    tokens = notebook_to_tokens(notebook, mdit_parser, {}, logger)
+    assert collect_eval_expressions(tokens) == {0: ["a"], 2: ["b", "c"]}
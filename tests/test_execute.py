@@ -1,12 +1,22 @@
 """Test sphinx builds which execute notebooks."""
+import json
 import os
 from pathlib import Path
+import sqlite3
+import time
 
 from IPython import version_info as ipy_version
+import nbformat
 import pytest
 
+from myst_nb.core.config import NbParserConfig
 from myst_nb.core.execute import ExecutionError
-from myst_nb.sphinx_ import NbMetadataCollector
+from myst_nb.core.execute import kernels
+from myst_nb.core.execute.cell_cache import CELL_CACHE_NAME, CellOutputCache
+from myst_nb.core.execute.pool import JobQueue, PreExecutionJob, queue_notebooks
+from myst_nb.core.execute.snapshots import SOURCE_FILE_NAME, prune_snapshots, snapshot_path
+from myst_nb.core.loggers import SphinxDocLogger
+from myst_nb.sphinx_ import NbMetadataCollector, prune_profiles
 
 
 def regress_nb_doc(file_regression, sphinx_run, check_nbs):
@@ -92,6 +102,61 @@ def test_rebuild_cache(sphinx_run):
     assert "Using cached" in sphinx_run.status()
 
 
+@pytest.mark.sphinx_params(
+    "with_eval.md",
+    "basic_unrun.ipynb",
+    conf={"nb_execution_mode": "inline", "nb_execution_cell_cache": True},
+)
+def test_rebuild_cell_cache(sphinx_run):
+    """Cell outputs should be retrieved from the cache,
+    with cells only replayed when the kernel state is required.
+    """
+    sphinx_run.build()
+    assert "Used cached outputs" not in sphinx_run.status()
+    sphinx_run.invalidate_files()
+    sphinx_run.build()
+    assert "Used cached outputs for 1 code cell(s)" in sphinx_run.status()
+    assert "Replaying 1 cached code cell(s)" in sphinx_run.status()
+    assert "Executing notebook failed" not in sphinx_run.warnings()
+    assert '"execution_count": 1' in sphinx_run.get_nb(1)
+    data = NbMetadataCollector.get_exec_data(sphinx_run.env, "basic_unrun")
+    assert data
+    assert data["succeeded"] is True
+
+
+def test_cell_cache_eviction(tmp_path):
+    """The least recently used cells should be evicted from the cell cache."""
+    cache = CellOutputCache(tmp_path)
+    for key in ("a", "b", "c"):
+        cache.set_cell(key, 1, [])
+        time.sleep(0.01)
+    assert cache.get_cell("a") == (1, [])
+    cache.close()
+    cache = CellOutputCache(tmp_path, max_size=2)
+    assert cache.get_cell("a") is not None
+    assert cache.get_cell("b") is None
+    assert cache.get_cell("c") is not None
+    cache.close()
+
+
+def test_cell_cache_locked(tmp_path):
+    """Writes to a locked cell cache should be skipped, rather than raising an error."""
+    cache = CellOutputCache(tmp_path)
+    cache._connection.execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(str(tmp_path / CELL_CACHE_NAME))
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        assert cache.set_cell("a", 1, []) is False
+        assert cache.set_language_info("python3", {"name": "python"}) is False
+        assert cache.get_cell("a") is None
+    finally:
+        other.rollback()
+        other.close()
+    assert cache.set_cell("a", 1, []) is True
+    assert cache.get_cell("a") == (1, [])
+    cache.close()
+
+
 @pytest.mark.sphinx_params("basic_unrun.ipynb", conf={"nb_execution_mode": "force"})
 def test_rebuild_force(sphinx_run):
     """The notebook should be executed twice."""
@@ -102,6 +167,131 @@ def test_rebuild_force(sphinx_run):
     assert NbMetadataCollector.new_exec_data(sphinx_run.env)
 
 
+@pytest.mark.sphinx_params(
+    "basic_unrun.ipynb",
+    "basic_failing.ipynb",
+    conf={"nb_execution_mode": "cache", "nb_execution_workers": 2},
+)
+def test_pre_execution_workers(sphinx_run):
+    """Notebooks should be executed before reading, then retrieved from the cache."""
+    sphinx_run.build()
+    assert "Pre-executed notebook" in sphinx_run.status()
+    assert "Using cached notebook" in sphinx_run.status()
+    # failed executions should not be re-executed, but still reported
+    assert "Using failed execution from before parsing" in sphinx_run.status()
+    assert "Executing notebook failed" in sphinx_run.warnings()
+    assert '"execution_count": 1' in sphinx_run.get_nb()
+
+    data = NbMetadataCollector.get_exec_data(sphinx_run.env, "basic_unrun")
+    assert data
+    assert data["method"] == "cache"
+    assert data["succeeded"] is True
+    data = NbMetadataCollector.get_exec_data(sphinx_run.env, "basic_failing")
+    assert data
+    assert data["succeeded"] is False
+
+
+@pytest.mark.sphinx_params(
+    "basic_unrun.ipynb",
+    "basic_failing.ipynb",
+    conf={"nb_execution_mode": "queue", "nb_execution_workers": 1},
+)
+def test_queue_workers(sphinx_run):
+    """Notebooks should be executed through the job queue, then retrieved from the cache."""
+    sphinx_run.build()
+    assert "through the job queue" in sphinx_run.status()
+    assert "Pre-executed notebook" in sphinx_run.status()
+    assert "Using cached notebook" in sphinx_run.status()
+    assert "Using failed execution from before parsing" in sphinx_run.status()
+    assert "Executing notebook failed" in sphinx_run.warnings()
+    assert "Timed out" not in sphinx_run.warnings()
+    assert '"execution_count": 1' in sphinx_run.get_nb()
+
+    data = NbMetadataCollector.get_exec_data(sphinx_run.env, "basic_unrun")
+    assert data
+    assert data["method"] == "queue"
+    assert data["succeeded"] is True
+    data = NbMetadataCollector.get_exec_data(sphinx_run.env, "basic_failing")
+    assert data
+    assert data["succeeded"] is False
+
+
+def test_job_queue(tmp_path):
+    """Jobs should be claimed once, in order, and their results collected."""
+    queue = JobQueue(tmp_path)
+    notebook = nbformat.v4.new_notebook()
+    first = queue.submit(notebook, str(tmp_path), NbParserConfig())
+    second = queue.submit(notebook, str(tmp_path), NbParserConfig(execution_timeout=10))
+    claimed = queue.claim()
+    assert claimed is not None
+    assert claimed[0] == first
+    queue.complete(first, RuntimeError("failed"))
+    claimed = queue.claim()
+    assert claimed is not None
+    assert claimed[0] == second
+    assert claimed[1][2].execution_timeout == 10
+    assert queue.claim() is None
+    results = dict(queue.results([first, second], timeout=0))
+    assert set(results) == {first}
+    assert isinstance(results[first], RuntimeError)
+    queue.cancel(second)
+    assert not any(tmp_path.joinpath("running").iterdir())
+    # a worker that completes a cancelled job does not leave a result
+    queue.complete(second, RuntimeError("late"))
+    assert not any(tmp_path.joinpath("results").iterdir())
+    # stale files are removed when the queue is opened
+    orphan = tmp_path.joinpath("results", "orphan.pickle")
+    orphan.write_bytes(b"")
+    os.utime(orphan, (0, 0))
+    JobQueue(tmp_path)
+    assert not orphan.exists()
+
+
+def test_queue_timeout(tmp_path):
+    """On timeout, the local workers should be stopped, and no results left behind."""
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells.append(nbformat.v4.new_code_cell("import time; time.sleep(30)"))
+    notebook.metadata["kernelspec"] = {"name": "python3", "display_name": "Python 3"}
+    job = PreExecutionJob(
+        tmp_path / "sleep.ipynb",
+        notebook,
+        NbParserConfig(execution_cache_path=str(tmp_path / "cache")),
+        SphinxDocLogger("sleep"),
+    )
+    tmp_path.joinpath("sleep.ipynb").write_text(nbformat.writes(notebook), "utf8")
+    start = time.monotonic()
+    queue_notebooks([job], tmp_path / "queue", workers=1, timeout=2)
+    assert time.monotonic() - start < 20
+    for name in ("pending", "running", "results"):
+        assert not any(tmp_path.joinpath("queue", name).iterdir())
+
+
+@pytest.mark.sphinx_params(
+    "with_eval.md",
+    "basic_unrun.ipynb",
+    "basic_run.ipynb",
+    conf={
+        "nb_execution_mode": "inline",
+        "nb_execution_kernel_pool": 1,
+        "nb_execution_kernel_reuse": True,
+    },
+)
+def test_kernel_pool(sphinx_run):
+    """Notebooks should be executed with a re-used kernel, reset between notebooks."""
+    sphinx_run.build()
+    assert "Executing notebook failed" not in sphinx_run.warnings()
+    for docname in ("with_eval", "basic_unrun", "basic_run"):
+        data = NbMetadataCollector.get_exec_data(sphinx_run.env, docname)
+        assert data
+        assert data["method"] == "inline"
+        assert data["succeeded"] is True
+    # each notebook should start from a fresh execution count
+    for index in range(3):
+        assert '"execution_count": 1' in sphinx_run.get_nb(index)
+    # the pooled kernels should be shut down at the end of the build
+    assert os.getpid() not in kernels._POOLS
+
+
 @pytest.mark.sphinx_params(
     "basic_unrun.ipynb",
     conf={
@@ -216,9 +406,7 @@ def test_complex_outputs_unrun_cache(sphinx_run, file_regression, check_nbs):
     assert any(
         "application/vnd.jupyter.widget-view+json" in script.get("type", "") for script in scripts
     )
-    assert any(
-        "application/vnd.jupyter.widget-state+json" in script.get("type", "") for script in scripts
-    )
+    assert any("_static/mystnb_widgets/" in script.get("src", "") for script in scripts)
 
 
 @pytest.mark.sphinx_params("complex_outputs_unrun.ipynb", conf={"nb_execution_mode": "auto"})
@@ -233,9 +421,7 @@ def test_complex_outputs_unrun_auto(sphinx_run, file_regression, check_nbs):
     assert any(
         "application/vnd.jupyter.widget-view+json" in script.get("type", "") for script in scripts
     )
-    assert any(
-        "application/vnd.jupyter.widget-state+json" in script.get("type", "") for script in scripts
-    )
+    assert any("_static/mystnb_widgets/" in script.get("src", "") for script in scripts)
 
 
 @pytest.mark.sphinx_params("basic_unrun.ipynb", conf={"nb_execution_mode": "off"})
@@ -315,6 +501,23 @@ def test_nb_exec_table(sphinx_run, file_regression):
     assert any("nb_exec_table" in row.text for row in rows)
 
 
+@pytest.mark.sphinx_params("nb_exec_table_cells.md", conf={"nb_execution_mode": "force"})
+def test_nb_exec_table_slowest_cells(sphinx_run):
+    """Test that the table lists the slowest cells, in order."""
+    sphinx_run.build()
+    assert not sphinx_run.warnings()
+    data = NbMetadataCollector.get_exec_data(sphinx_run.env, "nb_exec_table_cells")
+    assert data
+    assert set(data["cell_runtimes"]) == {1, 2, 3}
+    assert data["cell_runtimes"][2] >= 0.2
+    # the timing metadata is not kept in the output notebook
+    notebook = json.loads(sphinx_run.get_nb())
+    assert not any("execution" in cell["metadata"] for cell in notebook["cells"])
+    rows = sphinx_run.get_html().select("table.docutils tbody tr")
+    assert len(rows) == 2
+    assert [cell.text.strip() for cell in rows[0].select("td")][:2] == ["nb_exec_table_cells", "2"]
+
+
 @pytest.mark.sphinx_params(
     "custom-formats.Rmd",
     conf={
@@ -353,3 +556,171 @@ def test_custom_convert_cache(sphinx_run, file_regression, check_nbs):
     assert data
     assert data["method"] == "cache"
     assert data["succeeded"] is True
+
+
+@pytest.mark.sphinx_params(
+    "basic_unrun.ipynb",
+    conf={"nb_execution_mode": "force", "nb_profile_report": ["json", "csv", "trace"]},
+)
+def test_profile_report(sphinx_run):
+    """The time spent in each phase should be recorded and reported."""
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    spans = NbMetadataCollector.get_doc_data(sphinx_run.env)["basic_unrun"]["profile"]
+    names = {span["name"] for span in spans}
+    assert {"read", "tokens", "execute", "cell", "render", "write"} <= names
+    # write-phase timings are not stored in the environment
+    assert "post_transforms" not in names
+    assert all(span["duration"] >= 0 for span in spans)
+    assert [span["args"]["cell_index"] for span in spans if span["name"] == "cell"] == [1]
+
+    reports = Path(sphinx_run.app.outdir, "reports")
+    report = json.loads(reports.joinpath("mystnb_profile.json").read_text("utf8"))
+    assert set(report) == {"basic_unrun"}
+    assert {"execute", "post_transforms"} <= set(report["basic_unrun"]["totals"])
+    assert reports.joinpath("mystnb_profile.csv").read_text("utf8").startswith(
+        "docname,name,start,duration,cell_index"
+    )
+    trace = json.loads(reports.joinpath("mystnb_profile.trace.json").read_text("utf8"))
+    assert {event["ph"] for event in trace["traceEvents"]} == {"M", "X"}
+
+    # profiles of documents removed from the project are pruned
+    sphinx_run.env.found_docs.discard("basic_unrun")
+    prune_profiles(sphinx_run.app, sphinx_run.env)
+    assert "profile" not in NbMetadataCollector.get_doc_data(sphinx_run.env)["basic_unrun"]
+
+
+@pytest.mark.sphinx_params(
+    "basic_unrun.ipynb", conf={"nb_execution_mode": "force", "nb_execution_inputs": ["*.csv"]}
+)
+def test_execution_inputs(sphinx_run):
+    """Notebooks should only be re-read when the content of their inputs changes."""
+    srcdir = Path(sphinx_run.app.srcdir)
+    srcdir.joinpath("data.csv").write_text("a,b\n1,2\n", "utf8")
+
+    def build_and_get_mtime():
+        sphinx_run.build()
+        assert sphinx_run.warnings() == ""
+        return NbMetadataCollector.get_exec_data(sphinx_run.env, "basic_unrun")["mtime"]
+
+    def touch(path):
+        later = path.stat().st_mtime_ns + 10**10
+        os.utime(path, ns=(later, later))
+
+    mtime = build_and_get_mtime()
+    assert str(srcdir / "data.csv") in sphinx_run.env.nb_metadata["basic_unrun"]["inputs"]["hashes"]
+    # modification times alone do not trigger a re-read
+    touch(srcdir / "basic_unrun.ipynb")
+    touch(srcdir / "data.csv")
+    assert build_and_get_mtime() == mtime
+    # changed content does
+    srcdir.joinpath("data.csv").write_text("a,b\n1,3\n", "utf8")
+    touch(srcdir / "data.csv")
+    new_mtime = build_and_get_mtime()
+    assert new_mtime != mtime
+    # as do added inputs
+    srcdir.joinpath("other.csv").write_text("c\n", "utf8")
+    assert build_and_get_mtime() != new_mtime
+
+
+@pytest.mark.sphinx_params("with_image_dependency.md", conf={"nb_execution_mode": "off"})
+def test_execution_inputs_image(sphinx_run):
+    """Notebooks should be re-read when the content of an image they include changes."""
+    srcdir = Path(sphinx_run.app.srcdir)
+    svg = '<svg xmlns="http://www.w3.org/2000/svg"><text>{}</text></svg>'
+    srcdir.joinpath("fig.svg").write_text(svg.format("old"), "utf8")
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    assert str(srcdir / "fig.svg") in (
+        sphinx_run.env.nb_metadata["with_image_dependency"]["inputs"]["hashes"]
+    )
+    srcdir.joinpath("fig.svg").write_text(svg.format("new"), "utf8")
+    later = srcdir.joinpath("fig.svg").stat().st_mtime_ns + 10**10
+    os.utime(srcdir / "fig.svg", ns=(later, later))
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    assert "new" in Path(sphinx_run.app.outdir, "_images", "fig.svg").read_text("utf8")
+
+
+@pytest.mark.sphinx_params("basic_unrun.ipynb", conf={"nb_execution_mode": "off"})
+def test_execution_inputs_unchanged_content(sphinx_run):
+    """Documents whose modification time changes, but not their content,
+    should be removed from the outdated documents, and so not be re-read.
+    """
+    read = []
+    sphinx_run.app.connect("source-read", lambda app, docname, source: read.append(docname))
+    source = Path(sphinx_run.app.srcdir, "basic_unrun.ipynb")
+
+    def touch_and_build():
+        later = source.stat().st_mtime_ns + 10**10
+        os.utime(source, ns=(later, later))
+        read.clear()
+        sphinx_run.build()
+        assert sphinx_run.warnings() == ""
+
+    sphinx_run.build()
+    assert read == ["basic_unrun"]
+    touch_and_build()
+    assert read == []
+    notebook = json.loads(source.read_text("utf8"))
+    notebook["cells"][0]["source"] = "# changed"
+    source.write_text(json.dumps(notebook), "utf8")
+    touch_and_build()
+    assert read == ["basic_unrun"]
+
+
+@pytest.mark.sphinx_params(
+    "with_checkpoint.md",
+    conf={
+        "nb_execution_mode": "inline",
+        "nb_execution_cell_cache": True,
+        "nb_execution_snapshots": True,
+    },
+)
+def test_rebuild_snapshot(sphinx_run):
+    """The kernel state should be restored from the checkpoint,
+    rather than replaying the cells before it.
+    """
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    srcdir = Path(sphinx_run.app.srcdir)
+    assert srcdir.joinpath("setup_runs.txt").read_text("utf8") == "x"
+    assert list(srcdir.rglob("mystnb_snapshots/*/*.pickle"))
+
+    source = srcdir.joinpath("with_checkpoint.md")
+    source.write_text(
+        source.read_text("utf8").replace("math.fsum(data)", "math.fsum(data) * 2"), "utf8"
+    )
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    assert "Restored kernel state from snapshot, after cell 1" in sphinx_run.status()
+    assert srcdir.joinpath("setup_runs.txt").read_text("utf8") == "x"
+    notebook = json.loads(sphinx_run.get_nb())
+    assert notebook["cells"][2]["execution_count"] == 2
+    assert notebook["cells"][2]["outputs"][0]["text"] == ["12.0\n"]
+
+    # the snapshot of the previous version of the checkpoint cell is pruned
+    snapshots = list(srcdir.rglob("mystnb_snapshots/*/*.pickle"))
+    source.write_text(source.read_text("utf8").replace("[1, 2, 3]", "[1, 2, 3, 4]"), "utf8")
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    assert srcdir.joinpath("setup_runs.txt").read_text("utf8") == "xx"
+    new_snapshots = list(srcdir.rglob("mystnb_snapshots/*/*.pickle"))
+    assert len(new_snapshots) == 1 and new_snapshots != snapshots
+
+
+def test_prune_snapshots(tmp_path):
+    """Stale snapshots, and those of removed notebooks, should be pruned."""
+    kept, removed = tmp_path / "kept.md", tmp_path / "removed.md"
+    kept.touch()
+    paths = [
+        snapshot_path(tmp_path, kept, "current"),
+        snapshot_path(tmp_path, kept, "stale"),
+        snapshot_path(tmp_path, removed, "current"),
+    ]
+    for path, source in zip(paths, (kept, kept, removed)):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.parent.joinpath(SOURCE_FILE_NAME).write_text(str(source), "utf8")
+        path.touch()
+    prune_snapshots(tmp_path, kept, ["current"])
+    assert [path.exists() for path in paths] == [True, False, False]
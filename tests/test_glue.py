@@ -1,10 +1,15 @@
 """Test the `glue` directives and roles."""
+import json
+from pathlib import Path
+
 from IPython.core.displaypub import DisplayPublisher
 from IPython.core.interactiveshell import InteractiveShell
 import nbformat
 import pytest
 
 from myst_nb.ext.glue import extract_glue_data, glue
+from myst_nb.ext.glue.index import get_glue_index
+from myst_nb.ext.glue.store import GlueStore
 
 
 class MockDisplayPublisher(DisplayPublisher):
@@ -93,6 +98,42 @@ def test_extract_glue_data(get_test_path):
     }
 
 
+def test_glue_store(get_test_path):
+    path = get_test_path("with_glue.ipynb")
+    with open(path) as handle:
+        notebook = nbformat.read(handle, as_version=4)
+    data = extract_glue_data(notebook, [], None)
+    assert isinstance(data, GlueStore)
+    assert data["key_float"]["data"]["text/plain"] == "3.14159"
+    assert "image/png" in data["key_plt"]["data"]
+    data["key_float"] = nbformat.from_dict({"data": {"text/plain": "1.0"}, "metadata": {}})
+    assert data["key_float"]["data"]["text/plain"] == "1.0"
+    content = json.loads(b"".join(data.iter_json()))
+    assert list(content) == list(data)
+    assert content["key_plt"] == data["key_plt"]
+    data.close()
+    assert len(data) == 0
+
+
+@pytest.mark.sphinx_params(
+    "with_glue.ipynb", conf={"nb_execution_mode": "off", "nb_output_store": True}
+)
+def test_glue_json_output_store(sphinx_run):
+    """The glue data should be streamed to the output folder, and not re-written if unchanged."""
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    path = Path(sphinx_run.app.srcdir, "_build", "jupyter_execute", "with_glue.glue.json")
+    assert list(json.loads(path.read_text("utf8"))) == sphinx_run.env.nb_metadata["with_glue"][
+        "glue"
+    ]
+    mtime = path.stat().st_mtime_ns
+    sphinx_run.invalidate_files()
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    assert path.stat().st_mtime_ns == mtime
+    assert not list(path.parent.glob(".*.tmp"))
+
+
 @pytest.mark.sphinx_params("with_glue.ipynb", conf={"nb_execution_mode": "off"})
 def test_parser(sphinx_run, clean_doctree, file_regression):
     """Test a sphinx build."""
@@ -114,3 +155,21 @@ def test_parser(sphinx_run, clean_doctree, file_regression):
         doctree.pformat(),
         encoding="utf-8",
     )
+
+
+@pytest.mark.sphinx_params(
+    "with_glue.ipynb", "glue_crossref.md", conf={"nb_execution_mode": "off"}
+)
+def test_crossref(sphinx_run):
+    """Test glue references to other documents are resolved from the glue index."""
+    sphinx_run.build()
+    assert "Glue reference 'missing' not found in doc 'with_glue'" in sphinx_run.warnings()
+    text = sphinx_run.get_resolved_doctree("glue_crossref").astext()
+    assert "'text1'" in text
+    assert "3.14" in text
+    index = get_glue_index(sphinx_run.env.mystnb_config.output_folder)
+    assert index.get("with_glue", "key_float")["data"]["text/plain"] == "3.14159"
+    assert index.get("with_glue", "missing") is None
+    assert index.update(["with_glue"]) == []
+    assert index.update([]) == []
+    assert index.get("with_glue", "key_float") is None
@@ -1,6 +1,9 @@
 """Test parsing of already executed notebooks."""
 import os
 from pathlib import Path
+import sqlite3
+from types import SimpleNamespace
+import time
 
 import pytest
 
@@ -16,7 +19,7 @@ def test_basic_run(sphinx_run, file_regression):
         "kernelspec",
         "language_info",
     }
-    assert set(sphinx_run.env.nb_metadata["basic_run"].keys()) == set()
+    assert set(sphinx_run.env.nb_metadata["basic_run"].keys()) == {"inputs"}
     assert sphinx_run.env.metadata["basic_run"]["test_name"] == "notebook1"
     assert sphinx_run.env.metadata["basic_run"]["kernelspec"] == {
         "display_name": "Python 3",
@@ -32,6 +35,98 @@ def test_basic_run(sphinx_run, file_regression):
     assert filenames == {"basic_run.ipynb"}
 
 
+@pytest.mark.sphinx_params(
+    "complex_outputs.ipynb",
+    conf={"nb_execution_mode": "off", "nb_markdown_cache_size": 100},
+)
+def test_markdown_cache(sphinx_run):
+    """Re-reading with cached Markdown tokens should produce the same doctree."""
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    doctree = sphinx_run.get_doctree().pformat()
+    assert Path(sphinx_run.app.doctreedir, "mystnb_tokens.db").is_file()
+    sphinx_run.invalidate_files()
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    assert sphinx_run.get_doctree().pformat() == doctree
+
+
+@pytest.mark.sphinx_params(
+    "complex_outputs.ipynb",
+    conf={"nb_execution_mode": "off", "nb_output_store": True},
+)
+def test_output_store(sphinx_run):
+    """Re-reading should not re-write output files with unchanged content."""
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    output_folder = Path(sphinx_run.app.srcdir, "_build", "jupyter_execute")
+    assert output_folder.joinpath("mystnb_outputs.db").is_file()
+    outputs = sorted(output_folder.glob("*.ipynb")) + sorted(output_folder.glob("*.png"))
+    assert outputs
+    mtimes = {path: path.stat().st_mtime_ns for path in outputs}
+    sphinx_run.invalidate_files()
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    assert {path: path.stat().st_mtime_ns for path in outputs} == mtimes
+
+
+@pytest.mark.sphinx_params(
+    "complex_outputs.ipynb",
+    conf={"nb_execution_mode": "off", "nb_output_store": True},
+)
+def test_output_store_images(sphinx_run, monkeypatch):
+    """Output files should be written before sphinx collects the images of the document."""
+    from myst_nb.core import output_store
+
+    write_bytes = output_store._write_bytes
+
+    def _slow_write_bytes(path, content):
+        time.sleep(0.2)
+        write_bytes(path, content)
+
+    monkeypatch.setattr(output_store, "_write_bytes", _slow_write_bytes)
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    images = {path.suffix for path in Path(sphinx_run.app.outdir, "_images").iterdir()}
+    assert ".png" in images
+
+
+def test_output_store_write_file(tmp_path):
+    """Files known to the output store should still honour the overwrite/exists_ok checks."""
+    from myst_nb.core.config import NbParserConfig
+    from myst_nb.core.output_store import _STORES, OUTPUT_MANIFEST_NAME, get_output_store
+    from myst_nb.core.render import NbElementRenderer
+
+    config = NbParserConfig(output_folder=str(tmp_path), output_store=True)
+    renderer = NbElementRenderer(SimpleNamespace(nb_config=config, sphinx_env=None), None)
+    try:
+        renderer.write_file(["a.txt"], b"a")
+        with pytest.raises(FileExistsError):
+            renderer.write_file(["a.txt"], b"a")
+        renderer.write_file(["a.txt"], b"b", exists_ok=True)
+        renderer.write_file(["b.txt"], iter([b"b", b"c"]))
+        with pytest.raises(FileExistsError):
+            renderer.write_file(["b.txt"], iter([b"b"]))
+        get_output_store(tmp_path).flush()
+        assert tmp_path.joinpath("a.txt").read_bytes() == b"a"
+        assert tmp_path.joinpath("b.txt").read_bytes() == b"bc"
+
+        # a failure to record the written files in the manifest is raised
+        store = get_output_store(tmp_path)
+        store._connection.execute("PRAGMA busy_timeout = 0")
+        renderer.write_file(["a.txt"], b"c", overwrite=True)
+        other = sqlite3.connect(str(tmp_path / OUTPUT_MANIFEST_NAME))
+        other.execute("BEGIN EXCLUSIVE")
+        try:
+            with pytest.raises(OSError, match="output manifest"):
+                store.flush()
+        finally:
+            other.rollback()
+            other.close()
+    finally:
+        _STORES.pop((os.getpid(), str(tmp_path)), None)
+
+
 @pytest.mark.sphinx_params("complex_outputs.ipynb", conf={"nb_execution_mode": "off"})
 def test_complex_outputs(sphinx_run, file_regression):
     sphinx_run.build()
@@ -50,7 +145,7 @@ def test_complex_outputs(sphinx_run, file_regression):
         "kernelspec",
         "language_info",
     }
-    assert set(sphinx_run.env.nb_metadata["complex_outputs"].keys()) == set()
+    assert set(sphinx_run.env.nb_metadata["complex_outputs"].keys()) == {"inputs"}
     assert sphinx_run.env.metadata["complex_outputs"]["celltoolbar"] == "Edit Metadata"
     assert sphinx_run.env.metadata["complex_outputs"]["hide_input"] == "False"
     assert sphinx_run.env.metadata["complex_outputs"]["kernelspec"] == {
@@ -102,6 +197,50 @@ def test_ipywidgets(sphinx_run):
         "ipywidgets_0",
         "ipywidgets_1",
     }
+    # the widget state is written to a static file, rather than stored in the environment
+    uri, kwargs = sphinx_run.env.nb_metadata["ipywidgets"]["js_files"]["ipywidgets_state"]
+    assert uri.startswith("mystnb_widgets/") and "body" not in kwargs
+    state_path = Path(sphinx_run.app.outdir, "_static", uri)
+    assert "application/vnd.jupyter.widget-state+json" in state_path.read_text("utf8")
     head_scripts = sphinx_run.get_html().select("head > script")
+    assert any(script.get("src", "").startswith(f"_static/{uri}") for script in head_scripts)
     assert any("require.js" in script.get("src", "") for script in head_scripts)
     assert any("embed-amd.js" in script.get("src", "") for script in head_scripts)
+
+
+def test_cell_config_resolver():
+    """Test that cell level config is resolved once per cell."""
+    from myst_nb.core.config import CellConfigResolver, NbParserConfig
+
+    config = NbParserConfig(number_source_lines=True)
+    resolver = CellConfigResolver(config)
+    warnings = []
+
+    def _callback(msg, subtype):
+        warnings.append(msg)
+
+    plain = {"tags": ["hide-input"]}
+    assert resolver.get("number_source_lines", plain, _callback) is True
+    cell = {"mystnb": {"number_source_lines": False, "image": "a"}}
+    for _ in range(3):
+        assert resolver.get("number_source_lines", cell, _callback) is False
+        assert resolver.get("render_image_options", cell, _callback) == {}
+    assert len(warnings) == 1
+    assert "Cell metadata invalid" in warnings[0]
+    for field in ("number_source_lines", "render_image_options"):
+        assert resolver.get(field, cell, lambda *args: None) == config.get_cell_level_config(
+            field, cell, lambda *args: None
+        )
+    with pytest.raises(KeyError):
+        resolver.get("unknown", cell, _callback)
+
+
+def test_cell_config_resolver_unqueried():
+    """Invalid values of fields that are never requested should not be warned about."""
+    from myst_nb.core.config import CellConfigResolver, NbParserConfig
+
+    resolver = CellConfigResolver(NbParserConfig())
+    warnings = []
+    cell = {"mystnb": {"number_source_lines": "not a bool", "image": "a"}}
+    assert resolver.get("remove_code_source", cell, lambda msg, _: warnings.append(msg)) is False
+    assert warnings == []
@@ -1,7 +1,27 @@
 """Tests for rendering code cell outputs."""
+import mmap
+from pathlib import Path
+
+from docutils import nodes
+import nbformat
 import pytest
 
-from myst_nb.core.render import EntryPointError, load_renderer
+from myst_nb._compat import findall
+from myst_nb.core.lazy import LazyOutputData, close_nb_buffers, lazy_nb_read
+from myst_nb.core.render import (
+    EntryPointError,
+    ExampleMimeRenderPlugin,
+    MimeDispatch,
+    NbElementRenderer,
+    get_mime_priority,
+    get_isolated_md_parser,
+    get_mime_dispatch,
+    get_mime_priority_index,
+    load_renderer,
+    select_mime_type,
+)
+from myst_nb.core.utils import coalesce_streams, process_control_characters, truncate_text
+from myst_nb.sphinx_ import NbMetadataCollector
 
 
 def test_load_renderer_not_found():
@@ -10,6 +30,18 @@ def test_load_renderer_not_found():
         load_renderer("other")
 
 
+def test_mime_priority_index():
+    """Test that the priority index is cached, and selects the top priority mime type."""
+    overrides = [("*", "text/plain", None), ("text", "text/html", 0)]
+    index = get_mime_priority_index("text", overrides)
+    assert get_mime_priority_index("text", list(overrides)) is index
+    assert list(index) == get_mime_priority("text", overrides)
+    assert list(index)[0] == "text/html"
+    assert "text/plain" not in index
+    assert select_mime_type(["text/plain", "text/markdown", "text/latex"], index) == "text/latex"
+    assert select_mime_type(["text/plain", "image/png"], index) is None
+
+
 # TODO sometimes fails in full tests
 # def test_load_renderer_not_subclass(monkeypatch):
 #     """Test that an error is raised when the renderer is not a subclass."""
@@ -53,6 +85,52 @@ def test_complex_outputs(sphinx_run, clean_doctree, file_regression):
     )
 
 
+@pytest.mark.sphinx_params(
+    "complex_outputs.ipynb",
+    conf={"nb_execution_mode": "off", "nb_read_lazy_output_size": 100},
+)
+def test_complex_outputs_lazy(sphinx_run):
+    """Lazily loaded output data should be rendered, and written, as for eager loading."""
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    images = list(findall(sphinx_run.get_resolved_doctree("complex_outputs"))(nodes.image))
+    assert images
+    for image in images:
+        assert Path(sphinx_run.app.srcdir, image["uri"].lstrip("/")).is_file()
+    source = nbformat.read(Path(sphinx_run.app.srcdir, "complex_outputs.ipynb"), 4)
+    written = nbformat.reads(sphinx_run.get_nb(), 4)
+    assert [cell.get("outputs") for cell in written.cells] == [
+        cell.get("outputs") for cell in source.cells
+    ]
+
+
+def test_lazy_nb_read(tmp_path):
+    """The file should only be mapped if identical to the text, and closed after use."""
+    notebook = nbformat.v4.new_notebook()
+    cell = nbformat.v4.new_code_cell("plot()")
+    cell.outputs = [nbformat.v4.new_output("display_data", data={"image/png": "aGVsbG8=" * 100})]
+    notebook.cells.append(cell)
+    path = tmp_path / "lazy.ipynb"
+    text = nbformat.writes(notebook)
+    path.write_text(text, "utf8")
+
+    read = lazy_nb_read(text, path=str(path), min_size=100)
+    data = read.cells[0].outputs[0].data["image/png"]
+    assert isinstance(data, LazyOutputData)
+    assert isinstance(data._buffer, mmap.mmap)
+    assert data.load() == "aGVsbG8=" * 100
+    close_nb_buffers(read)
+    assert data._buffer.closed
+
+    # e.g. modified by a source-read handler
+    modified = text.replace("aGVsbG8=", "d29ybGQ=")
+    read = lazy_nb_read(modified, path=str(path), min_size=100)
+    data = read.cells[0].outputs[0].data["image/png"]
+    assert isinstance(data, LazyOutputData)
+    assert not isinstance(data._buffer, mmap.mmap)
+    assert data.load() == "d29ybGQ=" * 100
+
+
 @pytest.mark.sphinx_params(
     "complex_outputs.ipynb",
     conf={"nb_execution_mode": "off"},
@@ -102,6 +180,242 @@ def test_merge_streams(sphinx_run, file_regression):
     file_regression.check(doctree.pformat(), extension=".xml", encoding="utf-8")
 
 
+@pytest.mark.sphinx_params(
+    "merge_streams.ipynb",
+    conf={
+        "nb_execution_mode": "off",
+        "nb_merge_streams": True,
+        "nb_output_max_lines": 2,
+        "nb_output_truncate_spill": True,
+        "nb_output_store": True,
+    },
+)
+def test_output_truncation(sphinx_run):
+    """Test truncating outputs above the line limit, with the full output in a file."""
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    doctree = sphinx_run.get_resolved_doctree("merge_streams")
+    blocks = [
+        node.astext()
+        for node in findall(doctree)(nodes.literal_block)
+        if "output" in node["classes"]
+    ]
+    assert "stdout1\n" in blocks
+    assert "stdout3\n" in blocks
+    assert not any("stdout2" in block for block in blocks)
+    markers = [
+        node for node in findall(doctree)(nodes.paragraph) if "truncated" in node["classes"]
+    ]
+    assert len(markers) == 2
+    assert "1 line (8 bytes) omitted" in markers[0].astext()
+    assert list(findall(markers[0])(nodes.reference))
+    assert 'class="reference download internal"' in str(sphinx_run.get_html())
+    output_folder = Path(sphinx_run.app.env.mystnb_config.output_folder)
+    assert [
+        path.read_text("utf8") for path in output_folder.glob("*.txt")
+    ].count("stdout1\nstdout2\nstdout3\n") == 1
+    downloads = Path(sphinx_run.app.outdir, "_downloads")
+    assert [
+        path.read_text("utf8") for path in downloads.glob("*/*.txt")
+    ].count("stdout1\nstdout2\nstdout3\n") == 1
+
+
+@pytest.mark.parametrize(
+    "text,max_bytes,max_lines,expected",
+    [
+        ("a\nb\nc\n", -1, 3, None),
+        ("a\nb\nc\nd\n", -1, 2, ("a\n", "d\n")),
+        ("a\nb\nc\nd", -1, 3, ("a\nb\n", "d")),
+        ("a\rx\nb\x0cy\nc\u2028z\nd\n", -1, 2, ("a\rx\n", "d\n")),
+        ("a\nb\nc\n", -1, 1, ("a\n", "")),
+        ("aaaa\nbbbb\ncccc\n", 10, -1, ("aaaa\n", "cccc\n")),
+    ],
+)
+def test_truncate_text(text, max_bytes, max_lines, expected):
+    assert truncate_text(text, max_bytes, max_lines) == expected
+
+
+@pytest.mark.sphinx_params(
+    "merge_streams.ipynb",
+    conf={
+        "nb_execution_mode": "off",
+        "nb_merge_streams": True,
+        "nb_output_total_max_lines": 4,
+    },
+)
+def test_output_truncation_total(sphinx_run):
+    """Test truncating outputs above the line limit for the whole notebook."""
+    sphinx_run.build()
+    doctree = sphinx_run.get_resolved_doctree("merge_streams")
+    blocks = [
+        node.astext()
+        for node in findall(doctree)(nodes.literal_block)
+        if "output" in node["classes"]
+    ]
+    assert blocks == ["stdout1\nstdout2\nstdout3\n", "stderr1\n"]
+    assert "truncated" in doctree.astext()
+
+
+@pytest.mark.sphinx_params(
+    "lazy_outputs.ipynb",
+    conf={
+        "nb_execution_mode": "off",
+        "nb_render_lazy_output_size": 1000,
+        "nb_output_total_max_bytes": 15,
+    },
+)
+def test_output_truncation_total_bundles(sphinx_run):
+    """Test only the displayed mime type of each bundle counts towards the notebook totals,
+    and outputs loaded lazily are not truncated.
+    """
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    html = sphinx_run.get_html()
+    assert len(html.select("div.mystnb-lazy-output")) == 2
+    assert "<b>small</b>" in str(html)
+    assert "truncated" not in sphinx_run.get_resolved_doctree("lazy_outputs").astext()
+
+
+@pytest.mark.sphinx_params(
+    "markdown_outputs.ipynb",
+    conf={"nb_execution_mode": "off", "nb_target_builders": ["html", "text"]},
+)
+def test_target_builders(sphinx_run):
+    """Test only the mime types selected by the target builders are stored."""
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    doctree = sphinx_run.get_doctree("markdown_outputs")
+    mime_types = {
+        node["mime_type"] for node in findall(doctree)(nodes.container) if "mime_type" in node
+    }
+    assert mime_types == {"text/markdown"}
+    resolved = sphinx_run.get_resolved_doctree("markdown_outputs")
+    assert len(list(findall(resolved)(nodes.strong))) == 3
+
+
+@pytest.mark.sphinx_params(
+    "markdown_outputs.ipynb",
+    conf={"nb_execution_mode": "off", "nb_target_builders": ["latex"]},
+)
+def test_target_builders_warning(sphinx_run):
+    """Test a warning is emitted for a builder that is not targeted."""
+    sphinx_run.build()
+    assert "Builder 'html' is not in 'nb_target_builders'" in sphinx_run.warnings()
+
+
+def test_mime_dispatch():
+    class ImagePlugin:
+        mime_types = ["image/*"]
+
+    class AnyPlugin:
+        pass
+
+    dispatch = MimeDispatch(
+        [ImagePlugin, AnyPlugin, ExampleMimeRenderPlugin],
+        {"image/png": "render_image", "text/*": "render_text", "*": "render_any"},
+    )
+    assert dispatch.lookup("image/png") == ((ImagePlugin, AnyPlugin), "render_image")
+    assert dispatch.lookup("image/gif") == ((ImagePlugin, AnyPlugin), "render_any")
+    assert dispatch.lookup("text/csv") == ((AnyPlugin,), "render_text")
+    assert dispatch.lookup("custommimetype") == (
+        (AnyPlugin, ExampleMimeRenderPlugin),
+        "render_any",
+    )
+    plugins, method = get_mime_dispatch(NbElementRenderer, True).lookup("image/svg+xml")
+    assert ExampleMimeRenderPlugin not in plugins
+    assert method == "render_image_inline"
+    plugins, method = get_mime_dispatch(NbElementRenderer, False).lookup("custommimetype")
+    assert ExampleMimeRenderPlugin in plugins
+    assert method is None
+
+
+@pytest.mark.sphinx_params("markdown_outputs.ipynb", conf={"nb_execution_mode": "off"})
+def test_markdown_outputs(sphinx_run):
+    """Test rendering markdown outputs with shared, isolated, parsers."""
+    get_isolated_md_parser.cache_clear()
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    doctree = sphinx_run.get_resolved_doctree("markdown_outputs")
+    assert [node.astext() for node in findall(doctree)(nodes.strong)] == [
+        "bold 0",
+        "bold 1",
+        "bold 2",
+    ]
+    assert len(list(findall(doctree)(nodes.table))) == 1
+    # one parser for each of the two formats
+    assert get_isolated_md_parser.cache_info().currsize == 2
+    assert get_isolated_md_parser.cache_info().hits == 2
+
+
+@pytest.mark.sphinx_params(
+    "lazy_outputs.ipynb",
+    conf={
+        "nb_execution_mode": "off",
+        "nb_render_lazy_output_size": 1000,
+        "nb_output_store": True,
+    },
+)
+def test_lazy_outputs(sphinx_run):
+    """Test writing large HTML and JavaScript outputs to separate files,
+    which are copied to the downloads folder on the first build.
+    """
+    sphinx_run.build()
+    assert sphinx_run.warnings() == ""
+    html = sphinx_run.get_html()
+    lazy = html.select("div.mystnb-lazy-output")
+    assert len(lazy) == 2
+    assert "mystnb-lazy-text_html" in lazy[0]["class"]
+    assert "mystnb-lazy-javascript" in lazy[1]["class"]
+    for element, extension, content in zip(lazy, (".html", ".js"), ("row 99", "console.log")):
+        href = element.select_one("a")["href"]
+        assert href.startswith("_downloads/") and href.endswith(extension)
+        assert content in Path(sphinx_run.app.outdir, href).read_text("utf8")
+    assert "row 99" not in str(html)
+    assert "<b>small</b>" in str(html)
+    # the loader script is a static file, rather than inlined in each page
+    assert not any("mystnb-lazy-output" in script.text for script in html.select("script"))
+    loaders = [
+        script["src"]
+        for script in html.select("script[src]")
+        if "mystnb_lazy_outputs." in script["src"]
+    ]
+    assert len(loaders) == 1 and loaders[0].startswith("_static/")
+    loader = Path(sphinx_run.app.outdir, loaders[0].split("?")[0])
+    assert "mystnb-lazy-output" in loader.read_text("utf8")
+    assert "js_files" not in NbMetadataCollector.get_doc_data(sphinx_run.env)["lazy_outputs"]
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("no control characters\n", "no control characters\n"),
+        ("0%\r50%\r100%\ndone\n", "100%\ndone\n"),
+        ("crlf line\r\nnext\r", "crlf line\r\nnext\r"),
+        ("abcd\x08\x08X\x08Y\n", "abY\n"),
+        ("\x08\x08start\n", "start\n"),
+        ("old\x1b[2Knew\x1b[K\n", "new\n"),
+        ("ab\x1b[0m\x08c\n", "a\x1b[0mc\n"),
+        ("\x1b[31mred\x1b[0m\x08\x08\x08\x08x\n", "\x1b[31m\x1b[0mx\n"),
+    ],
+)
+def test_process_control_characters(text, expected):
+    assert process_control_characters(text) == expected
+
+
+def test_coalesce_streams():
+    outputs = [
+        nbformat.v4.new_output("stream", name="stderr", text="warn\n"),
+        nbformat.v4.new_output("stream", name="stdout", text="a\r"),
+        nbformat.v4.new_output("stream", name="stdout", text="b\n"),
+    ]
+    merged = coalesce_streams(outputs)
+    assert [(output.name, output.text) for output in merged] == [
+        ("stdout", "b\n"),
+        ("stderr", "warn\n"),
+    ]
+    assert outputs[1].text == "a\r"
+
+
 @pytest.mark.sphinx_params(
     "metadata_image.ipynb",
     conf={"nb_execution_mode": "off", "nb_cell_metadata_key": "myst"},
@@ -19,6 +19,7 @@ def test_basic_run(sphinx_run, file_regression, check_nbs):
     }
     assert set(sphinx_run.env.nb_metadata["basic_unrun"].keys()) == {
         "exec_data",
+        "inputs",
     }
     assert sphinx_run.env.metadata["basic_unrun"]["author"] == "Chris"
     assert sphinx_run.env.metadata["basic_unrun"]["kernelspec"] == {
@@ -46,7 +47,7 @@ def test_basic_run_exec_off(sphinx_run, file_regression, check_nbs):
         "wordcount",
         "kernelspec",
     }
-    assert set(sphinx_run.env.nb_metadata["basic_unrun"].keys()) == set()
+    assert set(sphinx_run.env.nb_metadata["basic_unrun"].keys()) == {"inputs"}
     assert sphinx_run.env.metadata["basic_unrun"]["author"] == "Chris"
 
     file_regression.check(